@@ -0,0 +1,91 @@
+"""
+Pool of API keys with own requests quota each.
+
+Request takes the key with the most of its quota left, so requests
+are spread over keys evenly and throughput grows with number of keys.
+Key rejected by service or rate limited is retired for a while
+and is not taken until then.
+"""
+
+import hashlib
+import threading
+import time
+from typing import Callable, Dict, Sequence, Tuple
+
+from exceptions import ApiKeysRetired
+from rate_limit import SharedTokenBucket
+from timings import TIMINGS, Seconds
+
+
+class ApiKeyPool:
+    """
+    Keys of web service paced by token buckets shared by processes.
+
+    Buckets of keys are named by hashes of keys, so keys never appear
+    in file names. Every retirement adds one to {name}_key_retired
+    counter.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        capacity: float,
+        max_wait: Seconds,
+        clock: Callable[[], Seconds] = time.monotonic,
+    ):
+        """Create pool with rate and capacity of bucket of every key."""
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self.max_wait = max_wait
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, SharedTokenBucket] = {}
+        self._retired_until: Dict[str, Seconds] = {}
+
+    def choose(self, keys: Sequence[str]) -> Tuple[str, SharedTokenBucket]:
+        """
+        Return active key with the most tokens left and its rate limiter.
+
+        Raises ApiKeysRetired if all keys are retired.
+        """
+        active_keys = [key for key in keys if not self.is_retired(key)]
+        if not active_keys:
+            raise ApiKeysRetired(
+                f"All {len(keys)} API keys of {self.name} are retired "
+                f"after auth or rate limit errors"
+            )
+        key = max(active_keys, key=lambda key: self.rate_limiter(key).available())
+        return key, self.rate_limiter(key)
+
+    def retire(self, key: str, duration: Seconds) -> None:
+        """Stop taking key for duration seconds."""
+        with self._lock:
+            self._retired_until[key] = self._clock() + duration
+        TIMINGS.count(f"{self.name}_key_retired")
+
+    def rate_limiter(self, key: str) -> SharedTokenBucket:
+        """Return token bucket of key."""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                key_hash = hashlib.sha256(key.encode()).hexdigest()[:16]
+                bucket = self._buckets[key] = SharedTokenBucket(
+                    f"{self.name}_{key_hash}",
+                    rate=self.rate,
+                    capacity=self.capacity,
+                    max_wait=self.max_wait,
+                )
+            return bucket
+
+    def is_retired(self, key: str) -> bool:
+        """Tell if key is retired now."""
+        with self._lock:
+            return self._retired_until.get(key, float("-inf")) > self._clock()
+
+    def clear(self) -> None:
+        """Forget buckets and retired keys."""
+        with self._lock:
+            self._buckets.clear()
+            self._retired_until.clear()
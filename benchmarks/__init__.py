@@ -0,0 +1 @@
+"""Initialization file."""
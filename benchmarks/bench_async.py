@@ -0,0 +1,76 @@
+"""
+Benchmark of getting weather for many coordinates in one event loop.
+
+Fake upstream answers with delay like real web service does.
+Run from the repository root:
+    python -m benchmarks.bench_async
+"""
+
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+import config
+import weather_api_service
+from coordinates import Coordinates
+from fake_upstream import FakeUpstream, UpstreamBehavior
+from shared_cache import SHARED_CACHE
+from weather_api_service import get_weather_async, get_weather_many
+
+UPSTREAM_LATENCY = 0.05  # seconds
+COORDINATES_NUMBER = 1000
+CONCURRENCY = 64
+
+
+async def get_weathers(coordinates: List[Coordinates], concurrency: int) -> None:
+    """Get weather for all coordinates, not more than concurrency at once."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def get_weather(point: Coordinates) -> None:
+        async with semaphore:
+            await get_weather_async(point)
+
+    await asyncio.gather(*map(get_weather, coordinates))
+
+
+def main() -> None:
+    """Compare threads with event loop getting weather for many coordinates."""
+    config.transport = config.Transport.HTTP
+    weather_api_service.OPEN_WEATHER_API_KEY = "benchmark"  # type: ignore
+    weather_api_service.WEATHER_API_KEYS.rate = 0
+    # Every point lies in its own cache cell, so none of them is cached
+    coordinates = [
+        Coordinates(latitude=i // 100, longitude=i % 100)
+        for i in range(COORDINATES_NUMBER)
+    ]
+    behavior = UpstreamBehavior(latency=UPSTREAM_LATENCY)
+    cache_dir = tempfile.TemporaryDirectory()
+    with FakeUpstream(behavior=behavior) as upstream, cache_dir:
+        config.CACHE_DIR = Path(cache_dir.name)
+        config.OPEN_WEATHER_API_URL = upstream.open_weather_url
+        weather_api_service.WEATHER_CACHE.clear()
+        SHARED_CACHE.clear()
+        start = time.perf_counter()
+        for _ in get_weather_many(coordinates, concurrency=CONCURRENCY):
+            pass
+        threads_seconds = time.perf_counter() - start
+        print(
+            f"threads, {CONCURRENCY} concurrent: "
+            f"{COORDINATES_NUMBER / threads_seconds:6.0f} requests/s"
+        )
+        for concurrency in (CONCURRENCY, 4 * CONCURRENCY):
+            weather_api_service.WEATHER_CACHE.clear()
+            SHARED_CACHE.clear()
+            start = time.perf_counter()
+            asyncio.run(get_weathers(coordinates, concurrency))
+            seconds = time.perf_counter() - start
+            print(
+                f"event loop, {concurrency} concurrent: "
+                f"{COORDINATES_NUMBER / seconds:6.0f} requests/s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Benchmark of getting weather for many coordinates.
+
+Fake upstream answers with delay like real web service does.
+Run from the repository root:
+    python -m benchmarks.bench_batch
+"""
+
+import time
+
+import config
+import patterns
+import weather_api_service
+from coordinates import Coordinates
+from fake_upstream import FakeUpstream, FakeUpstreamHandler
+from weather_api_service import BatchStats, get_weather_many
+
+UPSTREAM_LATENCY = 0.05  # seconds
+COORDINATES_NUMBER = 1000
+CONCURRENCY = 64
+
+
+class SlowHandler(FakeUpstreamHandler):
+    """Handler answering with delay."""
+
+    def do_GET(self) -> None:
+        """Answer GET request after delay."""
+        time.sleep(UPSTREAM_LATENCY)
+        super().do_GET()
+
+
+def main() -> None:
+    """Get weather for many distinct coordinates."""
+    config.transport = config.Transport.HTTP
+    weather_api_service.OPEN_WEATHER_API_KEY = "benchmark"  # type: ignore
+    # Every point lies in its own cache cell, so none of them is cached
+    coordinates = [
+        Coordinates(latitude=i // 100, longitude=i % 100)
+        for i in range(COORDINATES_NUMBER)
+    ]
+    with FakeUpstream(handler=SlowHandler) as upstream:
+        patterns.open_weather_api_url_pattern = (
+            upstream.open_weather_url + "?lat={latitude}&lon={longitude}"
+        )
+        for concurrency in (1, CONCURRENCY):
+            weather_api_service.WEATHER_CACHE.clear()
+            stats = BatchStats()
+            # Serial run is cut short, it would take a minute otherwise
+            points = coordinates if concurrency > 1 else coordinates[:50]
+            for _ in get_weather_many(points, concurrency=concurrency, stats=stats):
+                pass
+            print(
+                f"concurrency {concurrency:>3}: {stats.succeeded} ok, "
+                f"{stats.failed} failed in {stats.elapsed:.2f} s, "
+                f"{stats.throughput:.0f} requests/s"
+            )
+
+
+if __name__ == "__main__":
+    main()
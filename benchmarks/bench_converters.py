@@ -0,0 +1,43 @@
+"""
+Benchmark of formatting many weather observations.
+
+Run from the repository root:
+    python -m benchmarks.bench_converters
+"""
+
+import time
+
+import converters
+from benchmarks.bench_weather_frame import make_weathers
+from config import SpeedUnit, TemperatureUnit
+from weather_formatter import format_weather, format_weather_frame
+from weather_frame import WeatherFrame
+
+UNITS = (TemperatureUnit.FAHRENHEIT, SpeedUnit.MILES_PER_HOUR)
+
+
+def main() -> None:
+    """Compare formatting observations one by one with formatting frame."""
+    weathers = make_weathers()
+    frame = WeatherFrame.from_weathers(weathers)
+    start = time.perf_counter()
+    expected = [format_weather(weather, *UNITS) for weather in weathers]
+    one_by_one_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    formatted = format_weather_frame(frame, *UNITS)
+    frame_seconds = time.perf_counter() - start
+    assert formatted == expected
+    start = time.perf_counter()
+    converters.convert_to_mph_many(frame.wind_speed)
+    converters.convert_to_fahrenheit_many(frame.temperature)
+    converting_seconds = time.perf_counter() - start
+    print(f"format_weather one by one: {one_by_one_seconds * 1000:7.1f} ms")
+    print(f"format_weather_frame:      {frame_seconds * 1000:7.1f} ms")
+    print(
+        f"converting columns ({converters.BATCH_BACKEND}): "
+        f"{converting_seconds * 1000:7.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
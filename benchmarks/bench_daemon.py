@@ -0,0 +1,62 @@
+"""
+Benchmark of thin client end-to-end latency.
+
+Daemon requests weather from local fake upstream.
+Run from the repository root:
+    python -m benchmarks.bench_daemon
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+import config
+import daemon
+import patterns
+import weather_api_service
+from coordinates import Coordinates
+from fake_upstream import FakeUpstream
+
+RUNS_NUMBER = 20
+
+
+def measure_command(arguments: List[str], environment: Dict[str, str]) -> float:
+    """Return median wall time of command in seconds."""
+    durations = []
+    for _ in range(RUNS_NUMBER):
+        start = time.perf_counter()
+        subprocess.run(arguments, env=environment, check=True, stdout=subprocess.PIPE)
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def main() -> None:
+    """Compare thin client with import of in-process application."""
+    config.transport = config.Transport.HTTP
+    weather_api_service.OPEN_WEATHER_API_KEY = "benchmark"  # type: ignore
+    socket_path = os.path.join(tempfile.mkdtemp(), "weather.sock")
+    environment = {**os.environ, "WEATHER_APP_SOCKET": socket_path}
+    with FakeUpstream() as upstream:
+        patterns.open_weather_api_url_pattern = (
+            upstream.open_weather_url + "?lat={latitude}&lon={longitude}"
+        )
+        # Daemon answers for the fixed point, so ipinfo.io is not requested
+        daemon.get_gps_coordinates = lambda: Coordinates(55, 37)  # type: ignore
+        weather_daemon = daemon.WeatherDaemon(socket_path)
+        thread = threading.Thread(target=weather_daemon.serve_forever, daemon=True)
+        thread.start()
+        client = measure_command([sys.executable, "weather_client.py"], environment)
+        imports = measure_command([sys.executable, "-c", "import weather"], environment)
+        weather_daemon.shutdown()
+        weather_daemon.server_close()
+    print(f"thin client with daemon: {client * 1000:6.1f} ms")
+    print(f"import of weather.py:    {imports * 1000:6.1f} ms (without any request)")
+
+
+if __name__ == "__main__":
+    main()
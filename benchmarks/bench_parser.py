@@ -0,0 +1,55 @@
+"""
+Benchmark of parsing Open Weather API service responses.
+
+Run from the repository root:
+    python -m benchmarks.bench_parser
+"""
+
+import json
+import re
+import timeit
+from datetime import datetime
+from typing import Any, Dict
+
+from fake_upstream import OPEN_WEATHER_PAYLOAD
+from weather_api_service import Weather, _parse_weather, get_weather_type
+
+RESPONSES_NUMBER = 20_000
+REPEATS = 5
+
+
+def parse_weather_with_preprocessing(stdout_data: bytes) -> Weather:
+    """Parse response like parser did before: decode, lower, regex, walk."""
+    command_output = stdout_data.decode().strip().lower()
+    openweather_dict: Dict[str, Any] = json.loads(
+        re.search(r"{.*}", command_output).group()  # type: ignore
+    )
+    return Weather(
+        temperature=round(openweather_dict["main"]["temp"]),
+        weather_type=get_weather_type(openweather_dict["weather"][0]["id"]),
+        weather_description=str(openweather_dict["weather"][0]["description"]),
+        wind_speed=openweather_dict["wind"]["speed"],
+        sunrise=datetime.fromtimestamp(openweather_dict["sys"]["sunrise"]),
+        sunset=datetime.fromtimestamp(openweather_dict["sys"]["sunset"]),
+        city=openweather_dict["name"],
+    )
+
+
+def main() -> None:
+    """Compare parsers on archive of responses."""
+    response = json.dumps(OPEN_WEATHER_PAYLOAD, ensure_ascii=False).encode()
+    responses = [response] * RESPONSES_NUMBER
+    for name, parse in (
+        ("preprocessing", parse_weather_with_preprocessing),
+        ("raw bytes", _parse_weather),
+    ):
+        seconds = min(
+            timeit.repeat(
+                lambda: [parse(r) for r in responses], number=1, repeat=REPEATS
+            )
+        )
+        print(f"{name:<14} {seconds / RESPONSES_NUMBER * 1e6:6.2f} µs per response")
+
+
+if __name__ == "__main__":
+    main()
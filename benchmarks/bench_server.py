@@ -0,0 +1,78 @@
+"""
+Benchmark of weather server throughput.
+
+Server requests weather from local fake upstream.
+Run from the repository root:
+    python -m benchmarks.bench_server
+"""
+
+import random
+import statistics
+import threading
+import time
+from http.client import HTTPConnection
+from typing import List
+
+import config
+import patterns
+import weather_api_service
+from fake_upstream import FakeUpstream
+from server import WEATHER_PATH, WeatherServer
+
+CLIENTS_NUMBER = 16
+DURATION = 3.0  # seconds
+# Requests fall in this number of distinct cache cells
+CELLS_NUMBER = 500
+
+
+def run_client(port: int, deadline: float, latencies: List[float]) -> None:
+    """Request weather over keep-alive connection until deadline."""
+    connection = HTTPConnection("127.0.0.1", port)
+    while time.perf_counter() < deadline:
+        cell = random.randrange(CELLS_NUMBER)
+        start = time.perf_counter()
+        connection.request(
+            "GET", f"{WEATHER_PATH}?lat={cell // 100}&lon={cell % 100}&units=metric"
+        )
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        assert response.status == 200
+    connection.close()
+
+
+def main() -> None:
+    """Measure throughput of weather server with concurrent clients."""
+    config.transport = config.Transport.HTTP
+    weather_api_service.OPEN_WEATHER_API_KEY = "benchmark"  # type: ignore
+    with FakeUpstream() as upstream:
+        patterns.open_weather_api_url_pattern = (
+            upstream.open_weather_url + "?lat={latitude}&lon={longitude}"
+        )
+        server = WeatherServer("127.0.0.1", 0)
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+        latencies: List[float] = []
+        deadline = time.perf_counter() + DURATION
+        clients = [
+            threading.Thread(
+                target=run_client, args=(server.server_port, deadline, latencies)
+            )
+            for _ in range(CLIENTS_NUMBER)
+        ]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        server.shutdown()
+        server.server_close()
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(
+        f"{CLIENTS_NUMBER} clients: {len(latencies) / DURATION:.0f} requests/s, "
+        f"p50: {quantiles[49] * 1000:.2f} ms, p99: {quantiles[98] * 1000:.2f} ms, "
+        f"cache hits: {weather_api_service.WEATHER_CACHE.stats.hits}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Benchmark of transports against local fake upstream.
+
+Run from the repository root:
+    python -m benchmarks.bench_transport
+"""
+
+import statistics
+import time
+from typing import Callable, List
+
+from fake_upstream import FakeUpstream
+from http_transport import HttpCommand, HttpConnectionPool
+from shell_command import (
+    CURL,
+    CURL_NO_INTERNET_CONNECTION_EXIT_CODE,
+    CURL_SILENT_ARG,
+    ShellCommand,
+)
+from timings import Seconds
+
+REQUESTS_NUMBER = 200
+
+
+def measure(request: Callable[[], object], requests_number: int) -> List[Seconds]:
+    """Return latencies of sequential requests."""
+    latencies = []
+    for _ in range(requests_number):
+        start = time.perf_counter()
+        request()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def report(name: str, latencies: List[Seconds]) -> None:
+    """Print latency statistics in milliseconds."""
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(
+        f"{name:<12} p50: {quantiles[49] * 1000:7.3f} ms  "
+        f"p99: {quantiles[98] * 1000:7.3f} ms  "
+        f"mean: {statistics.mean(latencies) * 1000:7.3f} ms"
+    )
+
+
+def main() -> None:
+    """Compare curl and pooled HTTP transports."""
+    with FakeUpstream() as upstream:
+        curl_command = ShellCommand(
+            executable=CURL,
+            arguments=[CURL_SILENT_ARG, upstream.open_weather_url],
+            no_internet_exit_code=CURL_NO_INTERNET_CONNECTION_EXIT_CODE,
+        )
+        http_command = HttpCommand(
+            url=upstream.open_weather_url, pool=HttpConnectionPool()
+        )
+        report("curl", measure(curl_command.execute, REQUESTS_NUMBER))
+        report("pooled http", measure(http_command.execute, REQUESTS_NUMBER))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmark of memory used by weather observations.
+
+Run from the repository root:
+    python -m benchmarks.bench_weather_frame
+"""
+
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import List
+
+from weather_api_service import Weather, WeatherType
+from weather_frame import WeatherFrame
+
+OBSERVATIONS_NUMBER = 200_000
+CITIES_NUMBER = 1000
+
+
+def make_weathers() -> List[Weather]:
+    """Return observations like parsed from responses."""
+    sunrise = datetime.fromisoformat("2022-05-03 04:00:00")
+    return [
+        Weather(
+            temperature=random.randint(-30, 40),
+            weather_type=random.choice(list(WeatherType)),
+            # Parsed strings are distinct objects even if they are equal
+            weather_description="".join(["переменная ", "облачность"]),
+            wind_speed=round(random.uniform(0, 20), 1),
+            sunrise=sunrise + timedelta(seconds=random.randrange(3600)),
+            sunset=sunrise + timedelta(hours=16, seconds=random.randrange(3600)),
+            city="".join(["city ", str(random.randrange(CITIES_NUMBER))]),
+        )
+        for _ in range(OBSERVATIONS_NUMBER)
+    ]
+
+
+def main() -> None:
+    """Compare list of Weather with WeatherFrame."""
+    tracemalloc.start()
+    weathers = make_weathers()
+    list_bytes = tracemalloc.get_traced_memory()[0]
+    frame = WeatherFrame.from_weathers(weathers)
+    del weathers
+    tracemalloc.stop()
+    start = time.perf_counter()
+    warm = frame.filter(temperature > 20 for temperature in frame.temperature)
+    filter_seconds = time.perf_counter() - start
+    print(f"list of Weather: {list_bytes / OBSERVATIONS_NUMBER:6.1f} bytes per row")
+    print(
+        f"WeatherFrame:    {frame.nbytes / OBSERVATIONS_NUMBER:6.1f} bytes per row "
+        f"(+ {len(frame.cities)} cities, {len(frame.descriptions)} descriptions)"
+    )
+    print(
+        f"filter temperature > 20: {len(warm)} rows "
+        f"in {filter_seconds * 1000:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Microbenchmark of weather type lookup.
+
+Run from the repository root:
+    python -m benchmarks.bench_weather_type
+"""
+
+import random
+import timeit
+from typing import List
+
+from weather_api_service import WEATHER_TYPES_BY_ID, WeatherType, get_weather_type
+
+IDS_NUMBER = 100_000
+REPEATS = 5
+
+# Lookup by identifier prefix used before the table
+PREFIXES = {
+    "2": WeatherType.THUNDERSTORM,
+    "3": WeatherType.DRIZZLE,
+    "5": WeatherType.RAIN,
+    "6": WeatherType.SNOW,
+    "701": WeatherType.MIST,
+    "711": WeatherType.SMOKE,
+    "721": WeatherType.HAZE,
+    "731": WeatherType.DUST,
+    "741": WeatherType.FOG,
+    "751": WeatherType.SAND,
+    "761": WeatherType.DUST,
+    "762": WeatherType.ASH,
+    "771": WeatherType.SQUALL,
+    "781": WeatherType.TORNADO,
+    "800": WeatherType.CLEAR,
+    "80": WeatherType.CLOUDS,
+}
+
+
+def get_weather_type_by_prefix(weather_type_id: int) -> WeatherType:
+    """Return weather type by scanning identifier prefixes."""
+    weather_types = dict(PREFIXES)
+    for _id, _weather_type in weather_types.items():
+        if str(weather_type_id).startswith(_id):
+            return _weather_type
+    raise ValueError(weather_type_id)
+
+
+def main() -> None:
+    """Compare prefix scan with table lookup on realistic identifiers."""
+    known_ids: List[int] = [
+        weather_type_id
+        for weather_type_id, weather_type in enumerate(WEATHER_TYPES_BY_ID)
+        if weather_type is not None
+    ]
+    ids = [random.choice(known_ids) for _ in range(IDS_NUMBER)]
+    for name, lookup in (
+        ("prefix scan", get_weather_type_by_prefix),
+        ("table", get_weather_type),
+    ):
+        seconds = min(
+            timeit.repeat(lambda: [lookup(i) for i in ids], number=1, repeat=REPEATS)
+        )
+        print(f"{name:<12} {seconds / IDS_NUMBER * 1e9:7.1f} ns per identifier")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Benchmarks of hot paths compared with baseline.
+
+Recorded responses of location info and Open Weather API services
+are taken from benchmarks/fixtures, the full pipeline gets them from
+local stub server. Run from the repository root:
+    python -m benchmarks.suite --save   (remember results as baseline)
+    python -m benchmarks.suite          (compare results with baseline)
+Exit status is 1 if some benchmark got slower than baseline by more
+than tolerance.
+"""
+
+import contextlib
+import io
+import json
+import sys
+import tempfile
+import timeit
+from argparse import ArgumentParser, Namespace
+from array import array
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import config
+import coordinates
+import patterns
+import weather_api_service
+from config import SpeedUnit, TemperatureUnit
+from converters import (
+    convert_to_fahrenheit,
+    convert_to_fahrenheit_many,
+    convert_to_mph,
+    convert_to_mph_many,
+)
+from coordinates import _parse_coordinates
+from fake_upstream import FakeUpstream, FakeUpstreamHandler
+from http_transport import HttpCommand
+from shared_cache import SHARED_CACHE
+from timings import Seconds
+from weather import main as weather_main
+from weather_api_service import WEATHER_CACHE, WEATHER_NEARBY, _parse_weather
+from weather_formatter import format_weather
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+DEFAULT_BASELINE_PATH = Path(__file__).parent / "baseline.json"
+DEFAULT_TOLERANCE = 0.2
+REPEATS = 5
+# Converters are measured on this number of values per call
+VALUES_NUMBER = 1000
+
+
+def read_fixture(name: str) -> bytes:
+    """Return recorded response."""
+    return (FIXTURES_DIR / name).read_bytes()
+
+
+IPINFO_RESPONSE = read_fixture("ipinfo.json")
+OPEN_WEATHER_RESPONSE = read_fixture("open_weather.json")
+
+
+class RecordedHandler(FakeUpstreamHandler):
+    """Handler answering with recorded responses."""
+
+    location_info_body = IPINFO_RESPONSE
+    open_weather_body = OPEN_WEATHER_RESPONSE
+
+
+def make_benchmarks() -> Dict[str, Callable[[], object]]:
+    """Return benchmarks by names, each one is a call of measured code."""
+    ipinfo_text = IPINFO_RESPONSE.decode()
+    weather = _parse_weather(OPEN_WEATHER_RESPONSE)
+    temperatures = array("h", [t % 80 - 30 for t in range(VALUES_NUMBER)])
+    speeds = array("d", [s % 300 / 10 for s in range(VALUES_NUMBER)])
+    return {
+        "parse_coordinates": lambda: _parse_coordinates(ipinfo_text),
+        "parse_weather": lambda: _parse_weather(OPEN_WEATHER_RESPONSE),
+        "format_weather": lambda: format_weather(weather),
+        "format_weather_imperial": lambda: format_weather(
+            weather, TemperatureUnit.FAHRENHEIT, SpeedUnit.MILES_PER_HOUR
+        ),
+        "convert_one_by_one": lambda: (
+            [convert_to_fahrenheit(t) for t in temperatures],
+            [convert_to_mph(s) for s in speeds],
+        ),
+        "convert_many": lambda: (
+            convert_to_fahrenheit_many(temperatures),
+            convert_to_mph_many(speeds),
+        ),
+        "main": run_main,
+    }
+
+
+def run_main() -> None:
+    """Run the whole application without caches, discarding its output."""
+    WEATHER_CACHE.clear()
+    WEATHER_NEARBY.clear()
+    SHARED_CACHE.clear()
+    with contextlib.redirect_stdout(io.StringIO()):
+        weather_main()
+
+
+def measure(benchmark: Callable[[], object]) -> Seconds:
+    """Return the best time of one benchmark call."""
+    timer = timeit.Timer(benchmark)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=REPEATS, number=number)) / number
+
+
+def run_benchmarks(names: Optional[Sequence[str]] = None) -> Dict[str, Seconds]:
+    """Return times of benchmarks calls against stub upstream server."""
+    config.transport = config.Transport.HTTP
+    config.coordinates_cache_ttl = 0
+    weather_api_service.OPEN_WEATHER_API_KEY = "benchmark"  # type: ignore
+    weather_api_service.WEATHER_API_KEYS.rate = 0
+    benchmarks = make_benchmarks()
+    with FakeUpstream(handler=RecordedHandler) as upstream:
+        coordinates.GET_GPS_HTTP_COMMAND = HttpCommand(url=upstream.location_info_url)
+        patterns.open_weather_api_url_pattern = (
+            upstream.open_weather_url + "?lat={latitude}&lon={longitude}"
+        )
+        with tempfile.TemporaryDirectory() as cache_dir:
+            config.CACHE_DIR = Path(cache_dir)
+            return {
+                name: measure(benchmark)
+                for name, benchmark in benchmarks.items()
+                if not names or name in names
+            }
+
+
+def compare(
+    results: Dict[str, Seconds], baseline: Dict[str, Seconds], tolerance: float
+) -> List[str]:
+    """Return names of benchmarks slower than baseline by more than tolerance."""
+    return [
+        name
+        for name, seconds in results.items()
+        if name in baseline and seconds > baseline[name] * (1 + tolerance)
+    ]
+
+
+def report(
+    results: Dict[str, Seconds], baseline: Dict[str, Seconds], regressions: List[str]
+) -> str:
+    """Return table of results compared with baseline."""
+    lines = [f"{'benchmark':<24} {'µs':>10} {'baseline':>10} {'change':>8}"]
+    for name, seconds in results.items():
+        line = f"{name:<24} {seconds * 1e6:10.2f}"
+        if name in baseline:
+            change = seconds / baseline[name] - 1
+            line += f" {baseline[name] * 1e6:10.2f} {change:+8.1%}"
+        if name in regressions:
+            line += "  REGRESSION"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main(arguments: Sequence[str] = ()) -> int:
+    """Run benchmarks, save or compare them with baseline, return exit status."""
+    options = _parse_arguments(arguments)
+    results = run_benchmarks(options.benchmarks)
+    if options.save:
+        options.baseline.write_text(json.dumps(results, indent=2) + "\n")
+        baseline = {}
+    elif options.baseline.exists():
+        baseline = json.loads(options.baseline.read_text())
+    else:
+        baseline = {}
+        print(f"No baseline in {options.baseline}, run with --save to create it")
+    regressions = compare(results, baseline, options.tolerance)
+    print(report(results, baseline, regressions))
+    return 1 if regressions else 0
+
+
+def _parse_arguments(arguments: Sequence[str]) -> Namespace:
+    """Parse command line arguments."""
+    parser = ArgumentParser(description="Benchmark hot paths of application.")
+    parser.add_argument("benchmarks", nargs="*", help="names of benchmarks to run")
+    parser.add_argument(
+        "--baseline", type=Path, default=DEFAULT_BASELINE_PATH, help="baseline file"
+    )
+    parser.add_argument(
+        "--save", action="store_true", help="save results as new baseline"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help="allowed relative slowdown, 0.2 means 20%%",
+    )
+    return parser.parse_args(arguments)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
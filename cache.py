@@ -0,0 +1,96 @@
+"""In-memory cache for responses of web services."""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, NamedTuple, Optional, Tuple, TypeVar
+
+from timings import Seconds
+
+Key = TypeVar("Key", bound=Hashable)
+Value = TypeVar("Value")
+
+
+class CacheStats(NamedTuple):
+    """Counters of cache usage."""
+
+    hits: int
+    misses: int
+    evictions: int
+
+
+class TtlLruCache(Generic[Key, Value]):
+    """
+    Bounded cache with time to live for entries.
+
+    When cache is full the least recently used entry is evicted.
+    Expired entries are not returned, but stay in cache until evicted
+    or overwritten.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: Seconds,
+        clock: Callable[[], Seconds] = time.monotonic,
+    ):
+        """Cache constructor."""
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[Key, Tuple[Seconds, Value]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key: Key) -> Optional[Value]:
+        """Return fresh value by key or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self._clock():
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[1]
+
+    def get_stale(self, key: Key) -> Optional[Value]:
+        """Return value by key even if it has expired, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+        return None if entry is None else entry[1]
+
+    def expires_in(self, key: Key) -> Optional[Seconds]:
+        """Return seconds until value by key expires, or None if it is not cached."""
+        with self._lock:
+            entry = self._entries.get(key)
+        return None if entry is None else entry[0] - self._clock()
+
+    def set(self, key: Key, value: Value) -> None:
+        """Put value in cache."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self) -> None:
+        """Remove all entries and reset counters."""
+        with self._lock:
+            self._entries.clear()
+            self._hits = self._misses = self._evictions = 0
+
+    @property
+    def stats(self) -> CacheStats:
+        """Cache usage counters."""
+        return CacheStats(
+            hits=self._hits, misses=self._misses, evictions=self._evictions
+        )
+
+    def __len__(self) -> int:
+        """Return number of entries in cache."""
+        return len(self._entries)
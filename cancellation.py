@@ -0,0 +1,78 @@
+"""
+Cancellation of commands running in other threads.
+
+Running command registers hook stopping it, e.g. killing its process
+or shutting its connection down, so cancelled command ends at once
+instead of holding process or connection until it answers.
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional
+
+from exceptions import CommandCancelled
+
+Hook = Callable[[], None]
+
+
+class Cancellation:
+    """Request to stop command, hooks of running command are called on cancel."""
+
+    def __init__(self) -> None:
+        """Create not cancelled cancellation."""
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._hooks: List[Hook] = []
+
+    @property
+    def cancelled(self) -> bool:
+        """Check if command is cancelled."""
+        return self._cancelled
+
+    def cancel(self) -> None:
+        """Cancel command calling hooks stopping it."""
+        with self._lock:
+            self._cancelled = True
+            hooks, self._hooks = self._hooks, []
+        for hook in hooks:
+            hook()
+
+    def _add_hook(self, hook: Hook) -> None:
+        """Remember hook or call it at once if command is already cancelled."""
+        with self._lock:
+            if not self._cancelled:
+                self._hooks.append(hook)
+                return
+        hook()
+
+    def _remove_hook(self, hook: Hook) -> None:
+        """Forget hook of command which has ended."""
+        with self._lock:
+            if hook in self._hooks:
+                self._hooks.remove(hook)
+
+
+@contextmanager
+def cancelling(
+    cancellation: Optional[Cancellation], hook: Hook, name: str
+) -> Iterator[None]:
+    """
+    Stop command running inside context by hook when it is cancelled.
+
+    CommandCancelled is raised instead of result or error of cancelled
+    command.
+    """
+    if cancellation is None:
+        yield
+        return
+    cancellation._add_hook(hook)
+    try:
+        yield
+    except Exception as err:
+        if cancellation.cancelled:
+            raise CommandCancelled(f"{name} is cancelled") from err
+        raise
+    finally:
+        cancellation._remove_hook(hook)
+    if cancellation.cancelled:
+        raise CommandCancelled(f"{name} is cancelled")
@@ -0,0 +1,141 @@
+"""
+Circuit breaker for requests to web service.
+
+After several consecutive failures service is considered down
+and circuit opens: requests are not sent and fail fast. When reset
+timeout passes, circuit half-opens and lets few probe requests through,
+the first successful probe closes circuit, failed one opens it again.
+"""
+
+import threading
+import time
+from enum import Enum
+from typing import Any, Callable, Optional, Tuple, Type
+
+from exceptions import (
+    CircuitOpen,
+    CommandExecutionFailed,
+    CommandRunsTooLong,
+    DeadlineExceeded,
+)
+from timings import TIMINGS, Seconds
+
+FAILURES = (CommandExecutionFailed, CommandRunsTooLong)
+# Spent time budget of caller says nothing about service
+NOT_FAILURES = (DeadlineExceeded,)
+
+
+class CircuitState(Enum):
+    """State of circuit breaker."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+
+class CircuitBreaker:
+    """
+    Context manager guarding requests to web service.
+
+    Errors of failures types raised inside context count as failures
+    unless they are of not_failures types, other errors count neither
+    as failures nor as successes.
+    Metrics show {name}_circuit_opened and {name}_circuit_rejected.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int,
+        reset_timeout: Seconds,
+        half_open_probes: int = 1,
+        failures: Tuple[Type[BaseException], ...] = FAILURES,
+        not_failures: Tuple[Type[BaseException], ...] = NOT_FAILURES,
+        clock: Callable[[], Seconds] = time.monotonic,
+    ):
+        """Create closed circuit breaker."""
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self.failures = failures
+        self.not_failures = not_failures
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CircuitState.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at: Seconds = 0
+        self._running_probes = 0
+
+    @property
+    def state(self) -> CircuitState:
+        """Current state, open circuit is half-open after reset timeout."""
+        with self._lock:
+            if (
+                self._state is CircuitState.OPEN
+                and self._clock() - self._opened_at >= self.reset_timeout
+            ):
+                return CircuitState.HALF_OPEN
+            return self._state
+
+    def reset(self) -> None:
+        """Close circuit and forget failures."""
+        with self._lock:
+            self._state = CircuitState.CLOSED
+            self._consecutive_failures = 0
+            self._running_probes = 0
+
+    def __enter__(self) -> "CircuitBreaker":
+        """Let request through or raise CircuitOpen."""
+        with self._lock:
+            if (
+                self._state is CircuitState.OPEN
+                and self._clock() - self._opened_at >= self.reset_timeout
+            ):
+                self._state = CircuitState.HALF_OPEN
+            if self._state is CircuitState.HALF_OPEN:
+                if self._running_probes >= self.half_open_probes:
+                    self._reject()
+                self._running_probes += 1
+            elif self._state is CircuitState.OPEN:
+                self._reject()
+        return self
+
+    def __exit__(self, error_type: Optional[Type[BaseException]], *args: Any) -> None:
+        """Count result of request."""
+        with self._lock:
+            if self._state is CircuitState.HALF_OPEN:
+                self._running_probes -= 1
+            if error_type is None:
+                self._state = CircuitState.CLOSED
+                self._consecutive_failures = 0
+            elif self._is_failure(error_type):
+                self._consecutive_failures += 1
+                if (
+                    self._state is CircuitState.HALF_OPEN
+                    or self._consecutive_failures >= self.failure_threshold
+                ):
+                    self._open()
+
+    def _is_failure(self, error_type: Type[BaseException]) -> bool:
+        """Check if error is failure of service."""
+        return issubclass(error_type, self.failures) and not issubclass(
+            error_type, self.not_failures
+        )
+
+    def _open(self) -> None:
+        """Open circuit, lock must be held."""
+        if self._state is not CircuitState.OPEN:
+            TIMINGS.count(f"{self.name}_circuit_opened")
+        self._state = CircuitState.OPEN
+        self._opened_at = self._clock()
+        self._running_probes = 0
+
+    def _reject(self) -> None:
+        """Raise CircuitOpen for rejected request, lock must be held."""
+        TIMINGS.count(f"{self.name}_circuit_rejected")
+        retry_in = max(self.reset_timeout - (self._clock() - self._opened_at), 0)
+        raise CircuitOpen(
+            f"Service {self.name} is down, requests are not sent "
+            f"for {retry_in:.1f} more seconds"
+        )
@@ -2,6 +2,7 @@
 
 import os
 from enum import Enum
+from pathlib import Path
 
 
 class OpenWeatherLanguage(Enum):
@@ -32,9 +33,114 @@ class SpeedUnit(Enum):
     MILES_PER_HOUR = "mph"
 
 
+class Transport(Enum):
+    """
+    Backend for requests to web services.
+
+    HTTP keeps connections in process pool between requests,
+    CURL spawns curl process for every request.
+    """
+
+    HTTP = "http"
+    CURL = "curl"
+
+
 OPEN_WEATHER_API_KEY = os.getenv("OPEN_WEATHER_API_KEY", default=None)
-CURRENT_LOCATION_INFO_SERVICE_URL = "https://ipinfo.io/json"
+# Comma separated keys, requests are spread over them instead of single key
+OPEN_WEATHER_API_KEYS = [
+    key.strip()
+    for key in os.getenv("OPEN_WEATHER_API_KEYS", default="").split(",")
+    if key.strip()
+]
+# Services may be replaced by local stand-in server (fake_upstream.py)
+CURRENT_LOCATION_INFO_SERVICE_URL = os.getenv(
+    "LOCATION_INFO_SERVICE_URL", default="https://ipinfo.io/json"
+)
+OPEN_WEATHER_API_URL = os.getenv(
+    "OPEN_WEATHER_API_URL", default="https://api.openweathermap.org/data/2.5/weather"
+)
+# Current GPS coordinates 'latitude,longitude' of host with static position
+STATIC_COORDINATES = os.getenv("GPS_COORDINATES", default=None)
+# File with current GPS coordinates 'latitude,longitude' kept by other program
+COORDINATES_FILE = os.getenv("GPS_COORDINATES_FILE", default=None)
+# Public IP address of host for offline IP database, if it is behind NAT
+PUBLIC_IP = os.getenv("PUBLIC_IP", default=None)
+# Offline IP database imported by ip_database.py, instead of one in CACHE_DIR
+IP_DATABASE_FILE = os.getenv("IP_DATABASE_FILE", default=None)
+CACHE_DIR = (
+    Path(os.getenv("XDG_CACHE_HOME", default=Path.home() / ".cache")) / "weather_app"
+)
 
 open_weather_api_lang = OpenWeatherLanguage.RUSSIAN
 temperature_unit = TemperatureUnit.CELSIUS
 speed_unit = SpeedUnit.METERS_PER_SECOND
+transport = Transport.HTTP
+
+# Weather is cached for coordinates rounded to this number of decimal places,
+# so nearby points share cache entry (2 places is about 1 km)
+coordinates_precision = 2
+weather_cache_ttl = 600  # seconds
+weather_cache_max_size = 1024
+# Cached weather of the nearest point within this distance answers for
+# coordinates without their own cached weather (0 disables it)
+nearby_weather_distance = 2.0  # km
+# Number of concurrent requests while getting weather for many coordinates
+weather_batch_concurrency = 32
+# Address of HTTP server started by 'weather.py --serve'
+server_host = "127.0.0.1"
+server_port = 8080
+# Weather and coordinates are cached on disk for all processes of application,
+# cache keeps not more than this number of entries
+shared_cache_max_size = 10_000
+# Process waits for other one requesting the same key not longer than timeout,
+# then it makes its own request
+shared_cache_lock_timeout = 5.0  # seconds
+# Sources of current GPS coordinates are asked in this order until one knows
+# them, or all of them are asked concurrently and the first answer is taken.
+# "gpsd" source of hosts with GPS receiver is not asked by default, as it
+# would delay every run by gpsd_timeout before cached coordinates of ipinfo
+coordinates_sources = ["static", "file", "ip_database", "ipinfo"]
+race_coordinates_sources = False
+# gpsd daemon of GPS receiver is waited for fix not longer than timeout
+# (0 disables it)
+gpsd_host = "127.0.0.1"
+gpsd_port = 2947
+gpsd_timeout = 0.5  # seconds
+# Current GPS coordinates are cached on disk until network configuration changes
+coordinates_cache_ttl = 24 * 60 * 60  # seconds
+# Failed requests to web services are retried after random backoff,
+# which grows twice with every attempt
+retry_attempts = 2
+retry_backoff = 0.1  # seconds
+retry_max_backoff = 1.0  # seconds
+# Duplicate request is sent if the first one has not answered in usual time,
+# hedge_delay is used until usual time is known
+hedge_requests = False
+hedge_delay = 1.0  # seconds
+# Weather service is considered down after this number of consecutive failures,
+# then requests are not sent to it until reset timeout passes
+circuit_failure_threshold = 5
+circuit_reset_timeout = 30  # seconds
+# Number of concurrent probe requests after reset timeout
+circuit_half_open_probes = 1
+# Weather accessed not less than prefetch_min_accesses times recently is
+# refreshed in servers prefetch_ahead seconds before it expires, refreshes are
+# looked for every prefetch_interval (must be less than prefetch_ahead)
+# and make not more than prefetch_budget requests per prefetch_budget_period
+prefetch_interval = 10  # seconds
+prefetch_ahead = 30  # seconds
+prefetch_min_accesses = 2
+prefetch_budget = 30
+prefetch_budget_period = 60  # seconds
+# Requests to Open Weather API service from all processes are paced to keep
+# within quota of every API key, request is not sent if it would wait for its
+# turn longer than rate_limit_max_wait (rate limit 0 disables pacing)
+open_weather_rate_limit = 60  # requests per minute
+open_weather_rate_burst = 10  # requests
+rate_limit_max_wait = 2  # seconds
+# API key rejected by Open Weather API service or rate limited is not used
+# for a while, request is repeated with another key
+invalid_api_key_retire_time = 3600  # seconds
+rate_limited_api_key_retire_time = 60  # seconds
+# Time budget of one weather request, all its commands together wait not longer
+request_deadline = 8  # seconds
@@ -8,8 +8,17 @@ speed - m/s (meters per second),
 ...
 And further in weather_formatter.py weather data should be converted
 in needed measure units by converters defined in this module.
+
+Converters with _many suffix convert whole sequences at once and round
+results the same way as scalar converters do. They are faster only with
+optional NumPy (numpy extra of the package), without it they fall back
+to loops over array module arrays as slow as scalar converters.
 """
 
+import importlib
+from array import array
+from typing import Any, Sequence, cast
+
 from weather_api_service import (
     Celsius,
     Fahrenheit,
@@ -19,6 +28,14 @@ from weather_api_service import (
     Miles_per_hour,
 )
 
+# NumPy is imported as untyped module whether it has type stubs or is missing
+try:
+    numpy: Any = importlib.import_module("numpy")
+except ImportError:
+    numpy = None
+
+BATCH_BACKEND = "numpy" if numpy is not None else "array"
+
 
 def convert_to_kelvin(temperature: Celsius) -> Kelvin:
     """Approximately convert temperature from °C to °K."""
@@ -38,3 +55,64 @@ def convert_to_mph(speed: Meters_per_second) -> Miles_per_hour:
 def convert_to_kph(speed: Meters_per_second) -> Kilometers_per_hour:
     """Convert speed from m/s to km/h."""
     return round(speed * 3.6, 1)
+
+
+def convert_to_kelvin_many(temperatures: Sequence[Celsius]) -> Sequence[Kelvin]:
+    """Approximately convert temperatures from °C to °K."""
+    if numpy is not None:
+        kelvin = _as_numpy_array(temperatures).astype(numpy.int64) + 273
+        return cast(Sequence[Kelvin], kelvin)
+    return array("q", [temperature + 273 for temperature in temperatures])
+
+
+def convert_to_fahrenheit_many(
+    temperatures: Sequence[Celsius],
+) -> Sequence[Fahrenheit]:
+    """Approximately convert temperatures from °C to °F."""
+    if numpy is not None:
+        # numpy.rint rounds halves to even like round() does
+        fahrenheit = numpy.rint(_as_numpy_array(temperatures) * 9 / 5 + 32)
+        return cast(Sequence[Fahrenheit], fahrenheit.astype(numpy.int64))
+    return array("q", [round(temperature * 9 / 5 + 32) for temperature in temperatures])
+
+
+def convert_to_mph_many(
+    speeds: Sequence[Meters_per_second],
+) -> Sequence[Miles_per_hour]:
+    """Convert speeds from m/s to mph."""
+    if numpy is not None:
+        return cast(Sequence[Miles_per_hour], _round(_as_numpy_array(speeds) * 2.237))
+    return array("d", [round(speed * 2.237, 1) for speed in speeds])
+
+
+def convert_to_kph_many(
+    speeds: Sequence[Meters_per_second],
+) -> Sequence[Kilometers_per_hour]:
+    """Convert speeds from m/s to km/h."""
+    if numpy is not None:
+        return cast(
+            Sequence[Kilometers_per_hour], _round(_as_numpy_array(speeds) * 3.6)
+        )
+    return array("d", [round(speed * 3.6, 1) for speed in speeds])
+
+
+def _as_numpy_array(numbers: Sequence[float]) -> Any:
+    """Return NumPy array of numbers, without copying arrays if possible."""
+    if isinstance(numbers, array):
+        return numpy.frombuffer(numbers, dtype=numbers.typecode)
+    return numpy.asarray(numbers)
+
+
+def _round(numbers: Any) -> Any:
+    """
+    Round NumPy array of numbers to one decimal place as round() does.
+
+    numpy.round scales numbers by 10 and may round differently numbers
+    lying within float error from halfway, such numbers are rounded by round().
+    """
+    rounded = numpy.round(numbers, 1)
+    tenths = numbers * 10
+    near_halfway = numpy.abs(tenths - numpy.floor(tenths) - 0.5) < 1e-6
+    for index in numpy.flatnonzero(near_halfway):
+        rounded[index] = round(float(numbers[index]), 1)
+    return rounded
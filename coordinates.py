@@ -1,23 +1,57 @@
 """Getting current GPS coordinates."""
 
+import asyncio
+import contextvars
 import json
+import queue
+import threading
 from json.decoder import JSONDecodeError
-from typing import NamedTuple
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 
-from config import CURRENT_LOCATION_INFO_SERVICE_URL
-from exceptions import CantGetGpsCoordinates, CommandExecutionFailed
+import config
+import fetch
+from config import CURRENT_LOCATION_INFO_SERVICE_URL, Transport
+from deadline import current_deadline
+from exceptions import (
+    CantGetGpsCoordinates,
+    CommandExecutionFailed,
+    CommandRunsTooLong,
+    DeadlineExceeded,
+)
+from http_transport import Command, HttpCommand
+from ip_database import IP_DATABASE, Location
+from location_sources import get_file_location, get_gpsd_location, get_static_location
+from network import network_fingerprint, outgoing_address
+from shared_cache import SHARED_CACHE
 from shell_command import (
     CURL,
     CURL_NO_INTERNET_CONNECTION_EXIT_CODE,
     CURL_SILENT_ARG,
+    CURL_STATUS_ARGS,
     ShellCommand,
 )
+from single_flight import SingleFlight
+from timings import TIMINGS, timed
 
 GET_GPS_COMMAND = ShellCommand(
     executable=CURL,
-    arguments=[CURL_SILENT_ARG, CURRENT_LOCATION_INFO_SERVICE_URL],
+    arguments=[CURL_SILENT_ARG, *CURL_STATUS_ARGS, CURRENT_LOCATION_INFO_SERVICE_URL],
     no_internet_exit_code=CURL_NO_INTERNET_CONNECTION_EXIT_CODE,
+    http_status=True,
 )
+GET_GPS_HTTP_COMMAND = HttpCommand(url=CURRENT_LOCATION_INFO_SERVICE_URL)
+COORDINATES_CACHE_KEY = "coordinates"
 
 
 class Coordinates(NamedTuple):
@@ -27,26 +61,351 @@ class Coordinates(NamedTuple):
     longitude: float
 
 
+class CoordinatesSource(NamedTuple):
+    """Source of current GPS coordinates returning None if it knows nothing."""
+
+    get: Callable[[], Optional[Coordinates]]
+    # Sources without asynchronous function are asked in thread of executor
+    get_async: Optional[Callable[[], Awaitable[Optional[Coordinates]]]] = None
+
+
+Named_source = Tuple[str, CoordinatesSource]
+# Name of source with its coordinates or error
+Source_answer = Tuple[str, Optional[Coordinates], Optional[Exception]]
+
+# Sources by names used in config.coordinates_sources
+COORDINATES_SOURCES: Dict[str, CoordinatesSource] = {}
+
+# Concurrent requests of current coordinates share one request
+GPS_FLIGHTS: SingleFlight[str, Coordinates] = SingleFlight("gps")
+
+
+def register_coordinates_source(
+    name: str,
+    get: Callable[[], Optional[Coordinates]],
+    get_async: Optional[Callable[[], Awaitable[Optional[Coordinates]]]] = None,
+) -> None:
+    """Add source of current GPS coordinates or replace source of the same name."""
+    COORDINATES_SOURCES[name] = CoordinatesSource(get, get_async)
+
+
+def round_coordinates(coordinates: Coordinates, precision: int) -> Coordinates:
+    """Return coordinates rounded to number of decimal places."""
+    return Coordinates(
+        latitude=round(coordinates.latitude, precision),
+        longitude=round(coordinates.longitude, precision),
+    )
+
+
+@timed("get_gps_coordinates")
 def get_gps_coordinates() -> Coordinates:
-    """Return current GPS coordinates."""
-    coordinates = _get_gps_coordinates_by_command(GET_GPS_COMMAND)
+    """
+    Return current GPS coordinates from the first source knowing them.
+
+    If no source knows them, error of the first failed source is raised.
+    """
+    sources = _get_coordinates_sources()
+    if config.race_coordinates_sources:
+        return _race_coordinates_sources(sources)
+    errors: List[Exception] = []
+    for name, source in sources:
+        try:
+            coordinates = source.get()
+        # The next source may know coordinates
+        except Exception as err:
+            errors.append(err)
+            continue
+        if coordinates is not None:
+            TIMINGS.count(f"gps_{name}_answers")
+            return coordinates
+    raise _get_sources_error(errors)
+
+
+@timed("get_gps_coordinates")
+async def get_gps_coordinates_async() -> Coordinates:
+    """Return current GPS coordinates without blocking running event loop."""
+    sources = _get_coordinates_sources()
+    if config.race_coordinates_sources:
+        return await _race_coordinates_sources_async(sources)
+    errors: List[Exception] = []
+    for name, source in sources:
+        try:
+            coordinates = await _ask_source_async(source)
+        except Exception as err:
+            errors.append(err)
+            continue
+        if coordinates is not None:
+            TIMINGS.count(f"gps_{name}_answers")
+            return coordinates
+    raise _get_sources_error(errors)
+
+
+def _get_coordinates_sources() -> List[Named_source]:
+    """Return sources of coordinates named in config in their order."""
+    try:
+        return [
+            (name, COORDINATES_SOURCES[name]) for name in config.coordinates_sources
+        ]
+    except KeyError as err:
+        raise CantGetGpsCoordinates(f"There is no source {err} of GPS coordinates")
+
+
+def _race_coordinates_sources(sources: Sequence[Named_source]) -> Coordinates:
+    """
+    Ask sources concurrently and return the first coordinates got.
+
+    Sources are not waited longer than the rest of current deadline.
+    Losing sources finish in daemon threads, nobody waits for them,
+    even at interpreter exit.
+    """
+    answers: "queue.Queue[Source_answer]" = queue.Queue()
+
+    def ask_source(name: str, source: CoordinatesSource) -> None:
+        try:
+            answers.put((name, source.get(), None))
+        except Exception as err:
+            answers.put((name, None, err))
+
+    for name, source in sources:
+        # Every thread runs with its own copy of context keeping current deadline
+        threading.Thread(
+            target=contextvars.copy_context().run,
+            args=(ask_source, name, source),
+            daemon=True,
+        ).start()
+    errors: Dict[str, Exception] = {}
+    deadline = current_deadline()
+    for _ in sources:
+        try:
+            name, coordinates, error = answers.get(
+                timeout=None if deadline is None else max(deadline.remaining(), 0)
+            )
+        except queue.Empty:
+            raise _get_deadline_error()
+        if error is not None:
+            errors[name] = error
+        elif coordinates is not None:
+            TIMINGS.count(f"gps_{name}_answers")
+            return coordinates
+    raise _get_sources_error([errors[name] for name, _ in sources if name in errors])
+
+
+async def _race_coordinates_sources_async(
+    sources: Sequence[Named_source],
+) -> Coordinates:
+    """Ask sources concurrently without blocking running event loop."""
+    tasks: Dict["asyncio.Future[Optional[Coordinates]]", str] = {
+        asyncio.ensure_future(_ask_source_async(source)): name
+        for name, source in sources
+    }
+    running: Set["asyncio.Future[Optional[Coordinates]]"] = set(tasks)
+    errors: Dict[str, BaseException] = {}
+    deadline = current_deadline()
+    try:
+        while running:
+            done, running = await asyncio.wait(
+                running,
+                timeout=None if deadline is None else deadline.remaining(),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not done:
+                raise _get_deadline_error()
+            for task in done:
+                error = task.exception()
+                if error is not None:
+                    errors[tasks[task]] = error
+                    continue
+                coordinates = task.result()
+                if coordinates is not None:
+                    TIMINGS.count(f"gps_{tasks[task]}_answers")
+                    return coordinates
+    finally:
+        for task in running:
+            task.cancel()
+    raise _get_sources_error([errors[name] for name, _ in sources if name in errors])
+
+
+async def _ask_source_async(source: CoordinatesSource) -> Optional[Coordinates]:
+    """Return coordinates known by source without blocking running event loop."""
+    if source.get_async is not None:
+        return await source.get_async()
+    return await asyncio.get_running_loop().run_in_executor(
+        None, contextvars.copy_context().run, source.get
+    )
+
+
+def _get_sources_error(errors: Sequence[BaseException]) -> BaseException:
+    """Return error raised when no source knows coordinates."""
+    if errors:
+        return errors[0]
+    return CantGetGpsCoordinates("No source knows current GPS coordinates")
+
+
+def _get_deadline_error() -> DeadlineExceeded:
+    """Return error raised when sources don't answer in time."""
+    deadline = current_deadline()
+    budget = None if deadline is None else deadline.budget
+    return DeadlineExceeded(
+        f"Time budget of {budget} seconds is spent asking sources of GPS coordinates"
+    )
+
+
+def _get_ipinfo_coordinates() -> Coordinates:
+    """Return coordinates of public IP address cached or requested from ipinfo."""
+    coordinates = _load_cached_coordinates()
+    if coordinates is None:
+        try:
+            coordinates = GPS_FLIGHTS.do(COORDINATES_CACHE_KEY, _request_coordinates)
+        except CommandRunsTooLong as err:
+            return _get_stale_coordinates(err)
+    return coordinates
+
+
+async def _get_ipinfo_coordinates_async() -> Coordinates:
+    """Return coordinates from ipinfo without blocking running event loop."""
+    coordinates = _load_cached_coordinates()
+    if coordinates is None:
+        try:
+            coordinates = await GPS_FLIGHTS.do_async(
+                COORDINATES_CACHE_KEY, _request_coordinates_async
+            )
+        except CommandRunsTooLong as err:
+            return _get_stale_coordinates(err)
     return coordinates
 
 
-def _get_gps_coordinates_by_command(command: ShellCommand) -> Coordinates:
+def _get_offline_coordinates() -> Optional[Coordinates]:
+    """
+    Return coordinates of public IP address in offline IP database or None.
+
+    Address of outgoing connections is taken if public IP address
+    isn't configured, it is private behind NAT and is not found.
+    """
+    public_ip = config.PUBLIC_IP or outgoing_address()
+    return _to_coordinates(IP_DATABASE.lookup(public_ip) if public_ip else None)
+
+
+def _to_coordinates(location: Optional[Location]) -> Optional[Coordinates]:
+    """Return coordinates of location given by local source."""
+    if location is None:
+        return None
+    latitude, longitude = location
+    return Coordinates(latitude=latitude, longitude=longitude)
+
+
+def _request_coordinates() -> Coordinates:
+    """Request coordinates unless other process has just cached them."""
+    # Waiting for lock, other process may get the same coordinates
+    with SHARED_CACHE.lock(COORDINATES_CACHE_KEY):
+        coordinates = _load_cached_coordinates()
+        if coordinates is None:
+            coordinates = _get_gps_coordinates_by_command(_get_gps_command())
+            _save_cached_coordinates(coordinates)
+    return coordinates
+
+
+async def _request_coordinates_async() -> Coordinates:
+    """Request coordinates without blocking running event loop."""
+    async with SHARED_CACHE.lock_async(COORDINATES_CACHE_KEY):
+        coordinates = _load_cached_coordinates()
+        if coordinates is None:
+            coordinates = await _get_gps_coordinates_by_command_async(
+                _get_gps_command()
+            )
+            _save_cached_coordinates(coordinates)
+    return coordinates
+
+
+def _get_stale_coordinates(error: CommandRunsTooLong) -> Coordinates:
+    """
+    Return cached coordinates, even invalid ones, when fresh are not got in time.
+
+    Raises timeout error if there are no coordinates in cache.
+    """
+    coordinates = _load_cached_coordinates(allow_stale=True)
+    if coordinates is None:
+        raise error
+    return coordinates
+
+
+def _load_cached_coordinates(allow_stale: bool = False) -> Optional[Coordinates]:
+    """Return coordinates cached on disk if they are still valid or stale allowed."""
+    if config.coordinates_cache_ttl <= 0:
+        return None
+    if allow_stale:
+        cached_value = SHARED_CACHE.get_stale(COORDINATES_CACHE_KEY)
+    else:
+        cached_value = SHARED_CACHE.get(COORDINATES_CACHE_KEY)
+    if cached_value is None:
+        return None
+    try:
+        cached = json.loads(cached_value)
+        if not allow_stale and cached["network"] != network_fingerprint():
+            return None
+        return Coordinates(
+            latitude=float(cached["latitude"]), longitude=float(cached["longitude"])
+        )
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def _save_cached_coordinates(coordinates: Coordinates) -> None:
+    """Cache coordinates on disk together with network configuration."""
+    if config.coordinates_cache_ttl <= 0:
+        return
+    cached = {
+        "latitude": coordinates.latitude,
+        "longitude": coordinates.longitude,
+        "network": network_fingerprint(),
+    }
+    SHARED_CACHE.set(
+        COORDINATES_CACHE_KEY,
+        json.dumps(cached).encode(),
+        config.coordinates_cache_ttl,
+    )
+
+
+def _get_gps_command() -> Command:
+    """Return command for getting GPS coordinates by configured transport."""
+    if config.transport is Transport.CURL:
+        return GET_GPS_COMMAND
+    return GET_GPS_HTTP_COMMAND
+
+
+def _get_gps_coordinates_by_command(command: Command) -> Coordinates:
     """Return GPS coordinates by shell command."""
     try:
-        command_output, *_ = command.execute()
+        command_output, *_ = fetch.execute(command, "gps")
     except CommandExecutionFailed as err:
         raise CantGetGpsCoordinates(
-            f"Can't get GPS coordinates using "
-            f"{[command.executable, *command.arguments]} command.\n"
-            f"{err}"
+            f"Can't get GPS coordinates using {command} command.\n{err}"
         )
     except UnicodeDecodeError as err:
         raise CantGetGpsCoordinates(f"Can't decode shell command output:\n{err}")
-    coordinates = _parse_coordinates(command_output)
-    return coordinates
+    return _parse_command_output(command_output)
+
+
+async def _get_gps_coordinates_by_command_async(command: Command) -> Coordinates:
+    """Return GPS coordinates by command without blocking running event loop."""
+    try:
+        command_output, *_ = await fetch.execute_async(command, "gps")
+    except CommandExecutionFailed as err:
+        raise CantGetGpsCoordinates(
+            f"Can't get GPS coordinates using {command} command.\n{err}"
+        )
+    except UnicodeDecodeError as err:
+        raise CantGetGpsCoordinates(f"Can't decode shell command output:\n{err}")
+    return _parse_command_output(command_output)
+
+
+def _parse_command_output(command_output: Union[str, bytes]) -> Coordinates:
+    """Return GPS coordinates from decoded or raw output of command."""
+    if isinstance(command_output, bytes):
+        try:
+            command_output = command_output.decode()
+        except UnicodeDecodeError as err:
+            raise CantGetGpsCoordinates(f"Can't decode shell command output:\n{err}")
+    return _parse_coordinates(command_output)
 
 
 def _parse_coordinates(get_gps_command_output: str) -> Coordinates:
@@ -75,3 +434,12 @@ def _parse_coordinates(get_gps_command_output: str) -> Coordinates:
             f"with latitude and longitute inside itself"
         )
     return Coordinates(latitude=latitude, longitude=longitude)
+
+
+register_coordinates_source("static", lambda: _to_coordinates(get_static_location()))
+register_coordinates_source("file", lambda: _to_coordinates(get_file_location()))
+register_coordinates_source("gpsd", lambda: _to_coordinates(get_gpsd_location()))
+register_coordinates_source("ip_database", _get_offline_coordinates)
+register_coordinates_source(
+    "ipinfo", _get_ipinfo_coordinates, _get_ipinfo_coordinates_async
+)
@@ -0,0 +1,97 @@
+"""
+Weather daemon.
+
+Daemon holds warm connection pool and caches, and answers thin client
+(weather_client.py) over Unix domain socket with formatted weather.
+Answer is exit code on the first line and text for printing after it.
+"""
+
+import os
+import socket
+from socketserver import StreamRequestHandler, ThreadingUnixStreamServer
+
+import config
+from coordinates import get_gps_coordinates
+from deadline import Deadline
+from exceptions import NoOpenWeatherApiKey
+from server import UPSTREAM_ERRORS
+from weather_api_service import WEATHER_PREFETCHER, get_weather
+from weather_client import DAEMON_SOCKET_PATH
+from weather_formatter import format_weather
+
+SUCCESS_EXIT_CODE = 0
+ERROR_EXIT_CODE = 1
+
+
+class DaemonAlreadyRunning(Exception):
+    """Another daemon listens on the socket."""
+
+
+class WeatherDaemonHandler(StreamRequestHandler):
+    """Handler answering with formatted weather."""
+
+    def handle(self) -> None:
+        """Answer weather request."""
+        self.rfile.readline()
+        try:
+            with Deadline(config.request_deadline):
+                weather = get_weather(get_gps_coordinates())
+            text = format_weather(weather) + "\n"
+            exit_code = SUCCESS_EXIT_CODE
+        except (*UPSTREAM_ERRORS, NoOpenWeatherApiKey) as err:
+            text = f"{err}\n"
+            exit_code = ERROR_EXIT_CODE
+        self.wfile.write(f"{exit_code}\n{text}".encode())
+
+
+class WeatherDaemon(ThreadingUnixStreamServer):
+    """Threading Unix socket server answering with formatted weather."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str = DAEMON_SOCKET_PATH):
+        """Remove stale socket of dead daemon and listen on the socket."""
+        if os.path.exists(socket_path):
+            if _is_listened(socket_path):
+                raise DaemonAlreadyRunning(
+                    f"Weather daemon is already running on {socket_path}"
+                )
+            os.unlink(socket_path)
+        # Only owner may connect to the socket
+        previous_umask = os.umask(0o177)
+        try:
+            super().__init__(socket_path, WeatherDaemonHandler)
+        finally:
+            os.umask(previous_umask)
+        self.socket_path = socket_path
+
+    def server_close(self) -> None:
+        """Stop listening and remove socket."""
+        super().server_close()
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+
+def run_daemon(socket_path: str = DAEMON_SOCKET_PATH) -> None:
+    """Answer weather requests until interrupted."""
+    with WeatherDaemon(socket_path) as daemon:
+        print(f"Weather daemon is listening on {socket_path}")
+        WEATHER_PREFETCHER.start()
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            WEATHER_PREFETCHER.stop()
+
+
+def _is_listened(socket_path: str) -> bool:
+    """Check if somebody listens on Unix socket."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            return False
+    return True
@@ -0,0 +1,72 @@
+"""
+Time budget of the whole application run.
+
+Deadline entered as context manager becomes current for the code
+running inside it, including commands of all stages, so every command
+waits only for the rest of the budget, not for its own full timeout.
+"""
+
+import time
+from contextvars import ContextVar, Token
+from typing import Any, Callable, Optional
+
+from exceptions import DeadlineExceeded
+from timings import Seconds
+
+_current_deadline: ContextVar[Optional["Deadline"]] = ContextVar(
+    "current_deadline", default=None
+)
+
+
+class Deadline:
+    """Moment when time budget is spent."""
+
+    def __init__(self, budget: Seconds, clock: Callable[[], Seconds] = time.monotonic):
+        """Create deadline in budget seconds from now."""
+        self.budget = budget
+        self._clock = clock
+        self.expires_at = clock() + budget
+        self._token: Optional[Token[Optional[Deadline]]] = None
+
+    def remaining(self) -> Seconds:
+        """Return the rest of budget."""
+        return max(self.expires_at - self._clock(), 0)
+
+    @property
+    def expired(self) -> bool:
+        """Check if budget is spent."""
+        return self.remaining() <= 0
+
+    def __enter__(self) -> "Deadline":
+        """Make deadline current, outer deadline is kept if it is earlier."""
+        outer = _current_deadline.get()
+        if outer is not None:
+            self.expires_at = min(self.expires_at, outer.expires_at)
+        self._token = _current_deadline.set(self)
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        """Restore previous current deadline."""
+        if self._token is not None:
+            _current_deadline.reset(self._token)
+            self._token = None
+
+
+def current_deadline() -> Optional[Deadline]:
+    """Return current deadline or None if run has no time budget."""
+    return _current_deadline.get()
+
+
+def limit_timeout(timeout: Seconds) -> Seconds:
+    """
+    Return timeout cut to the rest of current deadline budget.
+
+    Raises DeadlineExceeded if budget is already spent.
+    """
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return timeout
+    remaining = deadline.remaining()
+    if remaining <= 0:
+        raise DeadlineExceeded(f"Time budget of {deadline.budget} seconds is spent")
+    return min(timeout, remaining)
@@ -21,6 +21,18 @@ class ApiServiceError(Exception):
     """Program can't parse weather from API service response."""
 
 
+class InvalidApiKey(ApiServiceError):
+    """API service rejected API key."""
+
+
+class ApiRateLimited(ApiServiceError):
+    """API service rejected request exceeding requests quota of API key."""
+
+
+class ApiKeysRetired(ApiServiceError):
+    """All API keys are retired after auth or rate limit errors."""
+
+
 class NoOpenWeatherApiKey(Exception):
     """There is no OPEN_WEATHER_API_KEY in environment."""
 
@@ -31,3 +43,23 @@ class CommandExecutionFailed(Exception):
 
 class NoInternetConnection(Exception):
     """There is no internet connection."""
+
+
+class DeadlineExceeded(CommandRunsTooLong):
+    """Time budget of application run is spent."""
+
+
+class QuotaExhausted(CantGetWeather):
+    """Request is not sent to keep within requests quota of API key."""
+
+
+class IpDatabaseError(Exception):
+    """IP ranges can't be imported into offline database."""
+
+
+class CircuitOpen(Exception):
+    """Web service is considered down and requests to it are not sent."""
+
+
+class CommandCancelled(CommandExecutionFailed):
+    """Command is stopped as its result is not needed anymore."""
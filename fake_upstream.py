@@ -0,0 +1,275 @@
+"""
+Local stand-in for location info and Open Weather API services.
+
+It answers with fixed payloads and may be slow, fail and rate limit
+requests, so load and latency of the application can be tested
+without spending API quota. Run it and point the application to it:
+    python fake_upstream.py --port 8081 --latency 0.05 --error-rate 0.01
+    export LOCATION_INFO_SERVICE_URL=http://127.0.0.1:8081/json
+    export OPEN_WEATHER_API_URL=http://127.0.0.1:8081/data/2.5/weather
+    python weather.py
+"""
+
+import json
+import random
+import sys
+import threading
+import time
+from argparse import ArgumentParser, Namespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Counter, Dict, NamedTuple, Optional, Sequence, Tuple, Type
+from urllib.parse import urlsplit
+
+LOCATION_INFO_PATH = "/json"
+OPEN_WEATHER_PATH = "/data/2.5/weather"
+
+LOCATION_INFO_PAYLOAD: Dict[str, Any] = {
+    "ip": "203.0.113.10",
+    "city": "Moscow",
+    "region": "Moscow",
+    "country": "RU",
+    "loc": "55.7522,37.6156",
+    "timezone": "Europe/Moscow",
+}
+
+OPEN_WEATHER_PAYLOAD: Dict[str, Any] = {
+    "coord": {"lon": 37.6156, "lat": 55.7522},
+    "weather": [{"id": 803, "main": "Clouds", "description": "облачно с прояснениями"}],
+    "main": {"temp": 15.43, "feels_like": 14.6, "pressure": 1017, "humidity": 62},
+    "wind": {"speed": 2.5, "deg": 200},
+    "sys": {"country": "RU", "sunrise": 1651539600, "sunset": 1651598714},
+    "name": "Moscow",
+    "cod": 200,
+}
+
+
+def _encode_json(payload: Dict[str, Any]) -> bytes:
+    """Return JSON body of payload."""
+    return json.dumps(payload, ensure_ascii=False).encode()
+
+
+def _pad(body: bytes, padding: int) -> bytes:
+    """Return JSON object body with padding field of padding bytes."""
+    if padding <= 0:
+        return body
+    end = body.rindex(b"}")
+    return body[:end] + b',"padding":"' + b"x" * padding + b'"' + body[end:]
+
+
+NOT_FOUND_BODY = _encode_json({"cod": "404", "message": "Internal error"})
+INTERNAL_ERROR_BODY = _encode_json({"cod": "500", "message": "Internal error"})
+RATE_LIMIT_BODY = _encode_json(
+    {
+        "cod": 429,
+        "message": "Your account is temporary blocked due to exceeding of "
+        "requests limitation of your subscription type.",
+    }
+)
+
+
+class UpstreamBehavior(NamedTuple):
+    """
+    Misbehavior of fake upstream.
+
+    Every response is delayed by latency plus random jitter up to
+    latency_jitter seconds. Share error_rate of responses are 500 errors,
+    share rate_limit_rate of them are 429 errors. Successful responses
+    are padded by padding bytes. Random numbers come from generator
+    seeded by seed, so runs with the same requests are reproducible.
+    """
+
+    latency: float = 0
+    latency_jitter: float = 0
+    error_rate: float = 0
+    rate_limit_rate: float = 0
+    padding: int = 0
+    seed: Optional[int] = None
+
+
+class FakeUpstreamHandler(BaseHTTPRequestHandler):
+    """Handler answering like location info and Open Weather API services."""
+
+    server: "FakeUpstreamServer"
+
+    # HTTP/1.1 keeps connections alive between requests
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, so Nagle's algorithm
+    # would delay body of every keep-alive response
+    disable_nagle_algorithm = True
+    # Subclasses may answer with other bodies, e.g. recorded responses
+    location_info_body = _encode_json(LOCATION_INFO_PAYLOAD)
+    open_weather_body = _encode_json(OPEN_WEATHER_PAYLOAD)
+
+    def do_GET(self) -> None:
+        """Answer GET request."""
+        path = urlsplit(self.path).path
+        if path == LOCATION_INFO_PATH:
+            body = self.location_info_body
+        elif path == OPEN_WEATHER_PATH:
+            body = self.open_weather_body
+        else:
+            self._send_json(404, NOT_FOUND_BODY)
+            return
+        behavior = self.server.behavior
+        delay, outcome = self.server.draw()
+        if delay > 0:
+            time.sleep(delay)
+        if outcome < behavior.error_rate:
+            self._send_json(500, INTERNAL_ERROR_BODY)
+        elif outcome < behavior.error_rate + behavior.rate_limit_rate:
+            self._send_json(429, RATE_LIMIT_BODY)
+        else:
+            self._send_json(200, _pad(body, behavior.padding))
+
+    def _send_json(self, status: int, body: bytes) -> None:
+        """Send JSON response."""
+        self.server.count_response(status)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        """Do not log requests."""
+
+
+class FakeUpstreamServer(ThreadingHTTPServer):
+    """Threading HTTP server ready for many concurrent clients."""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        handler: Type[BaseHTTPRequestHandler],
+        behavior: UpstreamBehavior = UpstreamBehavior(),
+    ):
+        """Create server misbehaving as told."""
+        super().__init__(address, handler)
+        self.behavior = behavior
+        self.responses: Counter[int] = Counter()
+        self._random = random.Random(behavior.seed)
+        self._lock = threading.Lock()
+
+    def draw(self) -> Tuple[float, float]:
+        """Return delay of response and random number choosing its status."""
+        with self._lock:
+            jitter = self._random.uniform(0, self.behavior.latency_jitter)
+            return self.behavior.latency + jitter, self._random.random()
+
+    def count_response(self, status: int) -> None:
+        """Count response with status."""
+        with self._lock:
+            self.responses[status] += 1
+
+
+class FakeUpstream:
+    """Fake upstream server running in a background thread."""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        handler: Type[BaseHTTPRequestHandler] = FakeUpstreamHandler,
+        behavior: UpstreamBehavior = UpstreamBehavior(),
+    ):
+        """Fake upstream constructor."""
+        self.host = host
+        self.server = FakeUpstreamServer((host, port), handler, behavior)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Base URL of the server."""
+        return f"http://{self.host}:{self.server.server_port}"
+
+    @property
+    def location_info_url(self) -> str:
+        """URL of the location info endpoint."""
+        return self.url + LOCATION_INFO_PATH
+
+    @property
+    def open_weather_url(self) -> str:
+        """URL of the Open Weather endpoint."""
+        return self.url + OPEN_WEATHER_PATH
+
+    def start(self) -> "FakeUpstream":
+        """Start serving in a background thread."""
+        self._thread = threading.Thread(
+            target=self.server.serve_forever,
+            kwargs={"poll_interval": 0.01},
+            daemon=True,
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving."""
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "FakeUpstream":
+        """Start server on entering context."""
+        return self.start()
+
+    def __exit__(self, *args: Any) -> None:
+        """Stop server on exiting context."""
+        self.stop()
+
+
+def main(arguments: Sequence[str] = ()) -> None:
+    """Serve fake upstream until interrupted."""
+    options = _parse_arguments(arguments)
+    behavior = UpstreamBehavior(
+        latency=options.latency,
+        latency_jitter=options.latency_jitter,
+        error_rate=options.error_rate,
+        rate_limit_rate=options.rate_limit_rate,
+        padding=options.padding,
+        seed=options.seed,
+    )
+    upstream = FakeUpstream(options.host, options.port, behavior=behavior)
+    print(f"LOCATION_INFO_SERVICE_URL={upstream.location_info_url}")
+    print(f"OPEN_WEATHER_API_URL={upstream.open_weather_url}")
+    try:
+        upstream.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        upstream.server.server_close()
+        print(f"Responses by status: {dict(upstream.server.responses)}")
+
+
+def _parse_arguments(arguments: Sequence[str]) -> Namespace:
+    """Parse command line arguments."""
+    parser = ArgumentParser(description="Serve fake location and weather data.")
+    parser.add_argument("--host", default="127.0.0.1", help="server host")
+    parser.add_argument("--port", type=int, default=8081, help="server port")
+    parser.add_argument(
+        "--latency", type=float, default=0, help="delay of responses in seconds"
+    )
+    parser.add_argument(
+        "--latency-jitter",
+        type=float,
+        default=0,
+        help="maximum random addition to delay in seconds",
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0, help="share of 500 responses"
+    )
+    parser.add_argument(
+        "--rate-limit-rate", type=float, default=0, help="share of 429 responses"
+    )
+    parser.add_argument(
+        "--padding", type=int, default=0, help="bytes added to successful responses"
+    )
+    parser.add_argument("--seed", type=int, help="seed of random generator")
+    return parser.parse_args(arguments)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,293 @@
+"""
+Executing commands of web services with retries and hedging.
+
+Failed attempts are retried after random backoff growing twice
+with every attempt, while current deadline allows waiting for it.
+With hedging enabled, duplicate request is sent when the first one
+has not answered in usual time (p95 of previous successful attempts),
+the first answered request wins and the other one is cancelled:
+its process is killed or its connection is closed.
+Every attempt waits for token of rate limiter if it is given.
+Counters {service}_retries, {service}_hedges and {service}_hedge_wins
+show how often it happens for every service.
+"""
+
+import asyncio
+import concurrent.futures
+import contextvars
+import heapq
+import itertools
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import config
+from cancellation import Cancellation
+from deadline import current_deadline
+from exceptions import (
+    CommandCancelled,
+    CommandExecutionFailed,
+    CommandRunsTooLong,
+    DeadlineExceeded,
+)
+from http_transport import Command
+from rate_limit import SharedTokenBucket
+from shell_command import CommandExecutionResult
+from timings import TIMINGS, Histogram, Seconds
+
+# Hedge delay is taken from latencies after this number of successful attempts
+HEDGE_MIN_SAMPLES = 20
+LATENCY_SAMPLES = 1000
+
+RETRIED_ERRORS = (CommandExecutionFailed, CommandRunsTooLong)
+
+_latencies: Dict[str, Histogram] = {}
+_latencies_lock = threading.Lock()
+
+
+class _Timers:
+    """
+    Calls after delays made by one daemon thread started on first call.
+
+    Hedged attempts which answer in time start no threads.
+    """
+
+    def __init__(self) -> None:
+        """Create timers without scheduled calls."""
+        self._condition = threading.Condition()
+        self._calls: List[Tuple[Seconds, int, Callable[[], None]]] = []
+        self._numbers = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+
+    def schedule(self, delay: Seconds, call: Callable[[], None]) -> int:
+        """Make call after delay, return its number for cancelling."""
+        number = next(self._numbers)
+        with self._condition:
+            heapq.heappush(self._calls, (time.monotonic() + delay, number, call))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="hedge_timers", daemon=True
+                )
+                self._thread.start()
+            self._condition.notify()
+        return number
+
+    def cancel(self, number: int) -> bool:
+        """Cancel call by number, tell if it is cancelled before it is made."""
+        with self._condition:
+            calls = [call for call in self._calls if call[1] != number]
+            if len(calls) == len(self._calls):
+                return False
+            heapq.heapify(calls)
+            self._calls = calls
+            return True
+
+    def _run(self) -> None:
+        """Make calls when their time comes."""
+        while True:
+            with self._condition:
+                while not self._calls or self._calls[0][0] > time.monotonic():
+                    self._condition.wait(
+                        self._calls[0][0] - time.monotonic() if self._calls else None
+                    )
+                _, _, call = heapq.heappop(self._calls)
+            call()
+
+
+_TIMERS = _Timers()
+
+
+def execute(
+    command: Command,
+    service: str,
+    rate_limiter: Optional[SharedTokenBucket] = None,
+) -> CommandExecutionResult:
+    """Execute command of web service retrying and hedging it if configured."""
+    attempt = 0
+    while True:
+        try:
+            if config.hedge_requests:
+                result = _execute_hedged(command, service, rate_limiter)
+            else:
+                if rate_limiter is not None:
+                    rate_limiter.acquire()
+                start = time.perf_counter()
+                result = command.execute()
+                _record_latency(service, time.perf_counter() - start)
+        except DeadlineExceeded:
+            raise
+        except RETRIED_ERRORS:
+            attempt += 1
+            backoff = _get_backoff(attempt)
+            if backoff is None:
+                raise
+            TIMINGS.count(f"{service}_retries")
+            time.sleep(backoff)
+        else:
+            return result
+
+
+async def execute_async(
+    command: Command,
+    service: str,
+    rate_limiter: Optional[SharedTokenBucket] = None,
+) -> CommandExecutionResult:
+    """Execute command of web service retrying and hedging it if configured."""
+    attempt = 0
+    while True:
+        try:
+            if config.hedge_requests:
+                result = await _execute_hedged_async(command, service, rate_limiter)
+            else:
+                if rate_limiter is not None:
+                    await rate_limiter.acquire_async()
+                start = time.perf_counter()
+                result = await command.execute_async()
+                _record_latency(service, time.perf_counter() - start)
+        except DeadlineExceeded:
+            raise
+        except RETRIED_ERRORS:
+            attempt += 1
+            backoff = _get_backoff(attempt)
+            if backoff is None:
+                raise
+            TIMINGS.count(f"{service}_retries")
+            await asyncio.sleep(backoff)
+        else:
+            return result
+
+
+def hedge_delay(service: str) -> Seconds:
+    """Return time to wait for answer before sending duplicate request."""
+    with _latencies_lock:
+        latencies = _latencies.get(service)
+        if latencies is None or latencies.calls < HEDGE_MIN_SAMPLES:
+            return config.hedge_delay
+        return latencies.stats().p95
+
+
+def clear_latencies() -> None:
+    """Forget latencies of web services."""
+    with _latencies_lock:
+        _latencies.clear()
+
+
+def _execute_hedged(
+    command: Command, service: str, rate_limiter: Optional[SharedTokenBucket]
+) -> CommandExecutionResult:
+    """
+    Execute command, and its duplicate too if command answers slowly.
+
+    The first attempt runs in calling thread, thread of duplicate one
+    is started only when hedge delay passes. Attempt answered first
+    cancels the other one.
+    """
+    first, second = Cancellation(), Cancellation()
+    hedge: "concurrent.futures.Future[CommandExecutionResult]"
+    hedge = concurrent.futures.Future()
+    # Duplicate attempt runs with copy of context keeping current deadline
+    context = contextvars.copy_context()
+
+    def run_hedge() -> None:
+        try:
+            result = context.run(_execute_attempt, command, rate_limiter, second)
+        except BaseException as err:
+            hedge.set_exception(err)
+        else:
+            hedge.set_result(result)
+            first.cancel()
+
+    def start_hedge() -> None:
+        TIMINGS.count(f"{service}_hedges")
+        threading.Thread(target=run_hedge, name=f"hedge_{service}", daemon=True).start()
+
+    start = time.perf_counter()
+    timer = _TIMERS.schedule(hedge_delay(service), start_hedge)
+    try:
+        try:
+            result = _execute_attempt(command, rate_limiter, first)
+        except Exception:
+            if _TIMERS.cancel(timer):
+                raise
+            # Duplicate attempt is running, it may answer
+            result = hedge.result()
+            TIMINGS.count(f"{service}_hedge_wins")
+    finally:
+        _TIMERS.cancel(timer)
+        second.cancel()
+    _record_latency(service, time.perf_counter() - start)
+    return result
+
+
+def _execute_attempt(
+    command: Command,
+    rate_limiter: Optional[SharedTokenBucket],
+    cancellation: Cancellation,
+) -> CommandExecutionResult:
+    """Execute attempt of hedged command unless it is cancelled."""
+    if rate_limiter is not None:
+        rate_limiter.acquire()
+    if cancellation.cancelled:
+        raise CommandCancelled(f"Command {command} is cancelled")
+    return command.execute(cancellation)
+
+
+async def _execute_hedged_async(
+    command: Command, service: str, rate_limiter: Optional[SharedTokenBucket]
+) -> CommandExecutionResult:
+    """Execute command, and its duplicate too if command answers slowly."""
+
+    async def execute_attempt() -> CommandExecutionResult:
+        if rate_limiter is not None:
+            await rate_limiter.acquire_async()
+        return await command.execute_async()
+
+    start = time.perf_counter()
+    first = asyncio.ensure_future(execute_attempt())
+    running: Set["asyncio.Future[CommandExecutionResult]"] = {first}
+    try:
+        done, _ = await asyncio.wait(running, timeout=hedge_delay(service))
+        if not done:
+            TIMINGS.count(f"{service}_hedges")
+            running.add(asyncio.ensure_future(execute_attempt()))
+        while True:
+            done, running = await asyncio.wait(
+                running, return_when=asyncio.FIRST_COMPLETED
+            )
+            failed: Optional["asyncio.Future[CommandExecutionResult]"] = None
+            for task in done:
+                if task.exception() is None:
+                    if task is not first:
+                        TIMINGS.count(f"{service}_hedge_wins")
+                    _record_latency(service, time.perf_counter() - start)
+                    return task.result()
+                failed = task
+            if not running and failed is not None:
+                return failed.result()
+    finally:
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+
+
+def _get_backoff(attempt: int) -> Optional[Seconds]:
+    """Return random delay before retry or None if there must be no retry."""
+    if attempt >= config.retry_attempts:
+        return None
+    backoff = random.uniform(
+        0, min(config.retry_max_backoff, config.retry_backoff * 2 ** (attempt - 1))
+    )
+    deadline = current_deadline()
+    if deadline is not None and deadline.remaining() <= backoff:
+        return None
+    return backoff
+
+
+def _record_latency(service: str, latency: Seconds) -> None:
+    """Remember latency of successful attempt."""
+    with _latencies_lock:
+        latencies = _latencies.get(service)
+        if latencies is None:
+            latencies = _latencies[service] = Histogram(LATENCY_SAMPLES)
+        latencies.record(latency)
@@ -0,0 +1,431 @@
+"""HTTP transport used by application."""
+
+import asyncio
+import functools
+import socket
+import ssl
+import threading
+from http.client import (
+    BadStatusLine,
+    HTTPConnection,
+    HTTPException,
+    HTTPSConnection,
+    RemoteDisconnected,
+)
+from typing import Dict, List, MutableMapping, Optional, Tuple, Union
+from urllib.parse import urlsplit
+from weakref import WeakKeyDictionary
+
+import config
+from cancellation import Cancellation, cancelling
+from deadline import limit_timeout
+from exceptions import (
+    CommandExecutionFailed,
+    CommandRunsTooLong,
+    DeadlineExceeded,
+    NoInternetConnection,
+)
+from shell_command import (
+    SERVER_ERROR_STATUS,
+    SUCCESS_EXIT_CODE,
+    CommandExecutionResult,
+    ShellCommand,
+)
+from timings import timed
+
+Http_status = int
+Host_key = Tuple[str, str, int]
+Streams = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+Idle_streams = Dict[Host_key, List[Streams]]
+
+HTTP_PORT = 80
+HTTPS_PORT = 443
+
+
+class HttpConnectionPool:
+    """
+    Pool of persistent keep-alive HTTP connections.
+
+    Connections are kept open between requests, so repeated requests
+    to the same host skip DNS lookup, TCP connect and TLS handshake.
+    """
+
+    def __init__(self, max_idle_connections_per_host: int = 10):
+        """Create pool of keep-alive connections."""
+        self.max_idle_connections_per_host = max_idle_connections_per_host
+        self._idle_connections: Dict[Host_key, List[HTTPConnection]] = {}
+        self._lock = threading.Lock()
+        self._ssl_context = ssl.create_default_context()
+
+    def request(
+        self, url: str, timeout: float, cancellation: Optional[Cancellation] = None
+    ) -> Tuple[Http_status, bytes]:
+        """
+        Make GET request and return response status and body.
+
+        Connection of cancelled request is shut down and closed.
+        """
+        host_key, path = _split_url(url)
+        connection, is_reused = self._acquire(host_key, timeout)
+        try:
+            status, body, will_close = self._send(connection, path, cancellation)
+        except (HTTPException, ConnectionError):
+            connection.close()
+            if not is_reused:
+                raise
+            # Server has closed idle keep-alive connection, so try a fresh one
+            connection = self._connect(host_key, timeout)
+            try:
+                status, body, will_close = self._send(connection, path, cancellation)
+            except BaseException:
+                connection.close()
+                raise
+        except BaseException:
+            connection.close()
+            raise
+        if will_close:
+            connection.close()
+        else:
+            self._release(host_key, connection)
+        return status, body
+
+    def close(self) -> None:
+        """Close all idle connections."""
+        with self._lock:
+            idle_connections = self._idle_connections
+            self._idle_connections = {}
+        for connections in idle_connections.values():
+            for connection in connections:
+                connection.close()
+
+    def _acquire(
+        self, host_key: Host_key, timeout: float
+    ) -> Tuple[HTTPConnection, bool]:
+        """Return idle connection to host or new one and if it is reused."""
+        with self._lock:
+            connections = self._idle_connections.get(host_key)
+            connection = connections.pop() if connections else None
+        if connection is None:
+            return self._connect(host_key, timeout), False
+        connection.timeout = timeout
+        if connection.sock is not None:
+            connection.sock.settimeout(timeout)
+        return connection, True
+
+    def _release(self, host_key: Host_key, connection: HTTPConnection) -> None:
+        """Return connection to the pool."""
+        with self._lock:
+            connections = self._idle_connections.setdefault(host_key, [])
+            if len(connections) < self.max_idle_connections_per_host:
+                connections.append(connection)
+                return
+        connection.close()
+
+    def _connect(self, host_key: Host_key, timeout: float) -> HTTPConnection:
+        """Return new connection to host."""
+        scheme, host, port = host_key
+        if scheme == "https":
+            return HTTPSConnection(
+                host, port, timeout=timeout, context=self._ssl_context
+            )
+        return HTTPConnection(host, port, timeout=timeout)
+
+    def _send(
+        self,
+        connection: HTTPConnection,
+        path: str,
+        cancellation: Optional[Cancellation],
+    ) -> Tuple[Http_status, bytes, bool]:
+        """Send GET request and return status, body and if connection closes."""
+        with cancelling(
+            cancellation,
+            functools.partial(_shut_down, connection),
+            f"Request to '{connection.host}{path}'",
+        ):
+            connection.request("GET", path, headers={"Connection": "keep-alive"})
+            response = connection.getresponse()
+            body = response.read()
+        return response.status, body, response.will_close
+
+
+class AsyncHttpConnectionPool:
+    """
+    Pool of persistent keep-alive HTTP connections for asyncio.
+
+    Connections belong to event loop which has opened them,
+    so every running event loop has its own idle connections.
+    """
+
+    def __init__(self, max_idle_connections_per_host: int = 10):
+        """Create pool of keep-alive connections."""
+        self.max_idle_connections_per_host = max_idle_connections_per_host
+        self._idle_connections: MutableMapping[
+            asyncio.AbstractEventLoop, Idle_streams
+        ] = WeakKeyDictionary()
+        self._ssl_context = ssl.create_default_context()
+
+    async def request(self, url: str, timeout: float) -> Tuple[Http_status, bytes]:
+        """
+        Make GET request and return response status and body.
+
+        Raises asyncio.TimeoutError if request runs longer than timeout.
+        """
+        host_key, path = _split_url(url)
+        return await asyncio.wait_for(self._request(host_key, path), timeout)
+
+    async def _request(
+        self, host_key: Host_key, path: str
+    ) -> Tuple[Http_status, bytes]:
+        """Make GET request through idle or new connection."""
+        streams, is_reused = await self._acquire(host_key)
+        try:
+            status, body, will_close = await _send_async(streams, host_key, path)
+        except (HTTPException, ConnectionError, asyncio.IncompleteReadError):
+            _close_streams(streams)
+            if not is_reused:
+                raise
+            # Server has closed idle keep-alive connection, so try a fresh one
+            streams = await self._connect(host_key)
+            try:
+                status, body, will_close = await _send_async(streams, host_key, path)
+            except BaseException:
+                _close_streams(streams)
+                raise
+        except BaseException:
+            _close_streams(streams)
+            raise
+        if will_close:
+            _close_streams(streams)
+        else:
+            self._release(host_key, streams)
+        return status, body
+
+    async def _acquire(self, host_key: Host_key) -> Tuple[Streams, bool]:
+        """Return idle connection to host or new one and if it is reused."""
+        connections = self._loop_connections().get(host_key)
+        while connections:
+            streams = connections.pop()
+            if not streams[0].at_eof():
+                return streams, True
+            _close_streams(streams)
+        return await self._connect(host_key), False
+
+    def _release(self, host_key: Host_key, streams: Streams) -> None:
+        """Return connection to the pool."""
+        connections = self._loop_connections().setdefault(host_key, [])
+        if len(connections) < self.max_idle_connections_per_host:
+            connections.append(streams)
+        else:
+            _close_streams(streams)
+
+    def _loop_connections(self) -> Idle_streams:
+        """Return idle connections of running event loop."""
+        return self._idle_connections.setdefault(asyncio.get_running_loop(), {})
+
+    async def _connect(self, host_key: Host_key) -> Streams:
+        """Return new connection to host."""
+        scheme, host, port = host_key
+        return await asyncio.open_connection(
+            host, port, ssl=self._ssl_context if scheme == "https" else None
+        )
+
+
+# Batch requests run concurrently, so pool keeps connection for each of them
+DEFAULT_POOL = HttpConnectionPool(
+    max_idle_connections_per_host=config.weather_batch_concurrency
+)
+DEFAULT_ASYNC_POOL = AsyncHttpConnectionPool(
+    max_idle_connections_per_host=config.weather_batch_concurrency
+)
+
+
+class HttpCommand:
+    """
+    HTTP GET request to web service.
+
+    It has the same interface as ShellCommand, but runs in process
+    and reuses connections from the pool instead of spawning curl.
+    Like 'curl -s' it returns response body whatever status it has,
+    except server error status, which raises CommandExecutionFailed.
+    With raw_output response body is returned as is, without decoding.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        timeout: float = 5,
+        pool: HttpConnectionPool = DEFAULT_POOL,
+        raw_output: bool = False,
+        async_pool: AsyncHttpConnectionPool = DEFAULT_ASYNC_POOL,
+    ):
+        """HTTP command constructor."""
+        self.url = url
+        self.timeout = timeout
+        self.pool = pool
+        self.raw_output = raw_output
+        self.async_pool = async_pool
+
+    def __str__(self) -> str:
+        """Return command representation for messages."""
+        return str(["GET", self.url])
+
+    @timed("execute_command")
+    def execute(
+        self, cancellation: Optional[Cancellation] = None
+    ) -> CommandExecutionResult:
+        """
+        Execute HTTP request, waiting not longer than current deadline.
+
+        Connection of cancelled request is closed.
+        """
+        timeout = limit_timeout(self.timeout)
+        try:
+            status, body = self.pool.request(self.url, timeout, cancellation)
+        except socket.timeout:
+            raise self._timeout_error(timeout)
+        except socket.gaierror as err:
+            raise NoInternetConnection(
+                f"There is no internet connection. "
+                f"Request to '{self.url}' has ended with\n{err}"
+            )
+        except (OSError, HTTPException) as err:
+            raise CommandExecutionFailed(
+                f"Request to '{self.url}' has ended with error:\n{err!r}"
+            )
+        return self._make_result(status, body)
+
+    @timed("execute_command")
+    async def execute_async(self) -> CommandExecutionResult:
+        """Execute HTTP request in running event loop."""
+        timeout = limit_timeout(self.timeout)
+        try:
+            status, body = await self.async_pool.request(self.url, timeout)
+        except asyncio.TimeoutError:
+            raise self._timeout_error(timeout)
+        except socket.gaierror as err:
+            raise NoInternetConnection(
+                f"There is no internet connection. "
+                f"Request to '{self.url}' has ended with\n{err}"
+            )
+        except (OSError, HTTPException, EOFError, ValueError) as err:
+            raise CommandExecutionFailed(
+                f"Request to '{self.url}' has ended with error:\n{err!r}"
+            )
+        return self._make_result(status, body)
+
+    def _timeout_error(self, timeout: float) -> CommandRunsTooLong:
+        """Return error of request which has run out of timeout."""
+        if timeout < self.timeout:
+            return DeadlineExceeded(
+                f"Request to '{self.url}' is stopped after {timeout:.2f} seconds, "
+                f"time budget of run is spent"
+            )
+        return CommandRunsTooLong(
+            f"Request to '{self.url}' runs more than {timeout} seconds"
+        )
+
+    def _make_result(self, status: Http_status, body: bytes) -> CommandExecutionResult:
+        """Return result of successful request or raise error of server error."""
+        if status >= SERVER_ERROR_STATUS:
+            raise CommandExecutionFailed(
+                f"Request to '{self.url}' has got response with HTTP status {status}"
+            )
+        return CommandExecutionResult(
+            stdout_data=(
+                body if self.raw_output else self._preprocess_stdout_data(body)
+            ),
+            stderr_data=b"",
+            exit_code=SUCCESS_EXIT_CODE,
+        )
+
+    def _preprocess_stdout_data(self, stdout_data: bytes) -> str:
+        """Decode, strip response body."""
+        return stdout_data.decode().strip()
+
+
+Command = Union[ShellCommand, HttpCommand]
+
+
+def _shut_down(connection: HTTPConnection) -> None:
+    """Shut connection down, so request waiting for response ends at once."""
+    if connection.sock is not None:
+        try:
+            connection.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+def _split_url(url: str) -> Tuple[Host_key, str]:
+    """Return host key and path with query of URL."""
+    parts = urlsplit(url)
+    host_key = (
+        parts.scheme,
+        parts.hostname or "",
+        parts.port or (HTTPS_PORT if parts.scheme == "https" else HTTP_PORT),
+    )
+    path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+    return host_key, path
+
+
+async def _send_async(
+    streams: Streams, host_key: Host_key, path: str
+) -> Tuple[Http_status, bytes, bool]:
+    """Send GET request and return status, body and if connection closes."""
+    reader, writer = streams
+    scheme, host, port = host_key
+    default_port = HTTPS_PORT if scheme == "https" else HTTP_PORT
+    host_header = host if port == default_port else f"{host}:{port}"
+    writer.write(
+        f"GET {path} HTTP/1.1\r\nHost: {host_header}\r\n"
+        f"Connection: keep-alive\r\n\r\n".encode("latin-1")
+    )
+    await writer.drain()
+    status_line = await reader.readline()
+    if not status_line:
+        raise RemoteDisconnected("Remote end closed connection without response")
+    try:
+        version, status, *_ = status_line.decode("latin-1").split(None, 2)
+        http_status = int(status)
+    except ValueError:
+        raise BadStatusLine(repr(status_line))
+    if not version.startswith("HTTP/"):
+        raise BadStatusLine(repr(status_line))
+    headers: Dict[str, str] = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    connection = headers.get("connection", "").lower()
+    will_close = connection == "close" or (
+        version == "HTTP/1.0" and connection != "keep-alive"
+    )
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        body = await _read_chunked(reader)
+    elif "content-length" in headers:
+        body = await reader.readexactly(int(headers["content-length"]))
+    else:
+        body = await reader.read()
+        will_close = True
+    return http_status, body, will_close
+
+
+async def _read_chunked(reader: asyncio.StreamReader) -> bytes:
+    """Return body sent with chunked transfer encoding."""
+    chunks = []
+    while True:
+        size = int((await reader.readline()).split(b";")[0], 16)
+        if size == 0:
+            break
+        chunks.append(await reader.readexactly(size))
+        await reader.readexactly(2)
+    # Skip trailer headers
+    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+        pass
+    return b"".join(chunks)
+
+
+def _close_streams(streams: Streams) -> None:
+    """Close connection."""
+    streams[1].close()
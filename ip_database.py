@@ -0,0 +1,234 @@
+"""
+Offline database of locations of IP address ranges.
+
+CSV file of ranges is imported once into compact binary file of records
+sorted by first address of range. The file is memory-mapped and searched
+by bisection, so lookup takes microseconds without network requests,
+and pages of the file are shared by all processes. Import it with:
+    python ip_database.py dbip-city-lite.csv
+"""
+
+import csv
+import mmap
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import config
+from exceptions import IpDatabaseError
+from timings import Seconds
+
+IP_DATABASE_FILE_NAME = "ip_locations.bin"
+RECHECK_INTERVAL = 1  # seconds
+MAGIC = b"WIPLOC01"
+# Header holds magic and number of records
+_HEADER = struct.Struct("<8sQ")
+# Record holds first and last addresses of range as 16 bytes big-endian
+# numbers (IPv4 addresses are mapped to IPv6), so bytes compare as numbers,
+# and latitude with longitude of range
+_RECORD = struct.Struct("<16s16sff")
+_ADDRESS_SIZE = 16
+_IPV4_MAPPED_PREFIX = b"\0" * 10 + b"\xff\xff"
+
+Location = Tuple[float, float]  # latitude and longitude
+# Locations are stored as 32-bit floats, digits beyond this are noise
+COORDINATES_PRECISION = 4
+
+
+class IpDatabase:
+    """
+    Memory-mapped database of IP ranges locations.
+
+    Database file is config.IP_DATABASE_FILE or lies in config.CACHE_DIR.
+    File is checked for replacement by new import not more often than
+    every recheck_interval seconds. Missing or broken file works as empty
+    database.
+    """
+
+    def __init__(
+        self,
+        file_name: str = IP_DATABASE_FILE_NAME,
+        recheck_interval: Seconds = RECHECK_INTERVAL,
+        clock: Callable[[], Seconds] = time.monotonic,
+    ):
+        """Database constructor, file is mapped on first lookup."""
+        self.file_name = file_name
+        self.recheck_interval = recheck_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._data: Optional[mmap.mmap] = None
+        self._file_id: Optional[Tuple[Path, int, int]] = None
+        self._checked: Optional[Tuple[Path, Seconds]] = None
+
+    @property
+    def path(self) -> Path:
+        """Path of database file."""
+        if config.IP_DATABASE_FILE:
+            return Path(config.IP_DATABASE_FILE)
+        return config.CACHE_DIR / self.file_name
+
+    def lookup(self, ip_address: str) -> Optional[Location]:
+        """Return latitude and longitude of IP address or None if it is unknown."""
+        try:
+            key = _address_key(ip_address)
+        except ValueError:
+            return None
+        data = self._map()
+        if data is None:
+            return None
+        # The last range starting not after address may contain it
+        low, high = 0, (len(data) - _HEADER.size) // _RECORD.size
+        while low < high:
+            middle = (low + high) // 2
+            offset = _HEADER.size + middle * _RECORD.size
+            if data[offset : offset + _ADDRESS_SIZE] <= key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == 0:
+            return None
+        _, last, latitude, longitude = _RECORD.unpack_from(
+            data, _HEADER.size + (low - 1) * _RECORD.size
+        )
+        if key > last:
+            return None
+        return (
+            round(latitude, COORDINATES_PRECISION),
+            round(longitude, COORDINATES_PRECISION),
+        )
+
+    def _map(self) -> Optional[mmap.mmap]:
+        """
+        Return mapped database file or None if it can't be used.
+
+        Map of replaced file is not closed, it is unmapped when lookups
+        of other threads using it end.
+        """
+        path = self.path
+        now = self._clock()
+        with self._lock:
+            if self._checked is not None:
+                checked_path, checked_at = self._checked
+                if checked_path == path and now - checked_at < self.recheck_interval:
+                    return self._data
+            self._checked = (path, now)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                self._data = self._file_id = None
+                return None
+            file_id = (path, stat.st_ino, stat.st_mtime_ns)
+            if file_id != self._file_id:
+                self._file_id = file_id
+                try:
+                    self._data = _open_database(path)
+                except (OSError, ValueError):
+                    self._data = None
+            return self._data
+
+
+def import_csv(csv_path: Path, database_path: Path) -> int:
+    """
+    Import CSV file of IP ranges into database file, return number of ranges.
+
+    First two columns of rows are first and last addresses of range,
+    last two columns are latitude and longitude, like in DB-IP and
+    IP2Location lite CSV files. Database file is replaced at once,
+    so running lookups see either old or new database.
+    """
+    records: List[bytes] = []
+    try:
+        with open(csv_path, newline="", encoding="utf-8") as csv_file:
+            for row_number, row in enumerate(csv.reader(csv_file), start=1):
+                if row:
+                    records.append(_pack_row(row, row_number))
+    except (OSError, UnicodeDecodeError, csv.Error) as err:
+        raise IpDatabaseError(f"Can't read IP ranges from {csv_path}:\n{err}")
+    # Records are sorted by first address as it comes first in big-endian bytes
+    records.sort()
+    database_path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = database_path.with_name(f".{database_path.name}.{os.getpid()}")
+    try:
+        with open(temporary_path, "wb") as database_file:
+            database_file.write(_HEADER.pack(MAGIC, len(records)))
+            database_file.writelines(records)
+        os.replace(temporary_path, database_path)
+    except OSError as err:
+        temporary_path.unlink(missing_ok=True)
+        raise IpDatabaseError(f"Can't write IP database {database_path}:\n{err}")
+    return len(records)
+
+
+def _pack_row(row: Sequence[str], row_number: int) -> bytes:
+    """Return database record of CSV row."""
+    try:
+        if len(row) < 4:
+            raise ValueError("too few columns")
+        first, last = _address_key(row[0].strip()), _address_key(row[1].strip())
+        latitude, longitude = float(row[-2]), float(row[-1])
+        if first > last:
+            raise ValueError("first address of range is after last one")
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValueError("wrong coordinates")
+    except ValueError as err:
+        raise IpDatabaseError(f"Wrong IP range in row {row_number}: {row}\n{err}")
+    return _RECORD.pack(first, last, latitude, longitude)
+
+
+def _address_key(ip_address: str) -> bytes:
+    """Return address as 16 bytes comparable as numbers, IPv4 mapped to IPv6."""
+    # inet_pton is several times faster than ipaddress module
+    try:
+        return _IPV4_MAPPED_PREFIX + socket.inet_pton(socket.AF_INET, ip_address)
+    except OSError:
+        pass
+    try:
+        return socket.inet_pton(socket.AF_INET6, ip_address)
+    except OSError:
+        raise ValueError(f"{ip_address!r} is not IP address")
+
+
+def _open_database(path: Path) -> mmap.mmap:
+    """Map database file, raise ValueError if it is not database."""
+    with open(path, "rb") as database_file:
+        data = mmap.mmap(database_file.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        magic, records_number = _HEADER.unpack_from(data)
+    except struct.error:
+        magic, records_number = b"", 0
+    if magic != MAGIC or len(data) != _HEADER.size + records_number * _RECORD.size:
+        data.close()
+        raise ValueError(f"{path} is not IP database")
+    return data
+
+
+IP_DATABASE = IpDatabase()
+
+
+def main(arguments: Sequence[str] = ()) -> None:
+    """Import CSV file of IP ranges."""
+    options = _parse_arguments(arguments)
+    database_path = Path(options.output) if options.output else IP_DATABASE.path
+    try:
+        ranges_number = import_csv(Path(options.csv_file), database_path)
+    except IpDatabaseError as err:
+        sys.exit(str(err))
+    print(f"{ranges_number} IP ranges are imported into {database_path}")
+
+
+def _parse_arguments(arguments: Sequence[str]) -> Namespace:
+    """Parse command line arguments."""
+    parser = ArgumentParser(description="Import locations of IP ranges from CSV.")
+    parser.add_argument("csv_file", help="CSV file of IP ranges with coordinates")
+    parser.add_argument("--output", help="database file instead of default one")
+    return parser.parse_args(arguments)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,97 @@
+"""
+Local sources of current location.
+
+Location may be set in environment, kept in file by other program
+or reported by gpsd daemon of GPS receiver. Sources return None
+if they know nothing, so the next source is asked.
+"""
+
+import json
+import socket
+import time
+from typing import Optional
+
+import config
+from deadline import limit_timeout
+from exceptions import CantGetGpsCoordinates
+from ip_database import Location
+
+GPSD_WATCH_COMMAND = b'?WATCH={"enable":true,"json":true};\n'
+# Mode of gpsd report with 2D or 3D fix
+GPSD_FIX_MODE = 2
+
+
+def parse_location(text: str) -> Location:
+    """Return location from text 'latitude,longitude'."""
+    try:
+        latitude, longitude = map(float, text.split(","))
+    except ValueError:
+        raise CantGetGpsCoordinates(
+            f"'{text}' is not 'latitude,longitude' of GPS coordinates"
+        )
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise CantGetGpsCoordinates(f"'{text}' are wrong GPS coordinates")
+    return latitude, longitude
+
+
+def get_static_location() -> Optional[Location]:
+    """Return location set in config or None."""
+    if not config.STATIC_COORDINATES:
+        return None
+    return parse_location(config.STATIC_COORDINATES)
+
+
+def get_file_location() -> Optional[Location]:
+    """Return location kept in file or None if there is no file."""
+    if not config.COORDINATES_FILE:
+        return None
+    try:
+        with open(config.COORDINATES_FILE) as coordinates_file:
+            text = coordinates_file.read()
+    except FileNotFoundError:
+        return None
+    except (OSError, UnicodeDecodeError) as err:
+        raise CantGetGpsCoordinates(
+            f"Can't read GPS coordinates from {config.COORDINATES_FILE}:\n{err}"
+        )
+    return parse_location(text.strip())
+
+
+def get_gpsd_location() -> Optional[Location]:
+    """
+    Return location of GPS receiver reported by gpsd or None.
+
+    None is returned if gpsd isn't running or receiver has no fix
+    within gpsd_timeout.
+    """
+    if config.gpsd_timeout <= 0:
+        return None
+    timeout = limit_timeout(config.gpsd_timeout)
+    expires_at = time.monotonic() + timeout
+    try:
+        with socket.create_connection(
+            (config.gpsd_host, config.gpsd_port), timeout=timeout
+        ) as connection:
+            connection.sendall(GPSD_WATCH_COMMAND)
+            reports = connection.makefile("rb")
+            while True:
+                connection.settimeout(max(expires_at - time.monotonic(), 0.001))
+                line = reports.readline()
+                if not line:
+                    return None
+                location = _parse_gpsd_report(line)
+                if location is not None:
+                    return location
+    except OSError:  # refused connection or timeout
+        return None
+
+
+def _parse_gpsd_report(line: bytes) -> Optional[Location]:
+    """Return location from gpsd report if it is position with fix."""
+    try:
+        report = json.loads(line)
+        if report.get("class") != "TPV" or report.get("mode", 0) < GPSD_FIX_MODE:
+            return None
+        return float(report["lat"]), float(report["lon"])
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return None
@@ -0,0 +1,60 @@
+"""Local network configuration."""
+
+import hashlib
+import socket
+from typing import List
+
+LINUX_ROUTE_TABLE = "/proc/net/route"
+LINUX_IPV6_ADDRESSES = "/proc/net/if_inet6"
+DEFAULT_ROUTE_DESTINATION = "00000000"
+# Connecting UDP socket sends nothing, it only chooses route and source address
+ROUTE_PROBE_ADDRESS = ("192.0.2.1", 9)
+
+
+def network_fingerprint() -> str:
+    """
+    Return hash of local network configuration.
+
+    It changes when default route or interface addresses change,
+    so it tells if public IP address of host could have changed.
+    """
+    parts = [
+        *_default_routes(),
+        outgoing_address(),
+        *_ipv6_addresses(),
+    ]
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def _default_routes() -> List[str]:
+    """Return interfaces and gateways of default routes (Linux only)."""
+    try:
+        with open(LINUX_ROUTE_TABLE) as route_table:
+            next(route_table, None)
+            routes = [line.split() for line in route_table]
+    except OSError:
+        return []
+    return sorted(
+        f"{route[0]} {route[2]}"
+        for route in routes
+        if len(route) > 2 and route[1] == DEFAULT_ROUTE_DESTINATION
+    )
+
+
+def outgoing_address() -> str:
+    """Return local address used for outgoing connections."""
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.connect(ROUTE_PROBE_ADDRESS)
+            return str(sock.getsockname()[0])
+    except OSError:
+        return ""
+
+
+def _ipv6_addresses() -> List[str]:
+    """Return IPv6 addresses of interfaces (Linux only)."""
+    try:
+        with open(LINUX_IPV6_ADDRESSES) as addresses:
+            return sorted(line.split()[0] for line in addresses if line.strip())
+    except OSError:
+        return []
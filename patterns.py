@@ -1,7 +1,7 @@
 """Patterns."""
 
 open_weather_api_url_pattern = (
-    "https://api.openweathermap.org/data/2.5/weather?"
+    "{api_url}?"
     "lat={latitude}&"
     "lon={longitude}&"
     "appid={api_key}&"
@@ -19,6 +19,9 @@ weather_displaying_pattern = (
 )
 
 
+stale_weather_note = "Свежая погода не получена, показана последняя известная\n"
+
+
 measurement_unit_warning_pattern = (
     "No such option for {unit_variable_name}: '{unit_variable_value}'. "
     "Available measurement units for {measurement} are "
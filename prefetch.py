@@ -0,0 +1,181 @@
+"""
+Refreshing hot cache entries before they expire.
+
+Prefetcher counts accesses of cache keys, counts are halved every
+refresh cycle, so they follow recent popularity. Keys accessed often
+enough are refreshed shortly before their cache entries expire,
+so requests for them never wait for web service. Refreshes are limited
+by budget of upstream calls per period.
+"""
+
+import threading
+import time
+from typing import (
+    Callable,
+    Counter,
+    Dict,
+    Generic,
+    Hashable,
+    NamedTuple,
+    Optional,
+    Set,
+    TypeVar,
+)
+
+from cache import TtlLruCache
+from timings import TIMINGS, Seconds
+
+Key = TypeVar("Key", bound=Hashable)
+Value = TypeVar("Value")
+
+
+class PrefetchStats(NamedTuple):
+    """Counters of refreshing ahead."""
+
+    refreshes: int
+    hits: int
+    failures: int
+    skipped: int
+
+
+class Prefetcher(Generic[Key, Value]):
+    """
+    Background refresher of hot cache entries.
+
+    Counters {name}_prefetch_refreshes, _hits (reads of refreshed
+    entries), _failures and _skipped (over budget) tell if refreshing
+    pays off.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        cache: "TtlLruCache[Key, Value]",
+        refresh: Callable[[Key], object],
+        interval: Seconds,
+        ahead: Seconds,
+        min_accesses: int,
+        budget: int,
+        budget_period: Seconds,
+        clock: Callable[[], Seconds] = time.monotonic,
+    ):
+        """
+        Prefetcher constructor.
+
+        Refresh function requests fresh value for key and puts it in cache.
+        """
+        self.name = name
+        self.cache = cache
+        self.refresh = refresh
+        self.interval = interval
+        self.ahead = ahead
+        self.min_accesses = min_accesses
+        self.budget = budget
+        self.budget_period = budget_period
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._accesses: Counter[Key] = Counter()
+        self._prefetched: Set[Key] = set()
+        self._calls_left = budget
+        self._period_start = clock()
+        self._counters: Dict[str, int] = dict.fromkeys(PrefetchStats._fields, 0)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def record_access(self, key: Key, hit: bool) -> None:
+        """Count access of key, hit tells if value was taken from cache."""
+        with self._lock:
+            self._accesses[key] += 1
+            if key in self._prefetched:
+                self._prefetched.discard(key)
+                if hit:
+                    self._count("hits")
+
+    def refresh_due(self) -> int:
+        """Refresh hot entries expiring soon, return number of refreshes."""
+        with self._lock:
+            hot_keys = [
+                key
+                for key, accesses in self._accesses.most_common()
+                if accesses >= self.min_accesses
+            ]
+            for key in list(self._accesses):
+                self._accesses[key] //= 2
+                if not self._accesses[key]:
+                    del self._accesses[key]
+        refreshed = 0
+        for key in hot_keys:
+            expires_in = self.cache.expires_in(key)
+            if expires_in is None or expires_in > self.ahead:
+                continue
+            if not self._take_budget():
+                with self._lock:
+                    self._count("skipped")
+                continue
+            try:
+                self.refresh(key)
+            # Refreshing must go on after any failure of web service
+            except Exception:
+                with self._lock:
+                    self._count("failures")
+                continue
+            refreshed += 1
+            with self._lock:
+                self._prefetched.add(key)
+                self._count("refreshes")
+        return refreshed
+
+    @property
+    def stats(self) -> PrefetchStats:
+        """Counters of refreshing ahead."""
+        with self._lock:
+            return PrefetchStats(**self._counters)
+
+    def clear(self) -> None:
+        """Forget accesses and reset counters."""
+        with self._lock:
+            self._accesses.clear()
+            self._prefetched.clear()
+            self._calls_left = self.budget
+            self._period_start = self._clock()
+            self._counters = dict.fromkeys(PrefetchStats._fields, 0)
+
+    def start(self) -> None:
+        """Start refreshing in background thread every interval."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name=f"{self.name}-prefetcher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop background thread."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        """Refresh entries until stopped."""
+        while not self._stop.wait(self.interval):
+            self.refresh_due()
+
+    def _take_budget(self) -> bool:
+        """Take one upstream call from budget and tell if it was left."""
+        with self._lock:
+            now = self._clock()
+            if now - self._period_start >= self.budget_period:
+                self._period_start = now
+                self._calls_left = self.budget
+            if self._calls_left <= 0:
+                return False
+            self._calls_left -= 1
+            return True
+
+    def _count(self, event: str) -> None:
+        """Count event, lock must be held."""
+        self._counters[event] += 1
+        TIMINGS.count(f"{self.name}_prefetch_{event}")
@@ -0,0 +1,167 @@
+"""
+Rate limiter of requests shared by processes on one host.
+
+Tokens of bucket are kept in small file, which is locked while tokens
+are taken, so all processes spend the same quota. Request takes a token
+even if there is none yet and waits until it is refilled, so waiting
+requests are sent evenly paced in order of their arrival. Request which
+would wait longer than allowed or than the rest of its deadline is shed.
+"""
+
+import asyncio
+import fcntl
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Callable, NamedTuple, Optional
+
+import config
+from deadline import current_deadline
+from exceptions import QuotaExhausted
+from timings import TIMINGS, Seconds
+
+# Bucket file holds number of tokens and time of its last update
+_STATE = struct.Struct("dd")
+
+
+class RateLimiterStats(NamedTuple):
+    """Counters of paced requests."""
+
+    requests: int
+    delayed: int
+    shed: int
+    waited: Seconds
+
+
+class SharedTokenBucket:
+    """
+    Token bucket refilled with rate tokens per second up to capacity.
+
+    Bucket file lies in config.CACHE_DIR. If it can't be used, requests
+    are not limited. Request made to wait adds to
+    {name}_rate_limit_delayed, request not sent to {name}_rate_limit_shed.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        capacity: float,
+        max_wait: Seconds,
+        clock: Callable[[], Seconds] = time.time,
+    ):
+        """Bucket constructor, rate 0 disables limiting."""
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self.max_wait = max_wait
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._delayed = 0
+        self._shed = 0
+        self._waited: Seconds = 0
+
+    def acquire(self) -> None:
+        """Wait for token, raise QuotaExhausted if it would be waited too long."""
+        time.sleep(self._take_token())
+
+    async def acquire_async(self) -> None:
+        """Wait for token without blocking running event loop."""
+        await asyncio.sleep(self._take_token())
+
+    def available(self) -> float:
+        """Return number of tokens left, negative if requests wait for them."""
+        if self.rate <= 0:
+            return self.capacity
+        try:
+            with open(self.path, "rb") as bucket_file:
+                fcntl.flock(bucket_file, fcntl.LOCK_SH)
+                state = bucket_file.read(_STATE.size)
+        except OSError:
+            return self.capacity
+        return self._refill(state, self._clock())
+
+    @property
+    def path(self) -> Path:
+        """Path of bucket file."""
+        return config.CACHE_DIR / f"{self.name}.bucket"
+
+    @property
+    def stats(self) -> RateLimiterStats:
+        """Counters of paced requests."""
+        with self._lock:
+            return RateLimiterStats(
+                requests=self._requests,
+                delayed=self._delayed,
+                shed=self._shed,
+                waited=self._waited,
+            )
+
+    def clear(self) -> None:
+        """Reset counters."""
+        with self._lock:
+            self._requests = self._delayed = self._shed = 0
+            self._waited = 0
+
+    def _take_token(self) -> Seconds:
+        """Take token and return time to wait for it."""
+        if self.rate <= 0:
+            return 0
+        max_wait = self.max_wait
+        deadline = current_deadline()
+        if deadline is not None:
+            max_wait = min(max_wait, deadline.remaining())
+        wait: Optional[Seconds]
+        try:
+            wait = self._update_bucket(max_wait)
+        except OSError:
+            wait = 0
+        with self._lock:
+            self._requests += 1
+            if wait is None:
+                self._shed += 1
+                TIMINGS.count(f"{self.name}_rate_limit_shed")
+            elif wait > 0:
+                self._delayed += 1
+                self._waited += wait
+                TIMINGS.count(f"{self.name}_rate_limit_delayed")
+        if wait is None:
+            raise QuotaExhausted(
+                f"Requests quota of {self.name} is spent, "
+                f"request is not sent to keep within {self.rate * 60:g} per minute"
+            )
+        return wait
+
+    def _update_bucket(self, max_wait: Seconds) -> Optional[Seconds]:
+        """
+        Take token from bucket file and return time to wait for it.
+
+        Return None and take nothing if token would be waited longer
+        than max_wait.
+        """
+        config.CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        bucket_file = os.open(self.path, os.O_RDWR | os.O_CREAT)
+        try:
+            fcntl.flock(bucket_file, fcntl.LOCK_EX)
+            now = self._clock()
+            tokens = self._refill(os.pread(bucket_file, _STATE.size, 0), now)
+            # Tokens below zero are taken by requests waiting for them
+            wait = max(1 - tokens, 0) / self.rate
+            if wait > max_wait:
+                return None
+            os.pwrite(bucket_file, _STATE.pack(tokens - 1, now), 0)
+            return wait
+        finally:
+            os.close(bucket_file)
+
+    def _refill(self, state: bytes, now: Seconds) -> float:
+        """Return number of tokens by state read from bucket file."""
+        if len(state) != _STATE.size:
+            return self.capacity
+        tokens: float
+        updated_at: Seconds
+        tokens, updated_at = _STATE.unpack(state)
+        return min(self.capacity, tokens + max(now - updated_at, 0) * self.rate)
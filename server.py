@@ -0,0 +1,156 @@
+"""
+HTTP server giving formatted weather.
+
+Server process lives long, so connection pool and caches stay warm
+between requests. Weather is requested at /weather?lat=..&lon=..&units=..,
+without coordinates weather is given for current GPS coordinates.
+Durations of stages are given as JSON at /metrics.
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import config
+from config import SpeedUnit, TemperatureUnit
+from coordinates import Coordinates, get_gps_coordinates
+from deadline import Deadline
+from exceptions import (
+    ApiServiceError,
+    CantGetGpsCoordinates,
+    CantGetWeather,
+    CommandRunsTooLong,
+    DeadlineExceeded,
+    NoInternetConnection,
+    NoOpenWeatherApiKey,
+    NoSuchCommand,
+)
+from timings import TIMINGS
+from weather_api_service import WEATHER_PREFETCHER, get_weather
+from weather_formatter import format_weather
+
+WEATHER_PATH = "/weather"
+METRICS_PATH = "/metrics"
+
+# Names of measurement systems are the same as in Open Weather API service
+UNITS: Dict[str, Tuple[TemperatureUnit, SpeedUnit]] = {
+    "metric": (TemperatureUnit.CELSIUS, SpeedUnit.METERS_PER_SECOND),
+    "imperial": (TemperatureUnit.FAHRENHEIT, SpeedUnit.MILES_PER_HOUR),
+    "standard": (TemperatureUnit.KELVIN, SpeedUnit.METERS_PER_SECOND),
+}
+
+UPSTREAM_ERRORS = (
+    ApiServiceError,
+    CantGetGpsCoordinates,
+    CantGetWeather,
+    CommandRunsTooLong,
+    NoInternetConnection,
+    NoSuchCommand,
+)
+
+
+class BadRequest(Exception):
+    """Request has invalid parameters."""
+
+
+class WeatherRequestHandler(BaseHTTPRequestHandler):
+    """Handler giving formatted weather."""
+
+    # HTTP/1.1 keeps connections alive between requests
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self) -> None:
+        """Answer GET request."""
+        parts = urlsplit(self.path)
+        if parts.path == METRICS_PATH:
+            self._send_text(200, TIMINGS.to_json(), "application/json")
+            return
+        if parts.path != WEATHER_PATH:
+            self._send_text(404, "Not found\n")
+            return
+        try:
+            self._send_text(200, self._format_weather(parse_qs(parts.query)))
+        except BadRequest as err:
+            self._send_text(400, f"{err}\n")
+        except DeadlineExceeded as err:
+            self._send_text(504, f"{err}\n")
+        except UPSTREAM_ERRORS as err:
+            self._send_text(502, f"{err}\n")
+        except NoOpenWeatherApiKey as err:
+            self._send_text(500, f"{err}\n")
+
+    def _format_weather(self, query: Dict[str, List[str]]) -> str:
+        """Return formatted weather for query parameters."""
+        coordinates = _parse_coordinates(query)
+        units = _parse_units(query)
+        with Deadline(config.request_deadline):
+            weather = get_weather(coordinates or get_gps_coordinates())
+        if units is None:
+            return format_weather(weather)
+        return format_weather(weather, *units)
+
+    def _send_text(
+        self, status: int, text: str, content_type: str = "text/plain"
+    ) -> None:
+        """Send text response."""
+        body = text.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        """Do not log requests."""
+
+
+class WeatherServer(ThreadingHTTPServer):
+    """Threading HTTP server giving formatted weather."""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, host: str, port: int):
+        """Weather server constructor."""
+        super().__init__((host, port), WeatherRequestHandler)
+
+
+def serve(host: str, port: int) -> None:
+    """Serve weather until interrupted."""
+    TIMINGS.enabled = True
+    WEATHER_PREFETCHER.start()
+    with WeatherServer(host, port) as server:
+        print(f"Serving weather on http://{host}:{server.server_port}{WEATHER_PATH}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            WEATHER_PREFETCHER.stop()
+
+
+def _parse_coordinates(query: Dict[str, List[str]]) -> Optional[Coordinates]:
+    """Return coordinates from query parameters if they are given."""
+    if "lat" not in query and "lon" not in query:
+        return None
+    try:
+        latitude = float(query["lat"][0])
+        longitude = float(query["lon"][0])
+    except (KeyError, ValueError):
+        raise BadRequest("Both lat and lon must be numbers")
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise BadRequest("lat must be in [-90, 90] and lon in [-180, 180]")
+    return Coordinates(latitude=latitude, longitude=longitude)
+
+
+def _parse_units(
+    query: Dict[str, List[str]]
+) -> Optional[Tuple[TemperatureUnit, SpeedUnit]]:
+    """Return measurement units from query parameters if they are given."""
+    if "units" not in query:
+        return None
+    units = query["units"][0]
+    if units not in UNITS:
+        raise BadRequest(f"units must be one of {', '.join(UNITS)}")
+    return UNITS[units]
@@ -0,0 +1,228 @@
+"""
+Cache on disk shared by all processes of the application.
+
+Entries are kept in SQLite database in write-ahead log mode, so readers
+don't wait for writers. Process going to request web service takes lock
+of the entry key first, so concurrent runs on one host make only one
+request for the same key, the others wait and read its result. Stuck
+holder of lock delays them only for config.shared_cache_lock_timeout.
+"""
+
+import asyncio
+import fcntl
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from pathlib import Path
+from typing import AsyncIterator, Iterator, Optional, Tuple
+
+import config
+from deadline import limit_timeout
+from timings import Seconds
+
+SHARED_CACHE_FILE_NAME = "cache.sqlite3"
+LOCKS_DIR_NAME = "locks"
+# Keys are locked by files of this number, keys with the same file wait each other
+LOCK_FILES_NUMBER = 256
+LOCK_POLL_INTERVAL = 0.01  # seconds
+BUSY_TIMEOUT = 5  # seconds
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_expires_at ON entries (expires_at);
+"""
+
+
+class SharedCache:
+    """
+    Bounded cache with time to live for entries in SQLite database.
+
+    Database lies in config.CACHE_DIR. When cache is full, entries
+    expiring first are evicted. Expired entries are not returned by get,
+    but stay in cache until evicted or overwritten. Cache never raises
+    errors of database: broken database is recreated, unavailable one
+    works as empty cache.
+    """
+
+    def __init__(self, max_size: int, file_name: str = SHARED_CACHE_FILE_NAME):
+        """Shared cache constructor, database is opened on first use."""
+        self.max_size = max_size
+        self.file_name = file_name
+        self._local = threading.local()
+
+    @property
+    def path(self) -> Path:
+        """Path of database file."""
+        return config.CACHE_DIR / self.file_name
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return fresh value by key or None."""
+        return self._get(key, time.time())
+
+    def get_stale(self, key: str) -> Optional[bytes]:
+        """Return value by key even if it has expired, or None."""
+        return self._get(key, float("-inf"))
+
+    def set(self, key: str, value: bytes, ttl: Seconds) -> None:
+        """Put value in cache for ttl seconds."""
+        if self.max_size <= 0:
+            return
+        try:
+            with self._connect() as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?)",
+                    (key, value, time.time() + ttl),
+                )
+                connection.execute(
+                    "DELETE FROM entries WHERE key IN (SELECT key FROM entries "
+                    "ORDER BY expires_at LIMIT max((SELECT count(*) FROM entries) "
+                    "- ?, 0))",
+                    (self.max_size,),
+                )
+        except (OSError, sqlite3.Error):
+            pass
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        try:
+            with self._connect() as connection:
+                connection.execute("DELETE FROM entries")
+        except (OSError, sqlite3.Error):
+            pass
+
+    def __len__(self) -> int:
+        """Return number of entries in cache."""
+        try:
+            (size,) = self._connect().execute("SELECT count(*) FROM entries").fetchone()
+        except (OSError, sqlite3.Error):
+            return 0
+        return int(size)
+
+    @contextmanager
+    def lock(self, key: str) -> Iterator[None]:
+        """
+        Hold lock of key shared by processes.
+
+        Lock is waited not longer than config.shared_cache_lock_timeout,
+        then nothing is held. If the rest of current deadline is shorter,
+        DeadlineExceeded is raised when it is spent. If lock file can't
+        be opened, nothing is held.
+        """
+        lock_file = self._open_lock_file(key)
+        if lock_file is None:
+            yield
+            return
+        try:
+            expires_at = time.monotonic() + config.shared_cache_lock_timeout
+            while not _try_lock(lock_file):
+                interval = _get_poll_interval(expires_at)
+                if interval is None:
+                    break
+                time.sleep(interval)
+            yield
+        finally:
+            os.close(lock_file)
+
+    @asynccontextmanager
+    async def lock_async(self, key: str) -> AsyncIterator[None]:
+        """Hold lock of key shared by processes without blocking event loop."""
+        lock_file = self._open_lock_file(key)
+        if lock_file is None:
+            yield
+            return
+        try:
+            expires_at = time.monotonic() + config.shared_cache_lock_timeout
+            while not _try_lock(lock_file):
+                interval = _get_poll_interval(expires_at)
+                if interval is None:
+                    break
+                await asyncio.sleep(interval)
+            yield
+        finally:
+            os.close(lock_file)
+
+    def _get(self, key: str, fresh_after: Seconds) -> Optional[bytes]:
+        """Return value by key if it expires after given time, or None."""
+        try:
+            row: Optional[Tuple[bytes]] = (
+                self._connect()
+                .execute(
+                    "SELECT value FROM entries WHERE key = ? AND expires_at > ?",
+                    (key, fresh_after),
+                )
+                .fetchone()
+            )
+        except (OSError, sqlite3.Error):
+            return None
+        return None if row is None else row[0]
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return connection of current thread to database."""
+        path = self.path
+        if getattr(self._local, "path", None) == path:
+            connection: sqlite3.Connection = self._local.connection
+            return connection
+        if getattr(self._local, "connection", None) is not None:
+            self._local.connection.close()
+            self._local.connection = self._local.path = None
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            connection = _open_database(path)
+        except sqlite3.DatabaseError as err:
+            if isinstance(err, sqlite3.OperationalError):
+                raise
+            # File is not a database, the cache is recreated
+            path.unlink()
+            connection = _open_database(path)
+        self._local.path, self._local.connection = path, connection
+        return connection
+
+    def _open_lock_file(self, key: str) -> Optional[int]:
+        """Return descriptor of file locking key or None if it can't be opened."""
+        number = int(hashlib.sha1(key.encode()).hexdigest(), 16) % LOCK_FILES_NUMBER
+        locks_dir = config.CACHE_DIR / LOCKS_DIR_NAME
+        try:
+            locks_dir.mkdir(parents=True, exist_ok=True)
+            return os.open(locks_dir / f"{number}.lock", os.O_RDWR | os.O_CREAT)
+        except OSError:
+            return None
+
+
+def _open_database(path: Path) -> sqlite3.Connection:
+    """Open database, creating its table if needed."""
+    connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+    try:
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(_SCHEMA)
+    except sqlite3.Error:
+        connection.close()
+        raise
+    return connection
+
+
+def _try_lock(lock_file: int) -> bool:
+    """Take lock of file if it is free and tell if it is taken."""
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+
+def _get_poll_interval(expires_at: Seconds) -> Optional[Seconds]:
+    """Return time to sleep before next try to lock or None if wait is over."""
+    remaining = expires_at - time.monotonic()
+    if remaining <= 0:
+        return None
+    return limit_timeout(min(LOCK_POLL_INTERVAL, remaining))
+
+
+SHARED_CACHE = SharedCache(max_size=config.shared_cache_max_size)
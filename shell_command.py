@@ -1,14 +1,20 @@
 """Shell command used by application."""
 
+import asyncio
+import time
 from subprocess import PIPE, Popen, TimeoutExpired
-from typing import List, NamedTuple, Optional
+from typing import List, NamedTuple, Optional, Union
 
+from cancellation import Cancellation, cancelling
+from deadline import limit_timeout
 from exceptions import (
     CommandExecutionFailed,
     CommandRunsTooLong,
+    DeadlineExceeded,
     NoInternetConnection,
     NoSuchCommand,
 )
+from timings import timed
 
 SUCCESS_EXIT_CODE = 0
 
@@ -17,12 +23,16 @@ Exit_code = int
 CURL = "curl"
 CURL_SILENT_ARG = "-s"
 CURL_NO_INTERNET_CONNECTION_EXIT_CODE = 6
+# curl writes status of response on the last line after its body
+CURL_STATUS_ARGS = ["-w", "\n%{http_code}"]
+# Responses with this status or above are failures of web service
+SERVER_ERROR_STATUS = 500
 
 
 class CommandExecutionResult(NamedTuple):
     """Result of shell command execution."""
 
-    stdout_data: str
+    stdout_data: Union[str, bytes]
     stderr_data: bytes
     exit_code: int
 
@@ -34,23 +44,48 @@ class ShellCommand:
     Application works like request -> response and
     it's runtime must be as fast as it possible.
     That's why there is a timeout field in this class.
+    With raw_output stdout data is returned as is, without decoding.
+    With http_status the last line of stdout is HTTP status written
+    by curl, it is cut off and server error status raises error.
     """
 
+    raw_output = False
+    http_status = False
+
     def __init__(
         self,
         executable: str,
         arguments: List[str] = [],
         timeout: float = 5,
         no_internet_exit_code: Optional[Exit_code] = None,
+        raw_output: bool = False,
+        http_status: bool = False,
     ):
         """Shell command constructor."""
         self.executable = executable
         self.arguments = arguments
         self.timeout = timeout
         self.no_internet_exit_code = no_internet_exit_code
+        self.raw_output = raw_output
+        self.http_status = http_status
+
+    def __str__(self) -> str:
+        """Return command representation for messages."""
+        return str([self.executable, *self.arguments])
+
+    @timed("execute_command")
+    def execute(
+        self, cancellation: Optional[Cancellation] = None
+    ) -> CommandExecutionResult:
+        """
+        Execute shell command.
 
-    def execute(self) -> CommandExecutionResult:
-        """Execute shell command."""
+        Command is given its timeout once for the whole execution,
+        cut to the rest of current deadline budget if there is one.
+        Process of cancelled command is killed.
+        """
+        timeout = limit_timeout(self.timeout)
+        expires_at = time.monotonic() + timeout
         try:
             process = Popen(args=[self.executable, *self.arguments], stdout=PIPE)
         except FileNotFoundError:
@@ -58,13 +93,52 @@ class ShellCommand:
                 f"There's no command '{self.executable}' in your system"
             )
         try:
-            (stdout, stderr) = process.communicate(timeout=self.timeout)
-            exit_code = process.wait(timeout=self.timeout)
+            with cancelling(cancellation, process.kill, f"Command {self}"):
+                (stdout, stderr) = process.communicate(timeout=timeout)
+                exit_code = process.wait(timeout=max(expires_at - time.monotonic(), 0))
         except TimeoutExpired as err:
             process.kill()
-            raise CommandRunsTooLong(
-                f"Command '{err.cmd}' runs more than {err.timeout} seconds"
+            process.wait()
+            raise self._timeout_error(f"Command '{err.cmd}'", timeout)
+        return self._make_result(stdout, stderr, exit_code)
+
+    @timed("execute_command")
+    async def execute_async(self) -> CommandExecutionResult:
+        """Execute shell command in running event loop."""
+        args = [self.executable, *self.arguments]
+        timeout = limit_timeout(self.timeout)
+        try:
+            process = await asyncio.create_subprocess_exec(*args, stdout=PIPE)
+        except FileNotFoundError:
+            raise NoSuchCommand(
+                f"There's no command '{self.executable}' in your system"
             )
+        try:
+            (stdout, stderr) = await asyncio.wait_for(process.communicate(), timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise self._timeout_error(f"Command '{args}'", timeout)
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            raise
+        exit_code = await process.wait()
+        return self._make_result(stdout, stderr, exit_code)
+
+    def _timeout_error(self, name: str, timeout: float) -> CommandRunsTooLong:
+        """Return error of command which has run out of timeout."""
+        if timeout < self.timeout:
+            return DeadlineExceeded(
+                f"{name} is stopped after {timeout:.2f} seconds, "
+                f"time budget of run is spent"
+            )
+        return CommandRunsTooLong(f"{name} runs more than {timeout} seconds")
+
+    def _make_result(
+        self, stdout: bytes, stderr: bytes, exit_code: Exit_code
+    ) -> CommandExecutionResult:
+        """Return result of finished command or raise its error."""
         if exit_code == self.no_internet_exit_code:
             raise NoInternetConnection(
                 f"There is no internet connection. "
@@ -76,12 +150,25 @@ class ShellCommand:
                 f"Command has ended with exit_code: "
                 f"{exit_code} and stderr:\n{stderr}"  # type: ignore
             )
+        if self.http_status:
+            stdout = self._cut_http_status(stdout)
         return CommandExecutionResult(
-            stdout_data=self._preprocess_stdout_data(stdout),
+            stdout_data=(
+                stdout if self.raw_output else self._preprocess_stdout_data(stdout)
+            ),
             stderr_data=stderr,
             exit_code=exit_code,
         )
 
+    def _cut_http_status(self, stdout: bytes) -> bytes:
+        """Return stdout without HTTP status, raise error if it is server error."""
+        body, _, status = stdout.rpartition(b"\n")
+        if status.isdigit() and int(status) >= SERVER_ERROR_STATUS:
+            raise CommandExecutionFailed(
+                f"Command {self} has got response with HTTP status {int(status)}"
+            )
+        return body
+
     def _preprocess_stdout_data(self, stdout_data: bytes) -> str:
-        """Decode, strip, lower stdout data."""
-        return stdout_data.decode().strip().lower()
+        """Decode, strip stdout data."""
+        return stdout_data.decode().strip()
@@ -0,0 +1,165 @@
+"""
+Coalescing concurrent calls for the same key.
+
+The first caller asking for a key runs the call, callers asking for
+the same key while it runs wait for it and get its result or error,
+so a burst of identical lookups makes one request to web service.
+Waiting callers wait not longer than the rest of their deadlines.
+"""
+
+import asyncio
+import threading
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    NamedTuple,
+    Optional,
+    Tuple,
+    TypeVar,
+    cast,
+)
+
+from deadline import current_deadline
+from exceptions import DeadlineExceeded
+from timings import TIMINGS
+
+Key = TypeVar("Key", bound=Hashable)
+Value = TypeVar("Value")
+
+
+class FlightStats(NamedTuple):
+    """Counters of coalesced calls."""
+
+    calls: int
+    coalesced: int
+
+    @property
+    def dedup_ratio(self) -> float:
+        """Share of calls served by call of another caller."""
+        return self.coalesced / self.calls if self.calls else 0.0
+
+
+class _Call(Generic[Value]):
+    """Call running in some thread."""
+
+    def __init__(self) -> None:
+        """Create running call."""
+        self.done = threading.Event()
+        self.result: Optional[Value] = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight(Generic[Key, Value]):
+    """
+    Group of calls coalesced by keys.
+
+    Every call adds to {name}_lookups counter, call which has joined
+    running one adds to {name}_coalesced too.
+    """
+
+    def __init__(self, name: str):
+        """Create group without running calls."""
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Key, _Call[Value]] = {}
+        self._futures: Dict[
+            Tuple[asyncio.AbstractEventLoop, Key], "asyncio.Future[Value]"
+        ] = {}
+        self._calls_number = 0
+        self._coalesced = 0
+
+    def do(self, key: Key, function: Callable[[], Value]) -> Value:
+        """Return result of function, shared with concurrent callers of key."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if call is None:
+                call = self._calls[key] = _Call()
+            self._count(coalesced=not leader)
+        if not leader:
+            return self._wait(call)
+        try:
+            call.result = function()
+            return call.result
+        except BaseException as err:
+            call.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def do_async(
+        self, key: Key, function: Callable[[], Awaitable[Value]]
+    ) -> Value:
+        """Return result of coroutine function, shared in running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            future = self._futures.get((loop, key))
+            leader = future is None
+            if future is None:
+                future = self._futures[loop, key] = loop.create_future()
+            self._count(coalesced=not leader)
+        if not leader:
+            deadline = current_deadline()
+            try:
+                return await asyncio.wait_for(
+                    asyncio.shield(future),
+                    None if deadline is None else deadline.remaining(),
+                )
+            except asyncio.TimeoutError:
+                raise self._deadline_error()
+        try:
+            result = await function()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as err:
+            future.set_exception(err)
+            # Error is raised here, so it is retrieved even without waiters
+            future.exception()
+            raise
+        finally:
+            with self._lock:
+                del self._futures[loop, key]
+
+    @property
+    def stats(self) -> FlightStats:
+        """Counters of coalesced calls."""
+        with self._lock:
+            return FlightStats(calls=self._calls_number, coalesced=self._coalesced)
+
+    def clear(self) -> None:
+        """Reset counters."""
+        with self._lock:
+            self._calls_number = self._coalesced = 0
+
+    def _wait(self, call: _Call[Value]) -> Value:
+        """Wait for call of another thread and return its result."""
+        deadline = current_deadline()
+        if not call.done.wait(None if deadline is None else deadline.remaining()):
+            raise self._deadline_error()
+        if call.error is not None:
+            raise call.error
+        return cast(Value, call.result)
+
+    def _deadline_error(self) -> DeadlineExceeded:
+        """Return error of waiting caller whose deadline is spent."""
+        deadline = current_deadline()
+        budget = None if deadline is None else deadline.budget
+        return DeadlineExceeded(
+            f"Time budget of {budget} seconds is spent waiting for {self.name}"
+        )
+
+    def _count(self, coalesced: bool) -> None:
+        """Count call, lock must be held."""
+        self._calls_number += 1
+        TIMINGS.count(f"{self.name}_lookups")
+        if coalesced:
+            self._coalesced += 1
+            TIMINGS.count(f"{self.name}_coalesced")
@@ -0,0 +1,205 @@
+"""
+Spatial index of cached values by GPS coordinates.
+
+Coordinates are put in grid cells as wide as search radius, so nearest
+value within radius is looked for only in the cell of coordinates and
+cells around it. Exact-key cache misses requests made a few hundred
+meters away from cached point, the index answers them.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import (
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    Iterator,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+from coordinates import Coordinates
+from timings import TIMINGS, Seconds
+
+Tag = TypeVar("Tag", bound=Hashable)
+Value = TypeVar("Value")
+
+Kilometers = float
+
+EARTH_RADIUS = 6371.0  # km
+KM_PER_DEGREE = EARTH_RADIUS * math.pi / 180
+
+Cell = Tuple[int, int]
+
+
+class SpatialStats(NamedTuple):
+    """Counters of nearby lookups."""
+
+    hits: int
+    misses: int
+
+    @property
+    def hit_ratio(self) -> float:
+        """Share of lookups answered by nearby value."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def distance(first: Coordinates, second: Coordinates) -> Kilometers:
+    """Return great-circle distance between coordinates."""
+    latitude_1, longitude_1, latitude_2, longitude_2 = map(
+        math.radians, (*first, *second)
+    )
+    haversine = (
+        math.sin((latitude_2 - latitude_1) / 2) ** 2
+        + math.cos(latitude_1)
+        * math.cos(latitude_2)
+        * math.sin((longitude_2 - longitude_1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(haversine)))
+
+
+class SpatialIndex(Generic[Tag, Value]):
+    """
+    Bounded index of values with time to live by coordinates and tag.
+
+    Values with different tags, e.g. languages, don't answer for each
+    other. When index is full, the value put first is evicted. Lookups
+    are tallied as {name}_nearby_hits and {name}_nearby_misses.
+    Radius 0 disables the index.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        radius: Kilometers,
+        max_size: int,
+        ttl: Seconds,
+        clock: Callable[[], Seconds] = time.monotonic,
+    ):
+        """Spatial index constructor."""
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[Tag, Coordinates], Tuple[Seconds, Value]]"
+        self._entries = OrderedDict()
+        self._cells: Dict[Tuple[Tag, Cell], Set[Coordinates]] = {}
+        self._hits = 0
+        self._misses = 0
+        self.radius = radius
+
+    @property
+    def radius(self) -> Kilometers:
+        """Distance within which values answer for coordinates."""
+        return self._radius
+
+    @radius.setter
+    def radius(self, radius: Kilometers) -> None:
+        """Change radius, values are put in cells of new size."""
+        with self._lock:
+            self._radius = radius
+            self._step = radius / KM_PER_DEGREE
+            entries = list(self._entries)
+            self._cells.clear()
+            if radius > 0:
+                for tag, coordinates in entries:
+                    self._cell_entries(tag, coordinates).add(coordinates)
+
+    def nearest(
+        self, coordinates: Coordinates, tag: Tag
+    ) -> Optional[Tuple[Coordinates, Value]]:
+        """Return fresh value nearest to coordinates within radius or None."""
+        if self._radius <= 0:
+            return None
+        now = self._clock()
+        with self._lock:
+            nearest: Optional[Tuple[Coordinates, Value]] = None
+            nearest_distance = self._radius
+            for cell in self._cells_around(coordinates):
+                for point in self._cells.get((tag, cell), ()):
+                    expires_at, value = self._entries[tag, point]
+                    if expires_at <= now:
+                        continue
+                    point_distance = distance(coordinates, point)
+                    if point_distance <= nearest_distance:
+                        nearest, nearest_distance = (point, value), point_distance
+            if nearest is None:
+                self._misses += 1
+                TIMINGS.count(f"{self.name}_nearby_misses")
+            else:
+                self._hits += 1
+                TIMINGS.count(f"{self.name}_nearby_hits")
+            return nearest
+
+    def set(self, coordinates: Coordinates, tag: Tag, value: Value) -> None:
+        """Put value for coordinates in index."""
+        if self._radius <= 0 or self.max_size <= 0:
+            return
+        with self._lock:
+            key = (tag, coordinates)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            else:
+                self._cell_entries(tag, coordinates).add(coordinates)
+            self._entries[key] = (self._clock() + self.ttl, value)
+            while len(self._entries) > self.max_size:
+                (evicted_tag, evicted), _ = self._entries.popitem(last=False)
+                cell_key = (evicted_tag, self._cell(evicted))
+                self._cells[cell_key].discard(evicted)
+                if not self._cells[cell_key]:
+                    del self._cells[cell_key]
+
+    @property
+    def stats(self) -> SpatialStats:
+        """Counters of nearby lookups."""
+        with self._lock:
+            return SpatialStats(hits=self._hits, misses=self._misses)
+
+    def clear(self) -> None:
+        """Remove all values and reset counters."""
+        with self._lock:
+            self._entries.clear()
+            self._cells.clear()
+            self._hits = self._misses = 0
+
+    def __len__(self) -> int:
+        """Return number of values in index."""
+        with self._lock:
+            return len(self._entries)
+
+    def _cell_entries(self, tag: Tag, coordinates: Coordinates) -> Set[Coordinates]:
+        """Return coordinates in cell of coordinates, lock must be held."""
+        return self._cells.setdefault((tag, self._cell(coordinates)), set())
+
+    def _cell(self, coordinates: Coordinates) -> Cell:
+        """Return grid cell of coordinates."""
+        return (
+            math.floor(coordinates.latitude / self._step),
+            math.floor(coordinates.longitude / self._step) % self._cells_per_turn(),
+        )
+
+    def _cells_around(self, coordinates: Coordinates) -> Iterator[Cell]:
+        """Yield cells which may have points within radius of coordinates."""
+        latitude_cell, longitude_cell = self._cell(coordinates)
+        # Cells are narrower than radius in kilometers far from equator
+        cos_latitude = math.cos(math.radians(min(abs(coordinates.latitude), 89.0)))
+        cells_per_turn = self._cells_per_turn()
+        longitude_cells = min(math.ceil(1 / cos_latitude), cells_per_turn // 2)
+        for latitude_shift in (-1, 0, 1):
+            for longitude_shift in range(-longitude_cells, longitude_cells + 1):
+                yield (
+                    latitude_cell + latitude_shift,
+                    (longitude_cell + longitude_shift) % cells_per_turn,
+                )
+
+    def _cells_per_turn(self) -> int:
+        """Return number of cells around the globe along parallel."""
+        return math.ceil(360 / self._step)
@@ -0,0 +1,39 @@
+"""Fixtures shared by all tests."""
+
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+from pytest import MonkeyPatch
+
+from coordinates import GPS_FLIGHTS
+from fetch import clear_latencies
+from timings import TIMINGS
+from weather_api_service import (
+    WEATHER_API_KEYS,
+    WEATHER_CACHE,
+    WEATHER_CIRCUIT,
+    WEATHER_FLIGHTS,
+    WEATHER_NEARBY,
+    WEATHER_PREFETCHER,
+)
+
+
+@pytest.fixture(autouse=True)
+def clear_caches(monkeypatch: MonkeyPatch, tmp_path: Path) -> Iterator[None]:
+    """Run every test with empty caches, disabled timings and rate limiting."""
+    monkeypatch.setattr("config.CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(WEATHER_API_KEYS, "rate", 0)
+    WEATHER_CACHE.clear()
+    WEATHER_NEARBY.clear()
+    yield
+    WEATHER_CACHE.clear()
+    WEATHER_NEARBY.clear()
+    WEATHER_CIRCUIT.reset()
+    WEATHER_API_KEYS.clear()
+    WEATHER_PREFETCHER.clear()
+    WEATHER_FLIGHTS.clear()
+    GPS_FLIGHTS.clear()
+    TIMINGS.enabled = False
+    TIMINGS.clear()
+    clear_latencies()
@@ -1,25 +1,58 @@
 """Tests for application exceptions."""
 
+import asyncio
+import socket
+import time
+from datetime import datetime
+from pathlib import Path
 from subprocess import Popen
-from typing import Any, Callable, Tuple, Type
+from typing import Any, Callable, Iterator, List, Tuple, Type, Union
 
 import pytest
 from pytest import MonkeyPatch
 
 import config
 import shell_command
-from coordinates import Coordinates, get_gps_coordinates
+import weather
+from config import Transport
+from coordinates import (
+    COORDINATES_SOURCES,
+    Coordinates,
+    CoordinatesSource,
+    _save_cached_coordinates,
+    get_gps_coordinates,
+    get_gps_coordinates_async,
+)
+from deadline import Deadline
 from exceptions import (
+    ApiKeysRetired,
     ApiServiceError,
     CantGetGpsCoordinates,
     CantGetWeather,
+    CommandExecutionFailed,
     CommandRunsTooLong,
+    DeadlineExceeded,
+    InvalidApiKey,
+    IpDatabaseError,
     NoInternetConnection,
     NoOpenWeatherApiKey,
     NoSuchCommand,
 )
+from fake_upstream import FakeUpstream, FakeUpstreamHandler
+from http_transport import HttpCommand
+from ip_database import import_csv
 from shell_command import ShellCommand
-from weather_api_service import get_weather
+from weather_api_service import (
+    WEATHER_CACHE,
+    WEATHER_CIRCUIT,
+    StaleWeather,
+    Weather,
+    WeatherType,
+    get_weather,
+    get_weather_async,
+    get_weather_many,
+    get_weather_type,
+)
 
 Undecodable_bytes = bytes
 Exit_code = int
@@ -27,6 +60,32 @@ NON_ZERO_EXIT_CODE = 1
 NO_INTERNET_EXIT_CODE = 100
 
 
+@pytest.fixture(autouse=True)
+def curl_transport(monkeypatch: MonkeyPatch) -> None:
+    """Use curl transport, because tests mock shell commands."""
+    monkeypatch.setattr("config.transport", Transport.CURL)
+
+
+@pytest.fixture
+def silent_server() -> Iterator[str]:
+    """Fixture for server that accepts connections and never answers."""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+    host, port = server.getsockname()
+    yield f"http://{host}:{port}/json"
+    server.close()
+
+
+@pytest.fixture
+def closed_port_url() -> str:
+    """Fixture for url with port nobody listens to."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        host, port = sock.getsockname()
+    return f"http://{host}:{port}/json"
+
+
 @pytest.fixture
 def not_existing_command() -> Type[ShellCommand]:
     """Fixture for not existing shell command."""
@@ -294,6 +353,296 @@ class TestCoordinatesModuleExceptions:
             get_gps_coordinates()
 
 
+class TestCoordinatesSourcesExceptions:
+    """Test exceptions raising while asking sources of GPS coordinates."""
+
+    def test_wrong_static_coordinates(self, monkeypatch: MonkeyPatch) -> None:
+        """If coordinates set in environment are wrong."""
+        monkeypatch.setattr("config.coordinates_sources", ["static"])
+        monkeypatch.setattr("config.STATIC_COORDINATES", "55.7522")
+        with pytest.raises(CantGetGpsCoordinates):
+            get_gps_coordinates()
+
+    def test_unknown_source(self, monkeypatch: MonkeyPatch) -> None:
+        """If config names source which doesn't exist."""
+        monkeypatch.setattr("config.coordinates_sources", ["compass"])
+        with pytest.raises(CantGetGpsCoordinates, match="compass"):
+            get_gps_coordinates()
+
+    def test_race_runs_too_long(self, monkeypatch: MonkeyPatch) -> None:
+        """If no source answers before deadline in race."""
+        monkeypatch.setattr("config.race_coordinates_sources", True)
+        monkeypatch.setitem(
+            COORDINATES_SOURCES,
+            "slow",
+            CoordinatesSource(lambda: time.sleep(0.3) or Coordinates(0, 0)),
+        )
+        monkeypatch.setattr("config.coordinates_sources", ["slow"])
+        with Deadline(0.05):
+            with pytest.raises(DeadlineExceeded):
+                get_gps_coordinates()
+            with pytest.raises(DeadlineExceeded):
+                asyncio.run(get_gps_coordinates_async())
+
+
+class TestIpDatabaseExceptions:
+    """Test exceptions raising while importing offline IP database."""
+
+    @pytest.mark.parametrize(
+        "row",
+        [
+            "1.0.0.0,1.0.0.255,-33.8688",
+            "1.0.0.0,1.0.0.x,-33.8688,151.2093",
+            "1.0.0.255,1.0.0.0,-33.8688,151.2093",
+            "1.0.0.0,1.0.0.255,-33.8688,200",
+        ],
+    )
+    def test_wrong_row(self, tmp_path: Path, row: str) -> None:
+        """If CSV file has wrong IP range."""
+        csv_path = tmp_path / "ranges.csv"
+        csv_path.write_text(f"1.0.1.0,1.0.1.255,0,0\n{row}\n")
+        with pytest.raises(IpDatabaseError, match="row 2"):
+            import_csv(csv_path, tmp_path / "ranges.bin")
+        assert not (tmp_path / "ranges.bin").exists()
+
+    def test_missing_csv_file(self, tmp_path: Path) -> None:
+        """If there is no CSV file."""
+        with pytest.raises(IpDatabaseError):
+            import_csv(tmp_path / "ranges.csv", tmp_path / "ranges.bin")
+
+
+class TestHttpTransportExceptions:
+    """Test exceptions raising while making requests with HTTP transport."""
+
+    coordinates = Coordinates(latitude=50, longitude=50)
+
+    @pytest.fixture(autouse=True)
+    def http_transport(self, monkeypatch: MonkeyPatch) -> None:
+        """Use HTTP transport."""
+        monkeypatch.setattr("config.transport", Transport.HTTP)
+
+    def test_no_internet(self, monkeypatch: MonkeyPatch) -> None:
+        """If host of web service can't be resolved."""
+        monkeypatch.setattr(
+            "coordinates.GET_GPS_HTTP_COMMAND",
+            HttpCommand(url="http://nonexistent.invalid/json"),
+        )
+        with pytest.raises(NoInternetConnection):
+            get_gps_coordinates()
+
+    def test_request_runs_too_long(
+        self, monkeypatch: MonkeyPatch, silent_server: str
+    ) -> None:
+        """If web service doesn't answer in time."""
+        monkeypatch.setattr(
+            "coordinates.GET_GPS_HTTP_COMMAND",
+            HttpCommand(url=silent_server, timeout=0.2),
+        )
+        with pytest.raises(CommandRunsTooLong):
+            get_gps_coordinates()
+
+    def test_gps_request_failed(
+        self, monkeypatch: MonkeyPatch, closed_port_url: str
+    ) -> None:
+        """If web service refuses connection while getting GPS coordinates."""
+        monkeypatch.setattr(
+            "coordinates.GET_GPS_HTTP_COMMAND", HttpCommand(url=closed_port_url)
+        )
+        with pytest.raises(CantGetGpsCoordinates):
+            get_gps_coordinates()
+
+    def test_weather_request_failed(
+        self, monkeypatch: MonkeyPatch, closed_port_url: str
+    ) -> None:
+        """If web service refuses connection while getting weather."""
+        monkeypatch.setattr("weather_api_service.OPEN_WEATHER_API_KEY", "qwerty")
+        monkeypatch.setattr("patterns.open_weather_api_url_pattern", closed_port_url)
+        with pytest.raises(CantGetWeather):
+            get_weather(self.coordinates)
+
+    def test_all_api_keys_rejected(self, monkeypatch: MonkeyPatch) -> None:
+        """If web service rejects every API key."""
+
+        class RejectingHandler(FakeUpstreamHandler):
+            """Handler rejecting all keys."""
+
+            open_weather_body = b'{"cod": 401, "message": "Invalid API key"}'
+
+        monkeypatch.setattr("weather_api_service.OPEN_WEATHER_API_KEYS", ["a", "b"])
+        with FakeUpstream(handler=RejectingHandler) as upstream:
+            monkeypatch.setattr(
+                "patterns.open_weather_api_url_pattern", upstream.open_weather_url
+            )
+            with pytest.raises(InvalidApiKey):
+                get_weather(self.coordinates)
+            with pytest.raises(ApiKeysRetired):
+                get_weather(self.coordinates)
+            assert upstream.server.responses[200] == 2
+
+
+class TestAsyncExceptions:
+    """Test exceptions raising while executing commands in event loop."""
+
+    @pytest.mark.parametrize(
+        "command,exception",
+        [
+            (ShellCommand("qwerty"), NoSuchCommand),
+            (ShellCommand("sleep", ["5"], timeout=0.2), CommandRunsTooLong),
+            (ShellCommand("false"), CommandExecutionFailed),
+            (
+                ShellCommand("false", no_internet_exit_code=NON_ZERO_EXIT_CODE),
+                NoInternetConnection,
+            ),
+            (HttpCommand(url="http://nonexistent.invalid/json"), NoInternetConnection),
+        ],
+    )
+    def test_command_exceptions(
+        self, command: Union[ShellCommand, HttpCommand], exception: Type[Exception]
+    ) -> None:
+        """If command fails in the same way as executed synchronously."""
+        with pytest.raises(exception):
+            asyncio.run(command.execute_async())
+
+    def test_request_runs_too_long(self, silent_server: str) -> None:
+        """If web service doesn't answer in time."""
+        with pytest.raises(CommandRunsTooLong):
+            asyncio.run(HttpCommand(url=silent_server, timeout=0.2).execute_async())
+
+    def test_gps_request_failed(
+        self, monkeypatch: MonkeyPatch, closed_port_url: str
+    ) -> None:
+        """If web service refuses connection while getting GPS coordinates."""
+        monkeypatch.setattr(
+            "coordinates.GET_GPS_COMMAND",
+            ShellCommand("curl", ["-s", closed_port_url]),
+        )
+        with pytest.raises(CantGetGpsCoordinates):
+            asyncio.run(get_gps_coordinates_async())
+
+    def test_weather_request_failed(
+        self, monkeypatch: MonkeyPatch, closed_port_url: str
+    ) -> None:
+        """If web service refuses connection while getting weather."""
+        monkeypatch.setattr("config.transport", Transport.HTTP)
+        monkeypatch.setattr("weather_api_service.OPEN_WEATHER_API_KEY", "qwerty")
+        monkeypatch.setattr("patterns.open_weather_api_url_pattern", closed_port_url)
+        with pytest.raises(CantGetWeather):
+            asyncio.run(get_weather_async(Coordinates(latitude=50, longitude=50)))
+
+
+class TestDeadlineExceptions:
+    """Test exceptions raising when time budget of run is spent."""
+
+    coordinates = Coordinates(latitude=50, longitude=50)
+    weather = Weather(
+        temperature=20,
+        weather_type=WeatherType.CLEAR,
+        weather_description="ясно",
+        wind_speed=3,
+        sunrise=datetime.fromtimestamp(1656115279),
+        sunset=datetime.fromtimestamp(1656178205),
+        city="малые кабаны",
+    )
+
+    @pytest.fixture(autouse=True)
+    def silent_weather_service(
+        self, monkeypatch: MonkeyPatch, silent_server: str
+    ) -> None:
+        """Use HTTP transport and weather service which never answers."""
+        monkeypatch.setattr("config.transport", Transport.HTTP)
+        monkeypatch.setattr("weather_api_service.OPEN_WEATHER_API_KEY", "qwerty")
+        monkeypatch.setattr("config.OPEN_WEATHER_API_URL", silent_server)
+        monkeypatch.setattr(
+            "coordinates.GET_GPS_HTTP_COMMAND", HttpCommand(url=silent_server)
+        )
+
+    @pytest.mark.parametrize(
+        "command",
+        [ShellCommand("sleep", ["5"]), HttpCommand(url="http://127.0.0.1:1/json")],
+    )
+    def test_command_is_stopped(
+        self, command: Union[ShellCommand, HttpCommand], silent_server: str
+    ) -> None:
+        """If command would run longer than the rest of budget."""
+        if isinstance(command, HttpCommand):
+            command.url = silent_server
+        start = time.monotonic()
+        with Deadline(0.2):
+            with pytest.raises(DeadlineExceeded):
+                command.execute()
+        assert time.monotonic() - start < 1
+
+    def test_stale_weather(self, monkeypatch: MonkeyPatch) -> None:
+        """If weather is not got in time, but expired one is cached."""
+        monkeypatch.setattr(WEATHER_CACHE, "ttl", -1)
+        WEATHER_CACHE.set(
+            (self.coordinates, config.open_weather_api_lang.value), self.weather
+        )
+        with Deadline(0.2):
+            stale_weather = get_weather(self.coordinates)
+        assert stale_weather == self.weather
+        assert isinstance(stale_weather, StaleWeather)
+
+    def test_stale_coordinates(self, monkeypatch: MonkeyPatch) -> None:
+        """If coordinates are not got in time, but invalid ones are cached."""
+        _save_cached_coordinates(self.coordinates)
+        monkeypatch.setattr("coordinates.network_fingerprint", lambda: "changed")
+        with Deadline(0.2):
+            assert get_gps_coordinates() == self.coordinates
+
+    def test_main(self) -> None:
+        """If nothing is cached and budget is spent."""
+        with pytest.raises(SystemExit, match="not got in 0.2 seconds"):
+            weather.main(["--deadline", "0.2"])
+
+
+class TestCircuitBreakerExceptions:
+    """Test exceptions raising while weather service is considered down."""
+
+    coordinates = Coordinates(latitude=50, longitude=50)
+
+    @pytest.fixture(autouse=True)
+    def failing_weather_service(self, monkeypatch: MonkeyPatch) -> List[int]:
+        """Fixture for weather service which always fails, returns calls number."""
+        calls = [0]
+
+        def mock_execute(self: Any) -> Any:
+            calls[0] += 1
+            raise CommandExecutionFailed("Service is down")
+
+        monkeypatch.setattr("weather_api_service.OPEN_WEATHER_API_KEY", "qwerty")
+        monkeypatch.setattr("config.retry_attempts", 1)
+        monkeypatch.setattr(WEATHER_CIRCUIT, "failure_threshold", 2)
+        monkeypatch.setattr(ShellCommand, "execute", mock_execute)
+        monkeypatch.setattr(ShellCommand, "execute_async", mock_execute)
+        return calls
+
+    def test_circuit_opens(self, failing_weather_service: List[int]) -> None:
+        """If weather service failed several times in a row."""
+        for _ in range(2):
+            with pytest.raises(CantGetWeather, match="Service is down"):
+                get_weather(self.coordinates)
+        with pytest.raises(CantGetWeather, match="weather is down"):
+            get_weather(self.coordinates)
+        with pytest.raises(CantGetWeather, match="weather is down"):
+            asyncio.run(get_weather_async(self.coordinates))
+        assert failing_weather_service == [2]
+
+    def test_stale_weather(self, monkeypatch: MonkeyPatch) -> None:
+        """If circuit is open, but expired weather is cached."""
+        weather = TestDeadlineExceptions.weather
+        monkeypatch.setattr(WEATHER_CACHE, "ttl", -1)
+        WEATHER_CACHE.set(
+            (self.coordinates, config.open_weather_api_lang.value), weather
+        )
+        for _ in range(2):
+            with pytest.raises(CantGetWeather):
+                get_weather(self.coordinates)
+        stale_weather = get_weather(self.coordinates)
+        assert stale_weather == weather
+        assert isinstance(stale_weather, StaleWeather)
+
+
 class TestWeatherApiServiceExceptions:
     """Test exceptions raising while getting weather by GPS coordinates."""
 
@@ -316,7 +665,9 @@ class TestWeatherApiServiceExceptions:
         monkeypatch_wait: Callable[[Exit_code], Callable[[Any, Any], Exit_code]],
     ) -> None:
         """If there is no internet connection."""
-        monkeypatch.setattr("weather_api_service.ShellCommand", command_that_use_internet)
+        monkeypatch.setattr(
+            "weather_api_service.ShellCommand", command_that_use_internet
+        )
         monkeypatch.setattr(Popen, "wait", monkeypatch_wait(NO_INTERNET_EXIT_CODE))
         with pytest.raises(NoInternetConnection):
             get_weather(self.coordinates)
@@ -327,6 +678,12 @@ class TestWeatherApiServiceExceptions:
         with pytest.raises(NoOpenWeatherApiKey):
             get_weather(self.coordinates)
 
+    def test_no_open_weather_api_key_in_batch(self, monkeypatch: MonkeyPatch) -> None:
+        """If there is no OPEN_WEATHER_API_KEY while getting weather in batch."""
+        monkeypatch.setattr("weather_api_service.OPEN_WEATHER_API_KEY", None)
+        with pytest.raises(NoOpenWeatherApiKey):
+            next(get_weather_many([self.coordinates]))
+
     def test_command_runs_too_long(
         self,
         monkeypatch: MonkeyPatch,
@@ -458,3 +815,12 @@ class TestWeatherApiServiceExceptions:
         )
         with pytest.raises(ApiServiceError):
             get_weather(self.coordinates)
+
+    @pytest.mark.parametrize(
+        "weather_type_id",
+        [-1, 0, 100, 199, 400, 700, 702, 805, 1000, "800", 800.0, None],
+    )
+    def test_unknown_weather_type_id(self, weather_type_id: Any) -> None:
+        """If there is no weather type with such condition identifier."""
+        with pytest.raises(ApiServiceError):
+            get_weather_type(weather_type_id)
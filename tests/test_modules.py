@@ -1,34 +1,124 @@
 """Tests for application modules."""
 
+import asyncio
+import itertools
+import json
 import numbers
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from array import array
 from datetime import datetime
-from typing import Any
+from http.client import HTTPConnection
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple, Type
 
 import pytest
 from pytest import CaptureFixture, MonkeyPatch
 
 import config
+import converters
+import fetch
+from api_keys import ApiKeyPool
+from cache import CacheStats, TtlLruCache
+from cancellation import Cancellation
+from circuit_breaker import CircuitBreaker, CircuitState
 from config import SpeedUnit, TemperatureUnit
 from converters import (
     convert_to_fahrenheit,
+    convert_to_fahrenheit_many,
     convert_to_kelvin,
+    convert_to_kelvin_many,
     convert_to_kph,
+    convert_to_kph_many,
     convert_to_mph,
+    convert_to_mph_many,
 )
-from coordinates import Coordinates, get_gps_coordinates
+from coordinates import (
+    COORDINATES_SOURCES,
+    Coordinates,
+    CoordinatesSource,
+    get_gps_coordinates,
+    get_gps_coordinates_async,
+    round_coordinates,
+)
+from daemon import DaemonAlreadyRunning, WeatherDaemon
+from deadline import Deadline, current_deadline, limit_timeout
+from exceptions import (
+    ApiKeysRetired,
+    ApiServiceError,
+    CantGetGpsCoordinates,
+    CantGetWeather,
+    CircuitOpen,
+    CommandCancelled,
+    CommandExecutionFailed,
+    DeadlineExceeded,
+    NoInternetConnection,
+    QuotaExhausted,
+)
+from fake_upstream import (
+    OPEN_WEATHER_PAYLOAD,
+    FakeUpstream,
+    FakeUpstreamHandler,
+    UpstreamBehavior,
+)
+from http_transport import (
+    AsyncHttpConnectionPool,
+    Command,
+    HttpCommand,
+    HttpConnectionPool,
+)
+from ip_database import IpDatabase, import_csv
+from ip_database import main as ip_database_main
+from network import network_fingerprint
+from patterns import stale_weather_note
+from prefetch import Prefetcher, PrefetchStats
+from rate_limit import RateLimiterStats, SharedTokenBucket
+from server import WeatherServer
+from shared_cache import SHARED_CACHE, SharedCache
+from shell_command import (
+    CURL,
+    CURL_SILENT_ARG,
+    CURL_STATUS_ARGS,
+    CommandExecutionResult,
+    ShellCommand,
+)
+from single_flight import FlightStats, SingleFlight
+from spatial_index import SpatialIndex, SpatialStats, distance
+from timings import TIMINGS, Histogram, timed
 from weather import main
 from weather_api_service import (
+    WEATHER_API_KEYS,
+    WEATHER_CACHE,
+    WEATHER_CIRCUIT,
+    WEATHER_FLIGHTS,
+    WEATHER_NEARBY,
+    WEATHER_PREFETCHER,
+    BatchStats,
     Celsius,
     Fahrenheit,
     Kelvin,
     Kilometers_per_hour,
     Meters_per_second,
     Miles_per_hour,
+    StaleWeather,
     Weather,
     WeatherType,
+    _parse_weather,
     get_weather,
+    get_weather_async,
+    get_weather_many,
+    get_weather_type,
 )
-from weather_formatter import format_weather
+from weather_client import main as client_main
+from weather_client import request_daemon
+from weather_formatter import format_weather, format_weather_frame
+from weather_frame import WeatherFrame
 
 
 class SetupWeather:
@@ -60,6 +150,12 @@ class SetupWeather:
     )
 
 
+@pytest.fixture
+def weather() -> Weather:
+    """Fixture for weather."""
+    return SetupWeather.TEST_WEATHER
+
+
 class TestGettingGpsCoordinates:
     """Tests for coordinates.py module."""
 
@@ -133,6 +229,1842 @@ class TestGettingWeather:
         assert isinstance(getattr(self.weather, weather_attr), type_)
 
 
+class TestHttpTransport:
+    """Tests for http_transport.py module."""
+
+    client_addresses: Set[Tuple[str, int]] = set()
+
+    @pytest.fixture
+    def upstream(self) -> Iterator[FakeUpstream]:
+        """Fixture for fake upstream remembering client addresses."""
+        client_addresses = self.client_addresses
+        client_addresses.clear()
+
+        class RememberingHandler(FakeUpstreamHandler):
+            """Handler remembering client addresses."""
+
+            def do_GET(self) -> None:
+                client_addresses.add(self.client_address)
+                super().do_GET()
+
+        with FakeUpstream(handler=RememberingHandler) as upstream:
+            yield upstream
+
+    def test_connection_is_reused(self, upstream: FakeUpstream) -> None:
+        """Check requests to the same host go through one connection."""
+        command = HttpCommand(upstream.location_info_url, pool=HttpConnectionPool())
+        for _ in range(3):
+            command.execute()
+        assert len(self.client_addresses) == 1
+
+    def test_closed_connection_is_replaced(self, upstream: FakeUpstream) -> None:
+        """Check request succeeds if server closed idle connection."""
+        pool = HttpConnectionPool()
+        command = HttpCommand(upstream.location_info_url, pool=pool)
+        command.execute()
+        for connections in pool._idle_connections.values():
+            for connection in connections:
+                assert connection.sock is not None
+                connection.sock.shutdown(2)
+        stdout, _, exit_code = command.execute()
+        assert '"loc"' in stdout
+        assert exit_code == 0
+
+    def test_get_gps_coordinates(
+        self, monkeypatch: MonkeyPatch, upstream: FakeUpstream
+    ) -> None:
+        """Check getting GPS coordinates with HTTP transport."""
+        monkeypatch.setattr("config.transport", config.Transport.HTTP)
+        monkeypatch.setattr(
+            "coordinates.GET_GPS_HTTP_COMMAND",
+            HttpCommand(upstream.location_info_url),
+        )
+        assert get_gps_coordinates() == Coordinates(55.7522, 37.6156)
+
+    def test_get_weather(
+        self, monkeypatch: MonkeyPatch, upstream: FakeUpstream
+    ) -> None:
+        """Check getting weather with HTTP transport."""
+        monkeypatch.setattr("config.transport", config.Transport.HTTP)
+        monkeypatch.setattr("weather_api_service.OPEN_WEATHER_API_KEY", "qwerty")
+        monkeypatch.setattr(
+            "patterns.open_weather_api_url_pattern",
+            upstream.open_weather_url + "?lat={latitude}&lon={longitude}",
+        )
+        weather = get_weather(Coordinates(55.7522, 37.6156))
+        assert weather.temperature == round(OPEN_WEATHER_PAYLOAD["main"]["temp"])
+        assert weather.weather_type is WeatherType.CLOUDS
+
+
+class TestAsync:
+    """Tests for getting GPS coordinates and weather in event loop."""
+
+    def test_concurrent_requests(self) -> None:
+        """Check many requests share few keep-alive connections."""
+        client_addresses = set()
+
+        class RememberingHandler(FakeUpstreamHandler):
+            """Handler remembering client addresses."""
+
+            def do_GET(self) -> None:
+                client_addresses.add(self.client_address)
+                super().do_GET()
+
+        async def request_many(url: str) -> List[CommandExecutionResult]:
+            pool = AsyncHttpConnectionPool(max_idle_connections_per_host=100)
+            command = HttpCommand(url, async_pool=pool)
+            results = []
+            for _ in range(3):
+                results += await asyncio.gather(
+                    *(command.execute_async() for _ in range(100))
+                )
+            return results
+
+        with FakeUpstream(handler=RememberingHandler) as upstream:
+            results = asyncio.run(request_many(upstream.location_info_url))
+        assert len(results) == 300
+        assert all('"loc"' in result.stdout_data for result in results)
+        assert len(client_addresses) <= 100
+
+    def test_chunked_response(self) -> None:
+        """Check response with chunked transfer encoding."""
+
+        class ChunkedHandler(FakeUpstreamHandler):
+            """Handler sending body in chunks."""
+
+            def do_GET(self) -> None:
+                self.send_response(200)
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for chunk in (b'{"loc": ', b'"1.5,2.5"}', b""):
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+
+        async def request_twice(url: str) -> List[CommandExecutionResult]:
+            command = HttpCommand(url, async_pool=AsyncHttpConnectionPool())
+            return [await command.execute_async(), await command.execute_async()]
+
+        with FakeUpstream(handler=ChunkedHandler) as upstream:
+            results = asyncio.run(request_twice(upstream.url))
+        assert [result.stdout_data for result in results] == ['{"loc": "1.5,2.5"}'] * 2
+
+    def test_get_gps_coordinates_and_weather(self, monkeypatch: MonkeyPatch) -> None:
+        """Check getting GPS coordinates and weather with HTTP transport."""
+        monkeypatch.setattr("config.transport", config.Transport.HTTP)
+        monkeypatch.setattr("weather_api_service.OPEN_WEATHER_API_KEY", "qwerty")
+
+        async def get_weathers() -> List[Weather]:
+            coordinates = await get_gps_coordinates_async()
+            return await asyncio.gather(
+                *(
+                    get_weather_async(Coordinates(coordinates.latitude, longitude))
+                    for longitude in range(100)
+                )
+            )
+
+        with FakeUpstream() as upstream:
+            monkeypatch.setattr(
+                "coordinates.GET_GPS_HTTP_COMMAND",
+                HttpCommand(upstream.location_info_url),
+            )
+            monkeypatch.setattr(
+                "config.OPEN_WEATHER_API_URL", upstream.open_weather_url
+            )
+            weathers = asyncio.run(get_weathers())
+        assert len(weathers) == 100
+        assert all(weather.city == OPEN_WEATHER_PAYLOAD["name"] for weather in weathers)
+
+    def test_shell_command(self) -> None:
+        """Check executing shell command in event loop."""
+        result = asyncio.run(ShellCommand("echo", [" hello "]).execute_async())
+        assert result == CommandExecutionResult("hello", None, 0)
+
+
+class FlakyCommand:
+    """Command failing given number of times before succeeding."""
+
+    def __init__(self, failures: int, error: Exception):
+        """Flaky command constructor."""
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    def execute(self) -> CommandExecutionResult:
+        """Fail or return result."""
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error
+        return CommandExecutionResult("ok", b"", 0)
+
+
+class TestFetch:
+    """Tests for fetch.py module."""
+
+    @pytest.fixture(autouse=True)
+    def short_backoff(self, monkeypatch: MonkeyPatch) -> None:
+        """Make backoff short."""
+        monkeypatch.setattr("config.retry_backoff", 0.01)
+        monkeypatch.setattr("config.retry_attempts", 3)
+
+    def test_retry(self) -> None:
+        """Check failed attempts are retried."""
+        command = FlakyCommand(2, CommandExecutionFailed())
+        assert fetch.execute(command, "weather").stdout_data == "ok"  # type: ignore
+        assert command.calls == 3
+        assert TIMINGS.counters == {"weather_retries": 2}
+
+    @pytest.mark.parametrize(
+        "command",
+        [
+            FlakyCommand(3, CommandExecutionFailed()),
+            FlakyCommand(1, DeadlineExceeded()),
+            FlakyCommand(1, NoInternetConnection()),
+        ],
+    )
+    def test_no_retry(self, command: FlakyCommand) -> None:
+        """Check attempts end on unretried errors or after the last attempt."""
+        with pytest.raises(type(command.error)):
+            fetch.execute(command, "weather")  # type: ignore
+        assert command.calls == min(command.failures, 3)
+
+    def test_hedge_delay(self, monkeypatch: MonkeyPatch) -> None:
+        """Check hedge delay is p95 of latencies when they are known."""
+        monkeypatch.setattr("config.hedge_delay", 5)
+        assert fetch.hedge_delay("gps") == 5
+        for milliseconds in range(1, fetch.HEDGE_MIN_SAMPLES + 1):
+            fetch._record_latency("gps", milliseconds / 1000)
+        assert fetch.hedge_delay("gps") == 0.019
+
+    def test_hedging(self, monkeypatch: MonkeyPatch) -> None:
+        """Check slow request is duplicated and the faster answer wins."""
+        monkeypatch.setattr("config.hedge_requests", True)
+        monkeypatch.setattr("config.hedge_delay", 0.05)
+        requests_number = itertools.count()
+
+        class FirstSlowHandler(FakeUpstreamHandler):
+            """Handler answering the first request slowly."""
+
+            def do_GET(self) -> None:
+                if next(requests_number) == 0:
+                    time.sleep(1)
+                super().do_GET()
+
+        async_pool = AsyncHttpConnectionPool()
+        with FakeUpstream(handler=FirstSlowHandler) as upstream:
+            command = HttpCommand(upstream.location_info_url, async_pool=async_pool)
+            start = time.perf_counter()
+            result = fetch.execute(command, "gps")
+            assert time.perf_counter() - start < 0.5
+        assert '"loc"' in result.stdout_data
+        assert TIMINGS.counters == {"gps_hedges": 1, "gps_hedge_wins": 1}
+        # Synchronous hedging runs in threads, not in event loop per call
+        assert not async_pool._idle_connections
+
+    def test_no_hedge_threads_for_fast_answers(self, monkeypatch: MonkeyPatch) -> None:
+        """Check answer in time starts no threads but the one of timers."""
+        monkeypatch.setattr("config.hedge_requests", True)
+        monkeypatch.setattr("config.hedge_delay", 1)
+        monkeypatch.setattr("fetch._TIMERS", fetch._Timers())
+        with FakeUpstream() as upstream:
+            command = HttpCommand(upstream.location_info_url)
+            threads = set(threading.enumerate())
+            for _ in range(3):
+                fetch.execute(command, "gps")
+            assert [
+                thread.name
+                for thread in set(threading.enumerate()) - threads
+                if thread.name.startswith("hedge")
+            ] == ["hedge_timers"]
+        assert TIMINGS.counters == {}
+
+    @pytest.mark.parametrize(
+        "make_command",
+        [
+            HttpCommand,
+            lambda url: ShellCommand(
+                executable=CURL,
+                arguments=[CURL_SILENT_ARG, *CURL_STATUS_ARGS, url],
+                http_status=True,
+            ),
+        ],
+        ids=["http", "curl"],
+    )
+    def test_retry_server_error(self, make_command: Callable[[str], Command]) -> None:
+        """Check response with server error status is retried."""
+        requests_number = itertools.count()
+
+        class FirstFailingHandler(FakeUpstreamHandler):
+            """Handler answering the first request with server error."""
+
+            def do_GET(self) -> None:
+                if next(requests_number) == 0:
+                    self._send_json(500, b'{"cod":"500"}')
+                else:
+                    super().do_GET()
+
+        with FakeUpstream(handler=FirstFailingHandler) as upstream:
+            result = fetch.execute(make_command(upstream.location_info_url), "gps")
+        assert '"loc"' in result.stdout_data
+        assert upstream.server.responses == {500: 1, 200: 1}
+        assert TIMINGS.counters == {"gps_retries": 1}
+
+
+class TestCancellation:
+    """Tests for cancelling commands running in other threads."""
+
+    @staticmethod
+    def cancel_later(cancellation: Cancellation) -> None:
+        """Cancel command shortly in other thread."""
+        threading.Timer(0.1, cancellation.cancel).start()
+
+    def test_shell_command(self) -> None:
+        """Check process of cancelled command is killed."""
+        cancellation = Cancellation()
+        self.cancel_later(cancellation)
+        start = time.perf_counter()
+        with pytest.raises(CommandCancelled):
+            ShellCommand("sleep", ["5"]).execute(cancellation)
+        assert time.perf_counter() - start < 2
+
+    def test_http_command(self) -> None:
+        """Check connection of cancelled request is closed, not reused."""
+        pool = HttpConnectionPool()
+        cancellation = Cancellation()
+        self.cancel_later(cancellation)
+        start = time.perf_counter()
+        with FakeUpstream(behavior=UpstreamBehavior(latency=5)) as upstream:
+            with pytest.raises(CommandCancelled):
+                HttpCommand(upstream.location_info_url, pool=pool).execute(cancellation)
+            assert time.perf_counter() - start < 2
+        assert not pool._idle_connections
+
+    def test_cancelled_before_start(self) -> None:
+        """Check command cancelled before it starts is stopped at once."""
+        cancellation = Cancellation()
+        cancellation.cancel()
+        with pytest.raises(CommandCancelled):
+            ShellCommand("sleep", ["5"]).execute(cancellation)
+
+
+class TestDeadline:
+    """Tests for deadline.py module."""
+
+    def test_limit_timeout(self) -> None:
+        """Check timeouts are cut to the rest of the earliest deadline."""
+        clock = FakeClock()
+        assert limit_timeout(5) == 5
+        with Deadline(3, clock=clock):
+            assert limit_timeout(5) == 3
+            clock.now += 1
+            assert limit_timeout(5) == 2
+            with Deadline(10, clock=clock) as inner:
+                assert inner.remaining() == 2
+            with Deadline(1, clock=clock):
+                assert limit_timeout(5) == 1
+            assert current_deadline() is not None
+        assert current_deadline() is None
+
+    def test_spent_budget(self) -> None:
+        """Check nothing is run after budget is spent."""
+        clock = FakeClock()
+        with Deadline(1, clock=clock) as deadline:
+            clock.now += 1
+            assert deadline.expired
+            with pytest.raises(DeadlineExceeded):
+                limit_timeout(5)
+
+
+class TestFakeUpstream:
+    """Tests for fake_upstream.py module."""
+
+    @pytest.fixture
+    def get_weather_from(
+        self, monkeypatch: MonkeyPatch
+    ) -> Callable[[FakeUpstream], Weather]:
+        """Fixture for getting weather from fake upstream by configured URL."""
+        monkeypatch.setattr("config.transport", config.Transport.HTTP)
+        monkeypatch.setattr("weather_api_service.OPEN_WEATHER_API_KEY", "qwerty")
+
+        def get_weather_from(upstream: FakeUpstream) -> Weather:
+            monkeypatch.setattr(
+                "config.OPEN_WEATHER_API_URL", upstream.open_weather_url
+            )
+            return get_weather(Coordinates(55.7522, 37.6156))
+
+        return get_weather_from
+
+    def test_padding_and_latency(
+        self, get_weather_from: Callable[[FakeUpstream], Weather]
+    ) -> None:
+        """Check slow response with big payload is parsed."""
+        behavior = UpstreamBehavior(latency=0.05, padding=100_000)
+        with FakeUpstream(behavior=behavior) as upstream:
+            start = time.perf_counter()
+            weather = get_weather_from(upstream)
+            assert time.perf_counter() - start >= 0.05
+        assert weather.city == OPEN_WEATHER_PAYLOAD["name"]
+
+    @pytest.mark.parametrize(
+        "behavior,error,responses",
+        [
+            (UpstreamBehavior(error_rate=1), CantGetWeather, {500: 2}),
+            (UpstreamBehavior(rate_limit_rate=1), ApiServiceError, {429: 1}),
+        ],
+    )
+    def test_errors(
+        self,
+        monkeypatch: MonkeyPatch,
+        behavior: UpstreamBehavior,
+        error: Type[Exception],
+        responses: Dict[int, int],
+        get_weather_from: Callable[[FakeUpstream], Weather],
+    ) -> None:
+        """Check failed responses are not taken for weather, 5xx are retried."""
+        monkeypatch.setattr("config.retry_attempts", 2)
+        monkeypatch.setattr("config.retry_backoff", 0)
+        with FakeUpstream(behavior=behavior) as upstream:
+            with pytest.raises(error):
+                get_weather_from(upstream)
+        assert upstream.server.responses == responses
+
+    def test_seed(self) -> None:
+        """Check the same seed gives the same responses."""
+        behavior = UpstreamBehavior(error_rate=0.3, rate_limit_rate=0.3, seed=7)
+        responses = []
+        for _ in range(2):
+            with FakeUpstream(behavior=behavior) as upstream:
+                pool = HttpConnectionPool()
+                statuses = [
+                    pool.request(upstream.location_info_url, timeout=5)[0]
+                    for _ in range(20)
+                ]
+            responses.append(statuses)
+        assert responses[0] == responses[1]
+        assert len(set(responses[0])) == 3
+
+
+class FakeClock:
+    """Clock that moves only when asked."""
+
+    def __init__(self) -> None:
+        """Clock constructor."""
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        """Return current time."""
+        return self.now
+
+
+class TestCircuitBreaker:
+    """Tests for circuit_breaker.py module."""
+
+    @pytest.fixture
+    def clock(self) -> FakeClock:
+        """Fixture for clock."""
+        return FakeClock()
+
+    @pytest.fixture
+    def breaker(self, clock: FakeClock) -> CircuitBreaker:
+        """Fixture for circuit breaker opening after two failures."""
+        return CircuitBreaker(
+            "weather", failure_threshold=2, reset_timeout=10, clock=clock
+        )
+
+    @staticmethod
+    def fail(breaker: CircuitBreaker) -> None:
+        """Make failed request through circuit breaker."""
+        with pytest.raises(CommandExecutionFailed):
+            with breaker:
+                raise CommandExecutionFailed()
+
+    def test_opens_after_consecutive_failures(self, breaker: CircuitBreaker) -> None:
+        """Check circuit opens only after failures in a row."""
+        self.fail(breaker)
+        with breaker:
+            pass
+        self.fail(breaker)
+        assert breaker.state is CircuitState.CLOSED
+        with pytest.raises(ApiServiceError):
+            with breaker:
+                raise ApiServiceError()
+        self.fail(breaker)
+        assert breaker.state is CircuitState.OPEN
+        with pytest.raises(CircuitOpen, match="10.0 more seconds"):
+            with breaker:
+                pass
+        assert TIMINGS.counters == {
+            "weather_circuit_opened": 1,
+            "weather_circuit_rejected": 1,
+        }
+
+    def test_half_open_probe(self, breaker: CircuitBreaker, clock: FakeClock) -> None:
+        """Check only one probe is let through after reset timeout."""
+        self.fail(breaker)
+        self.fail(breaker)
+        clock.now = 10
+        assert breaker.state is CircuitState.HALF_OPEN
+        with breaker:
+            with pytest.raises(CircuitOpen):
+                with breaker:
+                    pass
+        assert breaker.state is CircuitState.CLOSED
+
+    def test_failed_probe(self, breaker: CircuitBreaker, clock: FakeClock) -> None:
+        """Check failed probe opens circuit for the next reset timeout."""
+        self.fail(breaker)
+        self.fail(breaker)
+        clock.now = 10
+        self.fail(breaker)
+        clock.now = 19.9
+        assert breaker.state is CircuitState.OPEN
+        clock.now = 20
+        assert breaker.state is CircuitState.HALF_OPEN
+
+    @pytest.mark.parametrize(
+        "transport", [config.Transport.HTTP, config.Transport.CURL]
+    )
+    def test_server_errors_open_circuit(
+        self, monkeypatch: MonkeyPatch, weather: Weather, transport: config.Transport
+    ) -> None:
+        """Check responses with server error status are failures of service."""
+        monkeypatch.setattr("config.transport", transport)
+        monkeypatch.setattr("config.retry_backoff", 0)
+        monkeypatch.setattr("weather_api_service.OPEN_WEATHER_API_KEY", "qwerty")
+        monkeypatch.setattr(WEATHER_CACHE, "ttl", -1)
+        coordinates = Coordinates(55.75, 37.62)
+        WEATHER_CACHE.set((coordinates, config.open_weather_api_lang.value), weather)
+        with FakeUpstream(behavior=UpstreamBehavior(error_rate=1.0)) as upstream:
+            monkeypatch.setattr(
+                "patterns.open_weather_api_url_pattern",
+                upstream.open_weather_url + "?lat={latitude}&lon={longitude}",
+            )
+            for _ in range(config.circuit_failure_threshold):
+                with pytest.raises(CantGetWeather, match="HTTP status 500"):
+                    get_weather(coordinates)
+            assert WEATHER_CIRCUIT.state is CircuitState.OPEN
+            assert isinstance(get_weather(coordinates), StaleWeather)
+
+    def test_spent_deadline_is_not_failure(self, monkeypatch: MonkeyPatch) -> None:
+        """Check requests not sent for spent time budget don't open circuit."""
+        monkeypatch.setattr("weather_api_service.OPEN_WEATHER_API_KEY", "qwerty")
+        coordinates = Coordinates(55.75, 37.62)
+        with FakeUpstream() as upstream:
+            monkeypatch.setattr(
+                "patterns.open_weather_api_url_pattern",
+                upstream.open_weather_url + "?lat={latitude}&lon={longitude}",
+            )
+            for _ in range(config.circuit_failure_threshold):
+                with Deadline(0):
+                    with pytest.raises(DeadlineExceeded):
+                        get_weather(coordinates)
+            assert upstream.server.responses == {}
+            assert WEATHER_CIRCUIT.state is CircuitState.CLOSED
+            assert get_weather(coordinates).city
+
+
+class TestCache:
+    """Tests for cache.py module."""
+
+    def test_hit_and_miss(self) -> None:
+        """Check cache returns stored value and counts hits and misses."""
+        cache: TtlLruCache[str, int] = TtlLruCache(max_size=2, ttl=10)
+        assert cache.get("a") is None
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+        assert cache.stats == CacheStats(hits=1, misses=1, evictions=0)
+
+    def test_ttl(self) -> None:
+        """Check expired value is not returned."""
+        clock = FakeClock()
+        cache: TtlLruCache[str, int] = TtlLruCache(max_size=2, ttl=10, clock=clock)
+        cache.set("a", 1)
+        clock.now = 9.9
+        assert cache.get("a") == 1
+        clock.now = 10
+        assert cache.get("a") is None
+
+    def test_lru_eviction(self) -> None:
+        """Check least recently used value is evicted."""
+        cache: TtlLruCache[str, int] = TtlLruCache(max_size=2, ttl=10)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert cache.stats.evictions == 1
+        assert len(cache) == 2
+
+    def test_zero_size_cache_stores_nothing(self) -> None:
+        """Check cache with zero size is disabled."""
+        cache: TtlLruCache[str, int] = TtlLruCache(max_size=0, ttl=10)
+        cache.set("a", 1)
+        assert cache.get("a") is None
+
+    def test_round_coordinates(self) -> None:
+        """Check nearby coordinates are rounded to the same point."""
+        assert round_coordinates(
+            Coordinates(55.7512, 37.6184), precision=2
+        ) == round_coordinates(Coordinates(55.7538, 37.6163), precision=2)
+
+    def test_get_weather_uses_cache(
+        self, monkeypatch: MonkeyPatch, weather: Weather
+    ) -> None:
+        """Check weather for nearby coordinates is requested once."""
+        requested_urls = []
+
+        def mock_get_weather_by_command(command: HttpCommand, *_: Any) -> Weather:
+            requested_urls.append(command.url)
+            return weather
+
+        monkeypatch.setattr("weather_api_service.OPEN_WEATHER_API_KEY", "qwerty")
+        monkeypatch.setattr(
+            "weather_api_service._get_weather_by_command", mock_get_weather_by_command
+        )
+        assert get_weather(Coordinates(55.7512, 37.6184)) is weather
+        assert get_weather(Coordinates(55.7538, 37.6163)) is weather
+        assert len(requested_urls) == 1
+        assert "lat=55.75&lon=37.62" in requested_urls[0]
+        assert WEATHER_CACHE.stats == CacheStats(hits=1, misses=1, evictions=0)
+
+
+class TestPrefetcher:
+    """Tests for prefetch.py module."""
+
+    @pytest.fixture
+    def clock(self) -> FakeClock:
+        """Fixture for clock."""
+        return FakeClock()
+
+    @pytest.fixture
+    def cache(self, clock: FakeClock) -> TtlLruCache[str, int]:
+        """Fixture for cache with values living 100 seconds."""
+        return TtlLruCache(max_size=10, ttl=100, clock=clock)
+
+    @pytest.fixture
+    def refreshed(self) -> List[str]:
+        """Fixture for list of refreshed keys."""
+        return []
+
+    @pytest.fixture
+    def prefetcher(
+        self, cache: TtlLruCache[str, int], clock: FakeClock, refreshed: List[str]
+    ) -> Prefetcher[str, int]:
+        """Fixture for prefetcher refreshing keys accessed twice."""
+
+        def refresh(key: str) -> None:
+            if key == "broken":
+                raise CantGetWeather("No weather")
+            refreshed.append(key)
+            cache.set(key, 2)
+
+        return Prefetcher(
+            "test",
+            cache=cache,
+            refresh=refresh,
+            interval=1,
+            ahead=10,
+            min_accesses=2,
+            budget=1,
+            budget_period=60,
+            clock=clock,
+        )
+
+    def test_hot_entry_is_refreshed(
+        self,
+        prefetcher: Prefetcher[str, int],
+        cache: TtlLruCache[str, int],
+        clock: FakeClock,
+        refreshed: List[str],
+    ) -> None:
+        """Check only hot entry is refreshed and only shortly before expiry."""
+        for key in ("hot", "cold"):
+            cache.set(key, 1)
+        for key in ("hot", "hot", "cold"):
+            prefetcher.record_access(key, hit=True)
+        clock.now = 89
+        assert prefetcher.refresh_due() == 0
+        prefetcher.record_access("hot", hit=True)
+        clock.now = 90
+        assert prefetcher.refresh_due() == 1
+        assert refreshed == ["hot"]
+        clock.now = 100
+        prefetcher.record_access("hot", hit=cache.get("hot") is not None)
+        assert prefetcher.stats == PrefetchStats(
+            refreshes=1, hits=1, failures=0, skipped=0
+        )
+        assert TIMINGS.counters == {
+            "test_prefetch_refreshes": 1,
+            "test_prefetch_hits": 1,
+        }
+
+    def test_budget_and_failures(
+        self,
+        prefetcher: Prefetcher[str, int],
+        cache: TtlLruCache[str, int],
+        clock: FakeClock,
+        refreshed: List[str],
+    ) -> None:
+        """Check refreshes are skipped when budget is spent."""
+        for key in ("broken", "first", "second"):
+            cache.set(key, 1)
+            for _ in range(3 if key == "broken" else 2):
+                prefetcher.record_access(key, hit=True)
+        clock.now = 95
+        assert prefetcher.refresh_due() == 0
+        clock.now = 155
+        for key in ("first", "second"):
+            prefetcher.record_access(key, hit=False)
+            prefetcher.record_access(key, hit=False)
+        assert prefetcher.refresh_due() == 1
+        assert refreshed == ["first"]
+        assert prefetcher.stats == PrefetchStats(
+            refreshes=1, hits=0, failures=1, skipped=3
+        )
+
+    def test_weather_prefetcher(
+        self, monkeypatch: MonkeyPatch, weather: Weather
+    ) -> None:
+        """Check hot weather is requested again by prefetcher."""
+        requests_number = [0]
+
+        def mock_get_weather_by_command(*_: Any) -> Weather:
+            requests_number[0] += 1
+            return weather
+
+        monkeypatch.setattr("weather_api_service.OPEN_WEATHER_API_KEY", "qwerty")
+        monkeypatch.setattr(
+            "weather_api_service._get_weather_by_command", mock_get_weather_by_command
+        )
+        monkeypatch.setattr(WEATHER_PREFETCHER, "ahead", config.weather_cache_ttl)
+        get_weather(Coordinates(55.75, 37.62))
+        get_weather(Coordinates(55.75, 37.62))
+        assert WEATHER_PREFETCHER.refresh_due() == 1
+        assert get_weather(Coordinates(55.75, 37.62)) == weather
+        assert requests_number == [2]
+        assert WEATHER_PREFETCHER.stats.hits == 1
+
+
+class TestSingleFlight:
+    """Tests for single_flight.py module."""
+
+    CALLERS_NUMBER = 5
+
+    @pytest.fixture
+    def flight(self) -> SingleFlight[str, int]:
+        """Fixture for group of coalesced calls."""
+        return SingleFlight("test")
+
+    def call_concurrently(self, function: Callable[[], Any]) -> List[Any]:
+        """Return results or errors of function called in threads."""
+        results: List[Any] = [None] * self.CALLERS_NUMBER
+
+        def call(index: int) -> None:
+            try:
+                results[index] = function()
+            except Exception as err:
+                results[index] = err
+
+        threads = [
+            threading.Thread(target=call, args=(index,))
+            for index in range(self.CALLERS_NUMBER)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def wait_for_callers(self, flight: SingleFlight[Any, Any]) -> None:
+        """Wait until all callers have asked for key."""
+        while flight.stats.calls < self.CALLERS_NUMBER:
+            time.sleep(0.001)
+
+    def test_result_is_shared(self, flight: SingleFlight[str, int]) -> None:
+        """Check concurrent callers get result of one call."""
+        calls_number = itertools.count(1)
+
+        def function() -> int:
+            self.wait_for_callers(flight)
+            return next(calls_number)
+
+        results = self.call_concurrently(lambda: flight.do("key", function))
+        assert results == [1] * self.CALLERS_NUMBER
+        assert flight.stats == FlightStats(calls=5, coalesced=4)
+        assert flight.stats.dedup_ratio == 0.8
+        assert TIMINGS.counters == {"test_lookups": 5, "test_coalesced": 4}
+        assert flight.do("key", lambda: next(calls_number)) == 2
+
+    def test_error_is_shared(self, flight: SingleFlight[str, int]) -> None:
+        """Check concurrent callers get error of one call."""
+        error = CantGetWeather("No weather")
+
+        def function() -> int:
+            self.wait_for_callers(flight)
+            raise error
+
+        results = self.call_concurrently(lambda: flight.do("key", function))
+        assert results == [error] * self.CALLERS_NUMBER
+
+    def test_waiting_caller_deadline(self, flight: SingleFlight[str, int]) -> None:
+        """Check waiting caller doesn't wait longer than its deadline."""
+        started = threading.Event()
+        finish = threading.Event()
+
+        def function() -> int:
+            started.set()
+            finish.wait()
+            return 1
+
+        leader = threading.Thread(target=flight.do, args=("key", function))
+        leader.start()
+        started.wait()
+        try:
+            with Deadline(0.05):
+                with pytest.raises(DeadlineExceeded, match="waiting for test"):
+                    flight.do("key", function)
+        finally:
+            finish.set()
+            leader.join()
+
+    def test_async(self, flight: SingleFlight[str, int]) -> None:
+        """Check concurrent coroutines get result of one call."""
+        calls_number = itertools.count(1)
+
+        async def function() -> int:
+            await asyncio.sleep(0.01)
+            return next(calls_number)
+
+        async def call_concurrently() -> List[int]:
+            return await asyncio.gather(
+                *(flight.do_async("key", function) for _ in range(3))
+            )
+
+        assert asyncio.run(call_concurrently()) == [1, 1, 1]
+        assert flight.stats == FlightStats(calls=3, coalesced=2)
+
+    def test_get_weather(self, monkeypatch: MonkeyPatch, weather: Weather) -> None:
+        """Check concurrent requests of the same weather make one request."""
+        requests_number = [0]
+
+        def mock_get_weather_by_command(*_: Any) -> Weather:
+            requests_number[0] += 1
+            self.wait_for_callers(WEATHER_FLIGHTS)
+            return weather
+
+        monkeypatch.setattr("weather_api_service.OPEN_WEATHER_API_KEY", "qwerty")
+        monkeypatch.setattr(
+            "weather_api_service._get_weather_by_command", mock_get_weather_by_command
+        )
+        results = self.call_concurrently(lambda: get_weather(Coordinates(55.75, 37.62)))
+        assert results == [weather] * self.CALLERS_NUMBER
+        assert requests_number == [1]
+
+
+class TestRateLimiter:
+    """Tests for rate_limit.py module."""
+
+    @pytest.fixture
+    def clock(self) -> FakeClock:
+        """Fixture for clock."""
+        return FakeClock()
+
+    def make_bucket(self, clock: FakeClock) -> SharedTokenBucket:
+        """Return bucket of two tokens refilled every second."""
+        return SharedTokenBucket("test", rate=1, capacity=2, max_wait=2.5, clock=clock)
+
+    def test_pacing(self, clock: FakeClock) -> None:
+        """Check requests wait for tokens in turn and are shed after max wait."""
+        bucket = self.make_bucket(clock)
+        assert [bucket._take_token() for _ in range(4)] == [0, 0, 1, 2]
+        with pytest.raises(QuotaExhausted, match="within 60 per minute"):
+            bucket._take_token()
+        assert bucket.stats == RateLimiterStats(requests=5, delayed=2, shed=1, waited=3)
+        assert TIMINGS.counters == {
+            "test_rate_limit_delayed": 2,
+            "test_rate_limit_shed": 1,
+        }
+        clock.now = 10
+        assert bucket._take_token() == 0
+
+    def test_bucket_is_shared(self, clock: FakeClock) -> None:
+        """Check buckets of the same name in different processes share tokens."""
+        self.make_bucket(clock)._take_token()
+        self.make_bucket(clock)._take_token()
+        assert self.make_bucket(clock)._take_token() == 1
+
+    def test_deadline(self, clock: FakeClock) -> None:
+        """Check request isn't waiting for token longer than its deadline."""
+        bucket = self.make_bucket(clock)
+        bucket._take_token()
+        bucket._take_token()
+        with Deadline(0.5):
+            with pytest.raises(QuotaExhausted):
+                bucket._take_token()
+
+    def test_fetch(self, monkeypatch: MonkeyPatch) -> None:
+        """Check every attempt of request waits for token."""
+        monkeypatch.setattr("config.retry_backoff", 0)
+        bucket = SharedTokenBucket("test", rate=50, capacity=1, max_wait=1)
+        command = FlakyCommand(1, CommandExecutionFailed())
+        fetch.execute(command, "weather", bucket)  # type: ignore
+        assert bucket.stats.requests == 2
+        assert bucket.stats.delayed == 1
+
+
+class TestApiKeyPool:
+    """Tests for api_keys.py module."""
+
+    @pytest.fixture
+    def clock(self) -> FakeClock:
+        """Fixture for clock."""
+        return FakeClock()
+
+    @pytest.fixture
+    def pool(self, clock: FakeClock) -> ApiKeyPool:
+        """Fixture for pool of keys with two tokens each."""
+        return ApiKeyPool("test", rate=1, capacity=2, max_wait=1, clock=clock)
+
+    def test_key_with_more_quota_is_chosen(self, pool: ApiKeyPool) -> None:
+        """Check requests are spread over keys by tokens left."""
+        chosen = []
+        for _ in range(4):
+            key, rate_limiter = pool.choose(["a", "b"])
+            rate_limiter._take_token()
+            chosen.append(key)
+        assert sorted(chosen) == ["a", "a", "b", "b"]
+
+    def test_retired_key_is_not_chosen(
+        self, pool: ApiKeyPool, clock: FakeClock
+    ) -> None:
+        """Check retired key is skipped until its retirement ends."""
+        pool.retire("a", 10)
+        assert pool.choose(["a", "b"])[0] == "b"
+        assert TIMINGS.counters == {"test_key_retired": 1}
+        clock.now = 10
+        assert not pool.is_retired("a")
+
+    def test_all_keys_retired(self, pool: ApiKeyPool) -> None:
+        """Check error is raised if there is no key to choose."""
+        pool.retire("a", 10)
+        with pytest.raises(ApiKeysRetired):
+            pool.choose(["a"])
+
+    def test_rejected_key_is_retired(self, monkeypatch: MonkeyPatch) -> None:
+        """Check request rejected because of key is repeated with another key."""
+
+        class KeyCheckingHandler(FakeUpstreamHandler):
+            """Handler rejecting key 'bad'."""
+
+            def do_GET(self) -> None:
+                if "appid=bad" in self.path:
+                    self._send_json(401, b'{"cod": 401, "message": "Invalid key"}')
+                else:
+                    super().do_GET()
+
+        monkeypatch.setattr("config.transport", config.Transport.HTTP)
+        monkeypatch.setattr("weather_api_service.OPEN_WEATHER_API_KEYS", ["bad", "ok"])
+        with FakeUpstream(handler=KeyCheckingHandler) as upstream:
+            monkeypatch.setattr(
+                "patterns.open_weather_api_url_pattern",
+                upstream.open_weather_url + "?lat={latitude}&appid={api_key}",
+            )
+            for latitude in range(3):
+                get_weather(Coordinates(latitude, 0))
+            assert upstream.server.responses[401] == 1
+        assert WEATHER_API_KEYS.is_retired("bad")
+        assert not WEATHER_API_KEYS.is_retired("ok")
+
+
+class TestSpatialIndex:
+    """Tests for spatial_index.py module."""
+
+    moscow = Coordinates(55.7522, 37.6156)
+
+    @pytest.fixture
+    def clock(self) -> FakeClock:
+        """Fixture for clock."""
+        return FakeClock()
+
+    @pytest.fixture
+    def index(self, clock: FakeClock) -> SpatialIndex[str, int]:
+        """Fixture for index with 2 km radius."""
+        return SpatialIndex("test", radius=2, max_size=3, ttl=10, clock=clock)
+
+    def test_distance(self) -> None:
+        """Check distance between Moscow and Saint Petersburg."""
+        assert distance(self.moscow, Coordinates(59.9386, 30.3141)) == pytest.approx(
+            634, abs=1
+        )
+
+    def test_nearest(self, index: SpatialIndex[str, int]) -> None:
+        """Check the nearest value within radius is found."""
+        index.set(Coordinates(55.76, 37.62), "ru", 1)
+        index.set(Coordinates(55.75, 37.61), "ru", 2)
+        index.set(Coordinates(55.80, 37.62), "ru", 3)
+        assert index.nearest(self.moscow, "ru") == (Coordinates(55.75, 37.61), 2)
+        assert index.nearest(self.moscow, "en") is None
+        assert index.nearest(Coordinates(55.9, 37.6), "ru") is None
+        assert index.stats == SpatialStats(hits=1, misses=2)
+        assert index.stats.hit_ratio == pytest.approx(1 / 3)
+        assert TIMINGS.counters == {"test_nearby_hits": 1, "test_nearby_misses": 2}
+
+    @pytest.mark.parametrize(
+        "coordinates",
+        [Coordinates(69.0, 179.99), Coordinates(69.0, -179.99), Coordinates(-89, 0)],
+    )
+    def test_nearest_across_cells(
+        self, index: SpatialIndex[str, int], coordinates: Coordinates
+    ) -> None:
+        """Check points near antimeridian and pole are found across cells."""
+        index.set(coordinates, "ru", 1)
+        for shift in (-0.02, 0.02):
+            shifted = Coordinates(coordinates.latitude, coordinates.longitude + shift)
+            assert index.nearest(shifted, "ru") == (coordinates, 1)
+
+    def test_ttl(self, index: SpatialIndex[str, int], clock: FakeClock) -> None:
+        """Check expired value isn't found."""
+        index.set(self.moscow, "ru", 1)
+        clock.now = 10
+        assert index.nearest(self.moscow, "ru") is None
+
+    def test_eviction(self, index: SpatialIndex[str, int]) -> None:
+        """Check value put first is evicted."""
+        for number in range(4):
+            index.set(Coordinates(number, 0), "ru", number)
+        assert len(index) == 3
+        assert index.nearest(Coordinates(0, 0), "ru") is None
+        assert index.nearest(Coordinates(3, 0), "ru") == (Coordinates(3, 0), 3)
+
+    def test_radius_change(self, index: SpatialIndex[str, int]) -> None:
+        """Check values are found within changed radius and disabled by 0."""
+        index.set(self.moscow, "ru", 1)
+        index.radius = 20
+        assert index.nearest(Coordinates(55.85, 37.6), "ru") == (self.moscow, 1)
+        index.radius = 0
+        assert index.nearest(self.moscow, "ru") is None
+
+    def test_get_weather_nearby(
+        self, monkeypatch: MonkeyPatch, weather: Weather
+    ) -> None:
+        """Check weather for coordinates near cached ones isn't requested."""
+        requested_urls = []
+
+        def mock_get_weather_by_command(command: HttpCommand, *_: Any) -> Weather:
+            requested_urls.append(command.url)
+            return weather
+
+        monkeypatch.setattr("weather_api_service.OPEN_WEATHER_API_KEY", "qwerty")
+        monkeypatch.setattr(
+            "weather_api_service._get_weather_by_command", mock_get_weather_by_command
+        )
+        assert get_weather(self.moscow) is weather
+        assert get_weather(Coordinates(55.7622, 37.6156)) is weather
+        assert len(requested_urls) == 1
+        assert WEATHER_NEARBY.stats == SpatialStats(hits=1, misses=1)
+        get_weather(Coordinates(55.9, 37.6))
+        assert len(requested_urls) == 2
+
+
+class TestSharedCache:
+    """Tests for shared_cache.py module."""
+
+    def test_ttl(self) -> None:
+        """Check expired value is given only as stale one."""
+        cache = SharedCache(max_size=10)
+        cache.set("a", b"1", ttl=10)
+        cache.set("b", b"2", ttl=-1)
+        assert cache.get("a") == b"1"
+        assert cache.get("b") is None
+        assert cache.get_stale("b") == b"2"
+        assert cache.get("c") is None
+
+    def test_eviction(self) -> None:
+        """Check value expiring first is evicted."""
+        cache = SharedCache(max_size=2)
+        cache.set("a", b"1", ttl=30)
+        cache.set("b", b"2", ttl=10)
+        cache.set("c", b"3", ttl=20)
+        assert cache.get_stale("b") is None
+        assert len(cache) == 2
+
+    def test_broken_database_is_recreated(self) -> None:
+        """Check cache works after its file is broken."""
+        config.CACHE_DIR.mkdir(parents=True)
+        SHARED_CACHE.path.write_text("{broken" * 100)
+        SHARED_CACHE.set("a", b"1", ttl=10)
+        assert SHARED_CACHE.get("a") == b"1"
+
+    def test_lock_timeout(self, monkeypatch: MonkeyPatch) -> None:
+        """Check stuck holder of lock is waited only for lock timeout."""
+        monkeypatch.setattr("config.shared_cache_lock_timeout", 0.1)
+        cache = SharedCache(max_size=10)
+
+        async def lock_async() -> None:
+            async with cache.lock_async("a"):
+                pass
+
+        with cache.lock("a"):
+            start = time.perf_counter()
+            with cache.lock("a"):
+                pass
+            asyncio.run(lock_async())
+            assert 0.2 <= time.perf_counter() - start < 1
+
+    def test_one_request_from_many_processes(self) -> None:
+        """Check concurrent processes request weather for one place once."""
+        script = (
+            "from coordinates import Coordinates\n"
+            "from weather_api_service import get_weather\n"
+            "print(get_weather(Coordinates(55.7522, 37.6156)).city)\n"
+        )
+        behavior = UpstreamBehavior(latency=0.2)
+        with FakeUpstream(behavior=behavior) as upstream:
+            environment = {
+                **os.environ,
+                "XDG_CACHE_HOME": str(config.CACHE_DIR.parent),
+                "OPEN_WEATHER_API_URL": upstream.open_weather_url,
+                "OPEN_WEATHER_API_KEY": "qwerty",
+            }
+            processes = [
+                subprocess.Popen(
+                    [sys.executable, "-c", script],
+                    env=environment,
+                    stdout=subprocess.PIPE,
+                    text=True,
+                )
+                for _ in range(4)
+            ]
+            outputs = [process.communicate(timeout=10)[0] for process in processes]
+            assert upstream.server.responses == {200: 1}
+        assert len(set(outputs)) == 1
+        assert outputs[0].strip()
+
+
+class TestCoordinatesCache:
+    """Tests for caching current GPS coordinates on disk."""
+
+    coordinates = Coordinates(latitude=55.7522, longitude=37.6156)
+
+    @pytest.fixture
+    def requests_number(self, monkeypatch: MonkeyPatch) -> List[int]:
+        """Fixture counting requests of GPS coordinates."""
+        requests_number = [0]
+
+        def mock_get_gps_coordinates_by_command(_: Any) -> Coordinates:
+            requests_number[0] += 1
+            return self.coordinates
+
+        monkeypatch.setattr(
+            "coordinates._get_gps_coordinates_by_command",
+            mock_get_gps_coordinates_by_command,
+        )
+        monkeypatch.setattr("coordinates.network_fingerprint", lambda: "network")
+        return requests_number
+
+    def test_coordinates_are_cached(self, requests_number: List[int]) -> None:
+        """Check coordinates are requested once."""
+        assert get_gps_coordinates() == self.coordinates
+        assert get_gps_coordinates() == self.coordinates
+        assert requests_number == [1]
+
+    def test_cached_coordinates_are_taken_without_probes(
+        self, monkeypatch: MonkeyPatch, requests_number: List[int]
+    ) -> None:
+        """Check default sources don't connect to gpsd before cached coordinates."""
+        connections = []
+        monkeypatch.setattr(
+            "socket.create_connection", lambda *args, **_: connections.append(args)
+        )
+        assert get_gps_coordinates() == self.coordinates
+        assert get_gps_coordinates() == self.coordinates
+        assert requests_number == [1]
+        assert connections == []
+
+    def test_network_change_invalidates_cache(
+        self, monkeypatch: MonkeyPatch, requests_number: List[int]
+    ) -> None:
+        """Check coordinates are requested again if network has changed."""
+        get_gps_coordinates()
+        monkeypatch.setattr("coordinates.network_fingerprint", lambda: "other")
+        get_gps_coordinates()
+        assert requests_number == [2]
+
+    def test_cache_expires(
+        self, monkeypatch: MonkeyPatch, requests_number: List[int]
+    ) -> None:
+        """Check coordinates are requested again after time to live."""
+        monkeypatch.setattr("config.coordinates_cache_ttl", 0.01)
+        get_gps_coordinates()
+        time.sleep(0.02)
+        get_gps_coordinates()
+        assert requests_number == [2]
+
+    def test_cache_disabled(
+        self, monkeypatch: MonkeyPatch, requests_number: List[int]
+    ) -> None:
+        """Check coordinates are not cached if time to live is zero."""
+        monkeypatch.setattr("config.coordinates_cache_ttl", 0)
+        get_gps_coordinates()
+        get_gps_coordinates()
+        assert requests_number == [2]
+
+    def test_broken_cache_file_is_ignored(self, requests_number: List[int]) -> None:
+        """Check coordinates are requested if cache file is broken."""
+        config.CACHE_DIR.mkdir(parents=True)
+        SHARED_CACHE.path.write_text("{broken")
+        assert get_gps_coordinates() == self.coordinates
+        assert requests_number == [1]
+
+    def test_network_fingerprint_is_stable(self) -> None:
+        """Check fingerprint doesn't change while network is the same."""
+        assert network_fingerprint() == network_fingerprint()
+
+
+class TestIpDatabase:
+    """Tests for ip_database.py module."""
+
+    csv_rows = (
+        "1.0.4.0,1.0.7.255,AU,Victoria,Melbourne,-37.814,144.9633\n"
+        "1.0.0.0,1.0.0.255,-33.8688,151.2093\n"
+        "2a02:6b8::,2a02:6b8:ffff:ffff:ffff:ffff:ffff:ffff,55.7522,37.6156\n"
+    )
+
+    @pytest.fixture
+    def database(self, tmp_path: Path) -> IpDatabase:
+        """Fixture for database imported from CSV file."""
+        csv_path = tmp_path / "ranges.csv"
+        csv_path.write_text(self.csv_rows)
+        database = IpDatabase(recheck_interval=0)
+        assert import_csv(csv_path, database.path) == 3
+        return database
+
+    @pytest.mark.parametrize(
+        "ip_address, location",
+        [
+            ("1.0.0.0", (-33.8688, 151.2093)),
+            ("1.0.0.255", (-33.8688, 151.2093)),
+            ("1.0.6.1", (-37.814, 144.9633)),
+            ("2a02:6b8::1", (55.7522, 37.6156)),
+            ("1.0.1.0", None),
+            ("0.255.255.255", None),
+            ("1.0.8.0", None),
+            ("not an address", None),
+        ],
+    )
+    def test_lookup(
+        self,
+        database: IpDatabase,
+        ip_address: str,
+        location: Optional[Tuple[float, float]],
+    ) -> None:
+        """Check address is found in range containing it."""
+        assert database.lookup(ip_address) == location
+
+    def test_lookup_is_fast(self, database: IpDatabase) -> None:
+        """Check lookup in mapped file takes microseconds."""
+        database.recheck_interval = 1
+        database.lookup("1.0.6.1")
+        start = time.perf_counter()
+        for _ in range(1000):
+            database.lookup("1.0.6.1")
+        assert time.perf_counter() - start < 0.1
+
+    def test_missing_or_broken_database(self, database: IpDatabase) -> None:
+        """Check database without usable file knows no addresses."""
+        database.path.write_bytes(b"broken")
+        assert database.lookup("1.0.0.1") is None
+        database.path.unlink()
+        assert database.lookup("1.0.0.1") is None
+
+    def test_reimport(self, database: IpDatabase, tmp_path: Path) -> None:
+        """Check lookup uses database imported again after recheck interval."""
+        clock = FakeClock()
+        database = IpDatabase(recheck_interval=1, clock=clock)
+        database.lookup("1.0.0.1")
+        csv_path = tmp_path / "new_ranges.csv"
+        csv_path.write_text("1.0.0.0,1.0.0.255,10,20\n")
+        import_csv(csv_path, database.path)
+        assert database.lookup("1.0.0.1") == (-33.8688, 151.2093)
+        clock.now = 1
+        assert database.lookup("1.0.0.1") == (10, 20)
+
+    def test_get_gps_coordinates(
+        self, monkeypatch: MonkeyPatch, database: IpDatabase
+    ) -> None:
+        """Check coordinates of public IP address are got without request."""
+
+        def mock_get_gps_coordinates_by_command(_: Any) -> Coordinates:
+            raise AssertionError("Coordinates must not be requested")
+
+        monkeypatch.setattr(
+            "coordinates._get_gps_coordinates_by_command",
+            mock_get_gps_coordinates_by_command,
+        )
+        monkeypatch.setattr("config.PUBLIC_IP", "2a02:6b8::1")
+        assert get_gps_coordinates() == Coordinates(55.7522, 37.6156)
+
+    def test_main(
+        self, capsys: CaptureFixture[str], database: IpDatabase, tmp_path: Path
+    ) -> None:
+        """Check CSV file is imported from command line."""
+        output = tmp_path / "other.bin"
+        ip_database_main([str(tmp_path / "ranges.csv"), "--output", str(output)])
+        assert capsys.readouterr().out == f"3 IP ranges are imported into {output}\n"
+        assert output.read_bytes() == database.path.read_bytes()
+
+
+class TestCoordinatesSources:
+    """Tests for getting current GPS coordinates from several sources."""
+
+    coordinates = Coordinates(latitude=55.7522, longitude=37.6156)
+
+    @pytest.fixture(autouse=True)
+    def no_requests(self, monkeypatch: MonkeyPatch) -> None:
+        """Fail requests of coordinates from ipinfo."""
+
+        def mock_get_gps_coordinates_by_command(_: Any) -> Coordinates:
+            raise CantGetGpsCoordinates("Coordinates must not be requested")
+
+        monkeypatch.setattr(
+            "coordinates._get_gps_coordinates_by_command",
+            mock_get_gps_coordinates_by_command,
+        )
+
+    @pytest.fixture
+    def gpsd(self) -> Iterator[Tuple[str, int]]:
+        """Fixture for fake gpsd reporting fix after report without it."""
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        server.listen()
+
+        def serve() -> None:
+            connection, _ = server.accept()
+            with connection:
+                connection.sendall(b'{"class":"VERSION","release":"3.22"}\n')
+                connection.recv(1024)
+                connection.sendall(
+                    b'{"class":"TPV","mode":1}\n'
+                    b'{"class":"TPV","mode":3,"lat":55.7522,"lon":37.6156}\n'
+                )
+
+        thread = threading.Thread(target=serve, daemon=True)
+        thread.start()
+        yield server.getsockname()
+        thread.join()
+        server.close()
+
+    def use_sources(self, monkeypatch: MonkeyPatch, **sources: Any) -> None:
+        """Use only given sources in order of arguments."""
+        for name, get in sources.items():
+            monkeypatch.setitem(COORDINATES_SOURCES, name, CoordinatesSource(get))
+        monkeypatch.setattr("config.coordinates_sources", list(sources))
+
+    def test_static_coordinates(self, monkeypatch: MonkeyPatch) -> None:
+        """Check coordinates set in environment are taken."""
+        monkeypatch.setattr("config.STATIC_COORDINATES", "55.7522, 37.6156")
+        assert get_gps_coordinates() == self.coordinates
+        assert TIMINGS.counters == {"gps_static_answers": 1}
+
+    def test_file_coordinates(self, monkeypatch: MonkeyPatch, tmp_path: Path) -> None:
+        """Check coordinates kept in file are taken."""
+        coordinates_file = tmp_path / "coordinates"
+        monkeypatch.setattr("config.COORDINATES_FILE", str(coordinates_file))
+        with pytest.raises(CantGetGpsCoordinates):
+            get_gps_coordinates()
+        coordinates_file.write_text("55.7522,37.6156\n")
+        assert get_gps_coordinates() == self.coordinates
+
+    def test_gpsd_coordinates(
+        self, monkeypatch: MonkeyPatch, gpsd: Tuple[str, int]
+    ) -> None:
+        """Check position with fix reported by gpsd is taken."""
+        monkeypatch.setattr("config.coordinates_sources", ["gpsd", "ipinfo"])
+        monkeypatch.setattr("config.gpsd_host", gpsd[0])
+        monkeypatch.setattr("config.gpsd_port", gpsd[1])
+        assert asyncio.run(get_gps_coordinates_async()) == self.coordinates
+
+    def test_first_source_knowing_coordinates(self, monkeypatch: MonkeyPatch) -> None:
+        """Check sources are asked in order until one knows coordinates."""
+        asked = []
+
+        def source(name: str, answer: Optional[Coordinates]) -> Any:
+            return lambda: asked.append(name) or answer
+
+        self.use_sources(
+            monkeypatch,
+            first=source("first", None),
+            second=source("second", self.coordinates),
+            third=source("third", Coordinates(0, 0)),
+        )
+        assert get_gps_coordinates() == self.coordinates
+        assert asked == ["first", "second"]
+
+    def test_race(self, monkeypatch: MonkeyPatch) -> None:
+        """Check the fastest source wins the race."""
+        monkeypatch.setattr("config.race_coordinates_sources", True)
+        self.use_sources(
+            monkeypatch,
+            slow=lambda: time.sleep(0.5) or Coordinates(0, 0),
+            empty=lambda: None,
+            fast=lambda: time.sleep(0.05) or self.coordinates,
+        )
+
+        async def get_coordinates_in_time() -> Coordinates:
+            start = time.perf_counter()
+            coordinates = await get_gps_coordinates_async()
+            assert time.perf_counter() - start < 0.4
+            return coordinates
+
+        start = time.perf_counter()
+        assert get_gps_coordinates() == self.coordinates
+        assert time.perf_counter() - start < 0.4
+        assert asyncio.run(get_coordinates_in_time()) == self.coordinates
+        assert TIMINGS.counters == {"gps_fast_answers": 2}
+
+    def test_race_losers_do_not_block_exit(self) -> None:
+        """Check process exits without waiting for sources losing the race."""
+        script = (
+            "import time\n"
+            "import config\n"
+            "from coordinates import Coordinates, get_gps_coordinates\n"
+            "from coordinates import register_coordinates_source\n"
+            "register_coordinates_source('slow', lambda: time.sleep(30))\n"
+            "register_coordinates_source('fast', lambda: Coordinates(1, 2))\n"
+            "config.coordinates_sources = ['slow', 'fast']\n"
+            "config.race_coordinates_sources = True\n"
+            "print(get_gps_coordinates())\n"
+        )
+        environment = {**os.environ, "XDG_CACHE_HOME": str(config.CACHE_DIR.parent)}
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-c", script],
+            env=environment,
+            stdout=subprocess.PIPE,
+            text=True,
+            timeout=20,
+            check=True,
+        ).stdout
+        assert time.perf_counter() - start < 10
+        assert "latitude=1" in output
+
+    @pytest.mark.parametrize("race", [False, True])
+    def test_no_source_knows_coordinates(
+        self, monkeypatch: MonkeyPatch, race: bool
+    ) -> None:
+        """Check error of the first failed source is raised."""
+        monkeypatch.setattr("config.race_coordinates_sources", race)
+        self.use_sources(
+            monkeypatch, empty=lambda: None, ipinfo=COORDINATES_SOURCES["ipinfo"].get
+        )
+        with pytest.raises(CantGetGpsCoordinates, match="must not be requested"):
+            get_gps_coordinates()
+        with pytest.raises(CantGetGpsCoordinates, match="must not be requested"):
+            asyncio.run(get_gps_coordinates_async())
+        self.use_sources(monkeypatch, empty=lambda: None)
+        with pytest.raises(CantGetGpsCoordinates, match="No source knows"):
+            get_gps_coordinates()
+
+
+class TestGettingWeatherInBatch:
+    """Tests for getting weather for many coordinates."""
+
+    def test_get_weather_many(self, monkeypatch: MonkeyPatch, weather: Weather) -> None:
+        """Check every coordinates get result and concurrency is bounded."""
+        lock = threading.Lock()
+        running = [0]
+        max_running = [0]
+
+        def mock_get_weather(coordinates: Coordinates) -> Weather:
+            with lock:
+                running[0] += 1
+                max_running[0] = max(max_running[0], running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+            if coordinates.latitude < 0:
+                raise CantGetWeather("No weather")
+            return weather
+
+        monkeypatch.setattr("weather_api_service.OPEN_WEATHER_API_KEY", "qwerty")
+        monkeypatch.setattr("weather_api_service.get_weather", mock_get_weather)
+        coordinates = [Coordinates(latitude, 0) for latitude in range(-5, 15)]
+        stats = BatchStats()
+        results = list(get_weather_many(coordinates, concurrency=4, stats=stats))
+        assert sorted(result.coordinates for result in results) == coordinates
+        for result in results:
+            if result.coordinates.latitude < 0:
+                assert isinstance(result.error, CantGetWeather)
+                assert result.weather is None
+            else:
+                assert result.weather is weather
+                assert result.error is None
+        assert max_running[0] == 4
+        assert (stats.succeeded, stats.failed) == (15, 5)
+        assert stats.throughput > 0
+
+
+class TestServer(SetupWeather):
+    """Tests for server.py module."""
+
+    @pytest.fixture
+    def server(self, monkeypatch: MonkeyPatch) -> Iterator[WeatherServer]:
+        """Fixture for running weather server with mocked weather."""
+
+        def mock_get_weather(coordinates: Coordinates) -> Weather:
+            if coordinates.latitude == 0:
+                raise CantGetWeather("No weather")
+            return self.TEST_WEATHER
+
+        monkeypatch.setattr("server.get_weather", mock_get_weather)
+        monkeypatch.setattr("server.get_gps_coordinates", lambda: Coordinates(1, 1))
+        server = WeatherServer("127.0.0.1", 0)
+        thread = threading.Thread(
+            target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+        )
+        thread.start()
+        yield server
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+    def get(self, server: WeatherServer, path: str) -> Tuple[int, str]:
+        """Return status and text of response to GET request."""
+        connection = HTTPConnection("127.0.0.1", server.server_port, timeout=5)
+        connection.request("GET", path)
+        response = connection.getresponse()
+        status, text = response.status, response.read().decode()
+        connection.close()
+        return status, text
+
+    @pytest.mark.parametrize(
+        "path,expected_text",
+        [
+            ("/weather?lat=55.75&lon=37.62", SetupWeather.EXPECTED_DISPLAYING_WEATHER),
+            ("/weather", SetupWeather.EXPECTED_DISPLAYING_WEATHER),
+            ("/weather?lat=55.75&lon=37.62&units=metric", "15°C"),
+            ("/weather?lat=55.75&lon=37.62&units=imperial", "5.6mph"),
+            ("/weather?lat=55.75&lon=37.62&units=standard", "288°K"),
+        ],
+    )
+    def test_weather(
+        self, server: WeatherServer, path: str, expected_text: str
+    ) -> None:
+        """Check server gives formatted weather."""
+        status, text = self.get(server, path)
+        assert status == 200
+        assert expected_text in text
+
+    @pytest.mark.parametrize(
+        "path,expected_status",
+        [
+            ("/", 404),
+            ("/weather?lat=55.75", 400),
+            ("/weather?lat=north&lon=37.62", 400),
+            ("/weather?lat=95&lon=37.62", 400),
+            ("/weather?lat=55.75&lon=37.62&units=parrots", 400),
+            ("/weather?lat=0&lon=37.62", 502),
+        ],
+    )
+    def test_errors(
+        self, server: WeatherServer, path: str, expected_status: int
+    ) -> None:
+        """Check server answers with error status on wrong requests."""
+        status, _ = self.get(server, path)
+        assert status == expected_status
+
+    def test_metrics(self, server: WeatherServer) -> None:
+        """Check server gives durations of stages as JSON."""
+        TIMINGS.enabled = True
+        self.get(server, "/weather?lat=55.75&lon=37.62")
+        status, text = self.get(server, "/metrics")
+        assert status == 200
+        assert json.loads(text)["stages"]["format_weather"]["calls"] == 1
+
+
+class TestDaemon(SetupWeather):
+    """Tests for daemon.py and weather_client.py modules."""
+
+    @pytest.fixture
+    def socket_path(self) -> Iterator[str]:
+        """Fixture for short path of Unix socket."""
+        directory = tempfile.mkdtemp()
+        yield os.path.join(directory, "weather.sock")
+        shutil.rmtree(directory)
+
+    @pytest.fixture
+    def daemon(
+        self, monkeypatch: MonkeyPatch, socket_path: str
+    ) -> Iterator[WeatherDaemon]:
+        """Fixture for running weather daemon with mocked weather."""
+        monkeypatch.setattr("daemon.get_weather", lambda _: self.TEST_WEATHER)
+        monkeypatch.setattr("daemon.get_gps_coordinates", lambda: None)
+        daemon = WeatherDaemon(socket_path)
+        thread = threading.Thread(
+            target=daemon.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+        )
+        thread.start()
+        yield daemon
+        daemon.shutdown()
+        daemon.server_close()
+        thread.join()
+
+    def test_daemon_answers_weather(self, daemon: WeatherDaemon) -> None:
+        """Check daemon answers with formatted weather."""
+        exit_code, text = request_daemon(daemon.socket_path)
+        assert exit_code == 0
+        assert text == self.EXPECTED_DISPLAYING_WEATHER + "\n"
+
+    def test_daemon_answers_error(
+        self, monkeypatch: MonkeyPatch, daemon: WeatherDaemon
+    ) -> None:
+        """Check daemon answers with error if weather can't be got."""
+
+        def mock_get_weather(_: Any) -> Weather:
+            raise CantGetWeather("No weather")
+
+        monkeypatch.setattr("daemon.get_weather", mock_get_weather)
+        assert request_daemon(daemon.socket_path) == (1, "No weather\n")
+
+    def test_second_daemon_is_not_started(self, daemon: WeatherDaemon) -> None:
+        """Check daemon is not started on socket of running daemon."""
+        with pytest.raises(DaemonAlreadyRunning):
+            WeatherDaemon(daemon.socket_path)
+
+    def test_stale_socket_is_replaced(self, socket_path: str) -> None:
+        """Check daemon is started on socket left by dead daemon."""
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.bind(socket_path)
+        WeatherDaemon(socket_path).server_close()
+        assert not os.path.exists(socket_path)
+
+    def test_client_prints_daemon_answer(
+        self,
+        capsys: CaptureFixture,
+        monkeypatch: MonkeyPatch,
+        daemon: WeatherDaemon,
+    ) -> None:
+        """Check client prints weather got from daemon."""
+        monkeypatch.setattr("weather_client.DAEMON_SOCKET_PATH", daemon.socket_path)
+        monkeypatch.setattr("sys.argv", ["weather_client.py"])
+        with pytest.raises(SystemExit) as exit_info:
+            client_main()
+        assert exit_info.value.code == 0
+        assert capsys.readouterr().out == self.EXPECTED_DISPLAYING_WEATHER + "\n"
+
+    def test_foreign_socket_is_not_trusted(
+        self, monkeypatch: MonkeyPatch, daemon: WeatherDaemon, socket_path: str
+    ) -> None:
+        """Check client doesn't talk to socket of other user or to other file."""
+        uid = os.getuid()
+        with monkeypatch.context() as patch:
+            patch.setattr("os.getuid", lambda: uid + 1)
+            with pytest.raises(PermissionError):
+                request_daemon(daemon.socket_path)
+        file_path = socket_path + ".txt"
+        with open(file_path, "w"):
+            pass
+        with pytest.raises(PermissionError):
+            request_daemon(file_path)
+
+    def test_client_falls_back_to_process(
+        self, capsys: CaptureFixture, monkeypatch: MonkeyPatch, socket_path: str
+    ) -> None:
+        """Check client gets weather in process if daemon is not running."""
+        monkeypatch.setattr("weather_client.DAEMON_SOCKET_PATH", socket_path)
+        monkeypatch.setattr("sys.argv", ["weather_client.py"])
+        monkeypatch.setattr("weather.get_gps_coordinates", lambda: None)
+        monkeypatch.setattr("weather.get_weather", lambda _: self.TEST_WEATHER)
+        client_main()
+        assert capsys.readouterr().out == self.EXPECTED_DISPLAYING_WEATHER + "\n"
+
+
+class TestWeatherTypes:
+    """Tests for lookup of weather type by condition identifier."""
+
+    @pytest.mark.parametrize(
+        "weather_type_id,weather_type",
+        [
+            (200, WeatherType.THUNDERSTORM),
+            (232, WeatherType.THUNDERSTORM),
+            (300, WeatherType.DRIZZLE),
+            (321, WeatherType.DRIZZLE),
+            (500, WeatherType.RAIN),
+            (531, WeatherType.RAIN),
+            (600, WeatherType.SNOW),
+            (622, WeatherType.SNOW),
+            (701, WeatherType.MIST),
+            (711, WeatherType.SMOKE),
+            (721, WeatherType.HAZE),
+            (731, WeatherType.DUST),
+            (741, WeatherType.FOG),
+            (751, WeatherType.SAND),
+            (761, WeatherType.DUST),
+            (762, WeatherType.ASH),
+            (771, WeatherType.SQUALL),
+            (781, WeatherType.TORNADO),
+            (800, WeatherType.CLEAR),
+            (801, WeatherType.CLOUDS),
+            (804, WeatherType.CLOUDS),
+        ],
+    )
+    def test_get_weather_type(
+        self, weather_type_id: int, weather_type: WeatherType
+    ) -> None:
+        """Check weather type is found by condition identifier."""
+        assert get_weather_type(weather_type_id) is weather_type
+
+
+class TestParsingWeather:
+    """Tests for parsing Open Weather API service response."""
+
+    def test_parse_raw_output(self) -> None:
+        """Check weather is parsed from undecoded output keeping letter case."""
+        raw_output = json.dumps(OPEN_WEATHER_PAYLOAD, ensure_ascii=False).encode()
+        weather = _parse_weather(b"HTTP output: " + raw_output + b"\n")
+        assert weather == Weather(
+            temperature=15,
+            weather_type=WeatherType.CLOUDS,
+            weather_description="облачно с прояснениями",
+            wind_speed=2.5,
+            sunrise=datetime.fromtimestamp(1651539600),
+            sunset=datetime.fromtimestamp(1651598714),
+            city="Moscow",
+        )
+
+    def test_all_missing_fields_are_reported(self) -> None:
+        """Check error message names every missing field."""
+        with pytest.raises(ApiServiceError) as error_info:
+            _parse_weather('{"weather": [{"id": 800}], "main": {"temp": 1}}')
+        for field in (
+            "weather description",
+            "wind speed",
+            "sunrise time",
+            "sunset time",
+            "city name",
+        ):
+            assert field in str(error_info.value)
+        assert "temperature" not in str(error_info.value)
+
+
+class TestWeatherFrame(SetupWeather):
+    """Tests for weather_frame.py module."""
+
+    @pytest.fixture
+    def weathers(self) -> List[Weather]:
+        """Fixture for different weather observations."""
+        return [
+            self.TEST_WEATHER._replace(
+                temperature=temperature,
+                weather_type=weather_type,
+                city=city,
+            )
+            for temperature, weather_type, city in [
+                (15, WeatherType.CLOUDS, "moscow"),
+                (-3, WeatherType.SNOW, "kazan"),
+                (20, WeatherType.CLEAR, "moscow"),
+                (7, WeatherType.FOG, "kazan"),
+            ]
+        ]
+
+    def test_round_trip(self, weathers: List[Weather]) -> None:
+        """Check frame gives back the same observations."""
+        frame = WeatherFrame.from_weathers(weathers)
+        assert len(frame) == 4
+        assert frame.to_weathers() == weathers
+        assert frame[-1] == weathers[-1]
+
+    def test_strings_are_interned(self, weathers: List[Weather]) -> None:
+        """Check every city and description is stored once."""
+        frame = WeatherFrame.from_weathers(weathers)
+        assert frame.cities.strings == ["moscow", "kazan"]
+        assert len(frame.descriptions) == 1
+
+    def test_slice(self, weathers: List[Weather]) -> None:
+        """Check slice of frame is frame with sliced observations."""
+        frame = WeatherFrame.from_weathers(weathers)[1::2]
+        assert isinstance(frame, WeatherFrame)
+        assert frame.to_weathers() == weathers[1::2]
+
+    def test_filter(self, weathers: List[Weather]) -> None:
+        """Check filtering frame by masks."""
+        frame = WeatherFrame.from_weathers(weathers)
+        assert frame.filter(frame.city_mask("kazan")).to_weathers() == [
+            weathers[1],
+            weathers[3],
+        ]
+        assert frame.filter(
+            frame.weather_type_mask(WeatherType.CLEAR)
+        ).to_weathers() == [weathers[2]]
+        assert not frame.filter(frame.city_mask("paris"))
+        warm = frame.filter(temperature > 10 for temperature in frame.temperature)
+        assert list(warm.temperature) == [15, 20]
+
+    def test_wrong_mask(self, weathers: List[Weather]) -> None:
+        """Check mask must have value for every observation."""
+        with pytest.raises(ValueError):
+            WeatherFrame.from_weathers(weathers).filter([True])
+
+    def test_index_out_of_range(self, weathers: List[Weather]) -> None:
+        """Check indexing out of frame."""
+        with pytest.raises(IndexError):
+            WeatherFrame.from_weathers(weathers)[4]
+
+
+class TestTimings:
+    """Tests for timings.py module."""
+
+    def test_percentiles(self) -> None:
+        """Check percentiles of durations."""
+        histogram = Histogram()
+        for milliseconds in range(1, 101):
+            histogram.record(milliseconds / 1000)
+        stats = histogram.stats()
+        assert stats.calls == 100
+        assert stats.errors == 0
+        assert (stats.p50, stats.p95, stats.p99) == (0.05, 0.095, 0.099)
+        assert Histogram().stats().p99 == 0
+
+    def test_timed(self) -> None:
+        """Check durations are recorded only when timings are enabled."""
+
+        @timed("stage")
+        def stage(fail: bool) -> str:
+            if fail:
+                raise ValueError
+            return "done"
+
+        assert stage(False) == "done"
+        assert TIMINGS.stats() == {}
+        TIMINGS.enabled = True
+        assert stage(False) == "done"
+        with pytest.raises(ValueError):
+            stage(True)
+        stats = TIMINGS.stats()["stage"]
+        assert (stats.calls, stats.errors) == (2, 1)
+        assert stats.p50 <= stats.p99 <= stats.total
+
+    @pytest.mark.parametrize("output", ["text", "json"])
+    def test_timings_option(
+        self,
+        output: str,
+        weather: Weather,
+        capsys: CaptureFixture,
+        monkeypatch: MonkeyPatch,
+    ) -> None:
+        """Check weather.py prints durations of stages to stderr."""
+        monkeypatch.setattr("weather.get_gps_coordinates", lambda: None)
+        monkeypatch.setattr("weather.get_weather", lambda _: weather)
+        main(["--timings", output])
+        stdout, stderr = capsys.readouterr()
+        assert stdout == format_weather(weather) + "\n"
+        if output == "json":
+            assert json.loads(stderr)["stages"]["format_weather"]["calls"] == 1
+        else:
+            assert stderr.startswith("stage")
+            assert "format_weather" in stderr
+
+
 class TestFormattingWeather(SetupWeather):
     """Tests for weather_formatter.py module."""
 
@@ -141,6 +2073,34 @@ class TestFormattingWeather(SetupWeather):
         actual_displaying_weather = format_weather(self.TEST_WEATHER)
         assert actual_displaying_weather == self.EXPECTED_DISPLAYING_WEATHER
 
+    def test_stale_weather_formatter(self) -> None:
+        """Check stale weather is followed by note."""
+        assert format_weather(StaleWeather(*self.TEST_WEATHER)) == (
+            self.EXPECTED_DISPLAYING_WEATHER + stale_weather_note
+        )
+
+    @pytest.mark.parametrize(
+        "temperature_unit,speed_unit",
+        [
+            (None, None),
+            (TemperatureUnit.FAHRENHEIT, SpeedUnit.MILES_PER_HOUR),
+            (TemperatureUnit.KELVIN, SpeedUnit.KILOMETERS_PER_HOUR),
+        ],
+    )
+    def test_weather_frame_formatter(
+        self, temperature_unit: TemperatureUnit, speed_unit: SpeedUnit
+    ) -> None:
+        """Check frame is formatted the same way as every its observation."""
+        weathers = [
+            self.TEST_WEATHER._replace(temperature=temperature, wind_speed=wind_speed)
+            for temperature, wind_speed in [(15, 2.5), (-7, 0.05), (31, 12.35), (0, 3)]
+        ]
+        frame = WeatherFrame.from_weathers(weathers)
+        assert format_weather_frame(frame, temperature_unit, speed_unit) == [
+            format_weather(weather, temperature_unit, speed_unit)
+            for weather in weathers
+        ]
+
 
 class TestDisplayingWeather(SetupWeather):
     """Check that programm really display weather in terminal."""
@@ -231,6 +2191,28 @@ class TestConverters:
         """Test converting speed from m/s to mph."""
         assert convert_to_mph(speed_mps) == speed_mph
 
+    @pytest.mark.parametrize("backend", ["numpy", "array"])
+    def test_batch_converters(self, backend: str, monkeypatch: MonkeyPatch) -> None:
+        """Check batch converters give the same values as scalar ones."""
+        if backend == "numpy" and converters.numpy is None:
+            pytest.skip("NumPy is not installed")
+        if backend == "array":
+            monkeypatch.setattr(converters, "numpy", None)
+        temperatures = array("h", range(-60, 60))
+        speeds = array("d", [hundredths / 100 for hundredths in range(5000)])
+        assert list(convert_to_kelvin_many(temperatures)) == [
+            convert_to_kelvin(temperature) for temperature in temperatures
+        ]
+        assert list(convert_to_fahrenheit_many(temperatures)) == [
+            convert_to_fahrenheit(temperature) for temperature in temperatures
+        ]
+        assert list(convert_to_kph_many(speeds)) == [
+            convert_to_kph(speed) for speed in speeds
+        ]
+        assert list(convert_to_mph_many(speeds)) == [
+            convert_to_mph(speed) for speed in speeds
+        ]
+
 
 class TestConfigs(SetupWeather):
     """Tests for config.py module."""
@@ -0,0 +1,209 @@
+"""
+Latency of application stages.
+
+Functions decorated with timed() record their duration in TIMINGS
+under the stage name, for coroutine functions the whole awaited call
+is recorded. Timings are disabled by default, then decorated function
+costs one more call and one attribute check.
+"""
+
+import functools
+import inspect
+import json
+import math
+import threading
+import time
+from collections import deque
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Counter,
+    Deque,
+    Dict,
+    List,
+    NamedTuple,
+    TypeVar,
+    cast,
+)
+
+Function = TypeVar("Function", bound=Callable[..., Any])
+
+# Durations, timeouts and clock readings of all modules
+Seconds = float
+
+# Percentiles are computed over this number of the latest durations of stage
+SAMPLES_PER_STAGE = 10_000
+
+
+class StageStats(NamedTuple):
+    """Durations of stage calls."""
+
+    calls: int
+    errors: int
+    total: Seconds
+    p50: Seconds
+    p95: Seconds
+    p99: Seconds
+
+
+class Histogram:
+    """Counters and the latest durations of stage calls."""
+
+    def __init__(self, max_samples: int = SAMPLES_PER_STAGE):
+        """Create empty histogram."""
+        self.calls = 0
+        self.errors = 0
+        self.total: Seconds = 0
+        self.samples: Deque[Seconds] = deque(maxlen=max_samples)
+
+    def record(self, duration: Seconds, failed: bool = False) -> None:
+        """Add duration of call."""
+        self.calls += 1
+        self.errors += failed
+        self.total += duration
+        self.samples.append(duration)
+
+    def stats(self) -> StageStats:
+        """Return counters and percentiles of durations."""
+        samples = sorted(self.samples)
+        return StageStats(
+            calls=self.calls,
+            errors=self.errors,
+            total=self.total,
+            p50=_percentile(samples, 50),
+            p95=_percentile(samples, 95),
+            p99=_percentile(samples, 99),
+        )
+
+
+class Timings:
+    """
+    Histograms of stage durations by stage names and event counters.
+
+    Events like retries are rare, so they are counted even when
+    timings are disabled.
+    """
+
+    def __init__(self) -> None:
+        """Create disabled timings."""
+        self.enabled = False
+        self._histograms: Dict[str, Histogram] = {}
+        self._counters: Counter[str] = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, duration: Seconds, failed: bool = False) -> None:
+        """Add duration of stage call."""
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram()
+            histogram.record(duration, failed)
+
+    def count(self, event: str) -> None:
+        """Count event."""
+        with self._lock:
+            self._counters[event] += 1
+
+    @property
+    def counters(self) -> Dict[str, int]:
+        """Numbers of counted events."""
+        with self._lock:
+            return dict(self._counters)
+
+    def stats(self) -> Dict[str, StageStats]:
+        """Return stats of stages in order of their first calls."""
+        with self._lock:
+            return {
+                stage: histogram.stats()
+                for stage, histogram in self._histograms.items()
+            }
+
+    def clear(self) -> None:
+        """Forget all durations and events."""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def to_json(self) -> str:
+        """Return stats of stages and counters as JSON, durations in seconds."""
+        return json.dumps(
+            {
+                "stages": {
+                    stage: stats._asdict() for stage, stats in self.stats().items()
+                },
+                "counters": self.counters,
+            }
+        )
+
+    def report(self) -> str:
+        """Return stats of stages as table, durations in milliseconds."""
+        lines: List[str] = [
+            f"{'stage':<20} {'calls':>6} {'errors':>6} {'total':>9} "
+            f"{'p50':>9} {'p95':>9} {'p99':>9}"
+        ]
+        for stage, stats in self.stats().items():
+            durations = " ".join(
+                f"{duration * 1000:9.2f}"
+                for duration in (stats.total, stats.p50, stats.p95, stats.p99)
+            )
+            lines.append(f"{stage:<20} {stats.calls:>6} {stats.errors:>6} {durations}")
+        lines.extend(f"{event}: {number}" for event, number in self.counters.items())
+        return "\n".join(lines) + "\n"
+
+
+TIMINGS = Timings()
+
+
+def timed(stage: str) -> Callable[[Function], Function]:
+    """Record durations of decorated function calls in TIMINGS when enabled."""
+
+    def decorator(function: Function) -> Function:
+        if inspect.iscoroutinefunction(function):
+            return cast(Function, _timed_coroutine_function(stage, function))
+
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not TIMINGS.enabled:
+                return function(*args, **kwargs)
+            failed = True
+            start = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                TIMINGS.record(stage, time.perf_counter() - start, failed)
+
+        return cast(Function, wrapper)
+
+    return decorator
+
+
+def _timed_coroutine_function(
+    stage: str, function: Callable[..., Awaitable[Any]]
+) -> Callable[..., Awaitable[Any]]:
+    """Return coroutine function recording durations of awaited calls."""
+
+    @functools.wraps(function)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if not TIMINGS.enabled:
+            return await function(*args, **kwargs)
+        failed = True
+        start = time.perf_counter()
+        try:
+            result = await function(*args, **kwargs)
+            failed = False
+            return result
+        finally:
+            TIMINGS.record(stage, time.perf_counter() - start, failed)
+
+    return wrapper
+
+
+def _percentile(sorted_samples: List[Seconds], percent: float) -> Seconds:
+    """Return percentile of sorted samples by nearest rank method."""
+    if not sorted_samples:
+        return 0.0
+    rank = math.ceil(percent / 100 * len(sorted_samples))
+    return sorted_samples[max(rank, 1) - 1]
@@ -2,17 +2,79 @@
 
 """Application's executable."""
 
+import sys
+from argparse import ArgumentParser, Namespace
+from typing import Sequence
+
+import config
 from coordinates import get_gps_coordinates
+from deadline import Deadline
+from exceptions import DeadlineExceeded
+from timings import TIMINGS
 from weather_api_service import get_weather
 from weather_formatter import format_weather
 
 
-def main() -> None:
+def main(arguments: Sequence[str] = ()) -> None:
     """Application's entry point."""
-    coordinates = get_gps_coordinates()
-    weather = get_weather(coordinates)
-    print(format_weather(weather))
+    options = _parse_arguments(arguments)
+    if options.serve:
+        from server import serve
+
+        serve(options.host, options.port)
+        return
+    if options.daemon:
+        from daemon import run_daemon
+
+        run_daemon()
+        return
+    TIMINGS.enabled = options.timings is not None
+    try:
+        with Deadline(options.deadline):
+            coordinates = get_gps_coordinates()
+            weather = get_weather(coordinates)
+        print(format_weather(weather))
+    except DeadlineExceeded as err:
+        sys.exit(f"Weather is not got in {options.deadline} seconds.\n{err}")
+    finally:
+        if options.timings == "json":
+            print(TIMINGS.to_json(), file=sys.stderr)
+        elif options.timings == "text":
+            print(TIMINGS.report(), end="", file=sys.stderr)
+
+
+def _parse_arguments(arguments: Sequence[str]) -> Namespace:
+    """Parse command line arguments."""
+    parser = ArgumentParser(description="Show weather for current GPS coordinates.")
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="serve weather over HTTP at /weather?lat=..&lon=..&units=..",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="answer weather_client.py over Unix domain socket",
+    )
+    parser.add_argument(
+        "--timings",
+        nargs="?",
+        const="text",
+        choices=["text", "json"],
+        help="print durations of stages to stderr as table or JSON",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        default=config.request_deadline,
+        help="seconds to wait for weather, cached one is shown after them",
+    )
+    parser.add_argument("--host", default=config.server_host, help="server host")
+    parser.add_argument(
+        "--port", type=int, default=config.server_port, help="server port"
+    )
+    return parser.parse_args(arguments)
 
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1:])
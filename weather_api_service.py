@@ -1,31 +1,63 @@
 """Getting weather by GPS coordinates."""
 
 
+import functools
 import json
-import re
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from datetime import datetime
 from enum import Enum
 from json.decoder import JSONDecodeError
-from typing import Dict, List, Literal, NamedTuple, TypedDict, Union
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
 
+import config
+import fetch
 import patterns
+from api_keys import ApiKeyPool
+from cache import TtlLruCache
+from circuit_breaker import CircuitBreaker
 from config import (
     OPEN_WEATHER_API_KEY,
+    OPEN_WEATHER_API_KEYS,
+    Transport,
     open_weather_api_lang,
 )
-from coordinates import Coordinates
+from coordinates import Coordinates, round_coordinates
+from deadline import Deadline
 from exceptions import (
+    ApiRateLimited,
     ApiServiceError,
     CantGetWeather,
+    CircuitOpen,
     CommandExecutionFailed,
+    CommandRunsTooLong,
+    InvalidApiKey,
     NoOpenWeatherApiKey,
 )
+from http_transport import Command, HttpCommand
+from prefetch import Prefetcher
+from rate_limit import SharedTokenBucket
+from shared_cache import SHARED_CACHE
 from shell_command import (
     CURL,
     CURL_NO_INTERNET_CONNECTION_EXIT_CODE,
     CURL_SILENT_ARG,
+    CURL_STATUS_ARGS,
     ShellCommand,
 )
+from single_flight import SingleFlight
+from spatial_index import SpatialIndex
+from timings import timed
 
 Temperature = int
 Celsius = Temperature
@@ -38,16 +70,6 @@ Miles_per_hour = Speed
 Kilometers_per_hour = Speed
 
 
-class OpenWeatherDict(TypedDict):
-    """Response of the Open Weather API service."""
-
-    weather: List[Dict[Literal["id", "description"], Union[int, str]]]
-    main: Dict[Literal["temp"], float]
-    wind: Dict[Literal["speed"], float]
-    sys: Dict[Literal["sunrise", "sunset"], int]
-    name: str
-
-
 class WeatherType(Enum):
     """Weather types presented on Open Weather API service."""
 
@@ -68,6 +90,58 @@ class WeatherType(Enum):
     CLOUDS = "Облачно"
 
 
+def _build_weather_types_table() -> Tuple[Optional[WeatherType], ...]:
+    """
+    Return weather types indexed by weather condition identifier.
+
+    Identifiers -> https://openweathermap.org/weather-conditions
+    """
+    table: List[Optional[WeatherType]] = [None] * (MAX_WEATHER_TYPE_ID + 1)
+    weather_type_groups = {
+        2: WeatherType.THUNDERSTORM,
+        3: WeatherType.DRIZZLE,
+        5: WeatherType.RAIN,
+        6: WeatherType.SNOW,
+    }
+    for group, weather_type in weather_type_groups.items():
+        table[group * 100 : (group + 1) * 100] = [weather_type] * 100
+    weather_types = {
+        701: WeatherType.MIST,
+        711: WeatherType.SMOKE,
+        721: WeatherType.HAZE,
+        731: WeatherType.DUST,
+        741: WeatherType.FOG,
+        751: WeatherType.SAND,
+        761: WeatherType.DUST,
+        762: WeatherType.ASH,
+        771: WeatherType.SQUALL,
+        781: WeatherType.TORNADO,
+        800: WeatherType.CLEAR,
+        801: WeatherType.CLOUDS,
+        802: WeatherType.CLOUDS,
+        803: WeatherType.CLOUDS,
+        804: WeatherType.CLOUDS,
+    }
+    for weather_type_id, weather_type in weather_types.items():
+        table[weather_type_id] = weather_type
+    return tuple(table)
+
+
+MAX_WEATHER_TYPE_ID = 804
+WEATHER_TYPES_BY_ID = _build_weather_types_table()
+
+
+def get_weather_type(weather_type_id: int) -> WeatherType:
+    """Return weather type by Open Weather condition identifier."""
+    try:
+        weather_type = WEATHER_TYPES_BY_ID[weather_type_id]
+    except (IndexError, TypeError):
+        weather_type = None
+    if weather_type is None or weather_type_id < 0:
+        raise ApiServiceError(f"Unknown weather type identifier {weather_type_id}")
+    return weather_type
+
+
 class Weather(NamedTuple):
     """Data structure of weather."""
 
@@ -80,168 +154,498 @@ class Weather(NamedTuple):
     city: str
 
 
+class StaleWeather(Weather):
+    """Last known weather given when fresh one can't be got."""
+
+    __slots__ = ()
+
+
+class WeatherResult(NamedTuple):
+    """Result of getting weather for coordinates in batch."""
+
+    coordinates: Coordinates
+    weather: Optional[Weather]
+    error: Optional[BaseException]
+
+
+class BatchStats:
+    """Aggregate statistics of getting weather in batch."""
+
+    def __init__(self) -> None:
+        """Batch statistics constructor."""
+        self.succeeded = 0
+        self.failed = 0
+        self.elapsed = 0.0  # seconds
+
+    @property
+    def throughput(self) -> float:
+        """Return number of handled coordinates per second."""
+        if not self.elapsed:
+            return 0.0
+        return (self.succeeded + self.failed) / self.elapsed
+
+
+Weather_cache_key = Tuple[Coordinates, str]
+
+WEATHER_CACHE: TtlLruCache[Weather_cache_key, Weather] = TtlLruCache(
+    max_size=config.weather_cache_max_size, ttl=config.weather_cache_ttl
+)
+
+# Cached weather by coordinates and language for nearby requests
+WEATHER_NEARBY: SpatialIndex[str, Weather] = SpatialIndex(
+    "weather",
+    radius=config.nearby_weather_distance,
+    max_size=config.weather_cache_max_size,
+    ttl=config.weather_cache_ttl,
+)
+
+
+def _refresh_weather(cache_key: Weather_cache_key) -> None:
+    """Request fresh weather for cache key and put it in caches."""
+    coordinates, _ = cache_key
+    with Deadline(config.request_deadline):
+        weather = _get_weather_with_api_keys(coordinates)
+    SHARED_CACHE.set(
+        _get_shared_cache_key(cache_key),
+        _dump_weather(weather),
+        config.weather_cache_ttl,
+    )
+    _cache_weather(cache_key, weather)
+
+
+WEATHER_PREFETCHER: Prefetcher[Weather_cache_key, Weather] = Prefetcher(
+    "weather",
+    cache=WEATHER_CACHE,
+    refresh=_refresh_weather,
+    interval=config.prefetch_interval,
+    ahead=config.prefetch_ahead,
+    min_accesses=config.prefetch_min_accesses,
+    budget=config.prefetch_budget,
+    budget_period=config.prefetch_budget_period,
+)
+
+# Concurrent requests of weather for the same cache key share one request
+WEATHER_FLIGHTS: SingleFlight[Weather_cache_key, Weather] = SingleFlight("weather")
+
+WEATHER_API_KEYS = ApiKeyPool(
+    "open_weather",
+    rate=config.open_weather_rate_limit / 60,
+    capacity=config.open_weather_rate_burst,
+    max_wait=config.rate_limit_max_wait,
+)
+
+WEATHER_CIRCUIT = CircuitBreaker(
+    "weather",
+    failure_threshold=config.circuit_failure_threshold,
+    reset_timeout=config.circuit_reset_timeout,
+    half_open_probes=config.circuit_half_open_probes,
+)
+
+
+@timed("get_weather")
 def get_weather(coordinates: Coordinates) -> Weather:
     """Request weather in weather API service and return it."""
-    if not OPEN_WEATHER_API_KEY:
+    if not _get_api_keys():
         raise NoOpenWeatherApiKey(
             "There is no OPEN_WEATHER_API_KEY in your environment."
         )
-    else:
-        weather = _get_weather_by_command(
-            ShellCommand(
-                executable=CURL,
-                arguments=[
-                    patterns.open_weather_api_url_pattern.format(
-                        latitude=coordinates.latitude,
-                        longitude=coordinates.longitude,
-                        api_key=OPEN_WEATHER_API_KEY,
-                        language=open_weather_api_lang.value,
-                    ),
-                    CURL_SILENT_ARG,
-                ],
-                no_internet_exit_code=CURL_NO_INTERNET_CONNECTION_EXIT_CODE,
+    coordinates = round_coordinates(coordinates, config.coordinates_precision)
+    cache_key = (coordinates, open_weather_api_lang.value)
+    weather = _get_cached_weather(cache_key)
+    WEATHER_PREFETCHER.record_access(cache_key, hit=weather is not None)
+    if weather is None:
+        try:
+            weather = WEATHER_FLIGHTS.do(
+                cache_key, functools.partial(_request_weather, cache_key)
             )
-        )
+        except CommandRunsTooLong as err:
+            return _get_stale_weather(cache_key, err)
+        except CircuitOpen as err:
+            return _get_stale_weather(cache_key, CantGetWeather(str(err)))
     return weather
 
 
-def _get_weather_by_command(command: ShellCommand) -> Weather:
-    """Return weather by shell command."""
-    try:
-        command_output, *_ = command.execute()
-    except CommandExecutionFailed as err:
-        raise CantGetWeather(
-            f"Can't get weather using {[command.executable, *command.arguments]} "
-            f"command.\n{err}"
+@timed("get_weather")
+async def get_weather_async(coordinates: Coordinates) -> Weather:
+    """Request weather without blocking running event loop and return it."""
+    if not _get_api_keys():
+        raise NoOpenWeatherApiKey(
+            "There is no OPEN_WEATHER_API_KEY in your environment."
         )
-    except UnicodeDecodeError as err:
-        raise CantGetWeather(f"Can't decode shell command output:\n{err}")
-    weather = _parse_weather(command_output)
+    coordinates = round_coordinates(coordinates, config.coordinates_precision)
+    cache_key = (coordinates, open_weather_api_lang.value)
+    weather = _get_cached_weather(cache_key)
+    WEATHER_PREFETCHER.record_access(cache_key, hit=weather is not None)
+    if weather is None:
+        try:
+            weather = await WEATHER_FLIGHTS.do_async(
+                cache_key, functools.partial(_request_weather_async, cache_key)
+            )
+        except CommandRunsTooLong as err:
+            return _get_stale_weather(cache_key, err)
+        except CircuitOpen as err:
+            return _get_stale_weather(cache_key, CantGetWeather(str(err)))
     return weather
 
 
-def _parse_weather(command_output: str) -> Weather:
-    """Return weather from output of shell command."""
-    # Regex pattern for dictionary with weather data
-    weather_dictionary_pattern = r"{.*}"
-    try:
-        openweather_dict = json.loads(
-            re.search(
-                weather_dictionary_pattern, command_output
-            ).group()  # type: ignore
+def get_weather_many(
+    coordinates: Iterable[Coordinates],
+    concurrency: Optional[int] = None,
+    stats: Optional[BatchStats] = None,
+) -> Iterator[WeatherResult]:
+    """
+    Request weather for many coordinates concurrently.
+
+    Results are yielded as soon as they are ready, so their order
+    may differ from order of coordinates. Not more than concurrency
+    requests run at the same time.
+    """
+    if not _get_api_keys():
+        raise NoOpenWeatherApiKey(
+            "There is no OPEN_WEATHER_API_KEY in your environment."
         )
-    except AttributeError:
-        raise CantGetWeather(
-            f"Shell command output:\n'{command_output}'\nhas no dictionary inside"
+    concurrency = concurrency or config.weather_batch_concurrency
+    stats = stats if stats is not None else BatchStats()
+    start = time.perf_counter()
+    pending_coordinates = iter(coordinates)
+    running: Dict[Future[Weather], Coordinates] = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while True:
+            for next_coordinates in pending_coordinates:
+                running[
+                    executor.submit(get_weather, next_coordinates)
+                ] = next_coordinates
+                if len(running) >= concurrency:
+                    break
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                done_coordinates = running.pop(future)
+                error = future.exception()
+                if error is None:
+                    stats.succeeded += 1
+                    yield WeatherResult(done_coordinates, future.result(), None)
+                else:
+                    stats.failed += 1
+                    yield WeatherResult(done_coordinates, None, error)
+                stats.elapsed = time.perf_counter() - start
+
+
+def _request_weather(cache_key: Weather_cache_key) -> Weather:
+    """Request weather unless other process has just cached it, cache it."""
+    shared_key = _get_shared_cache_key(cache_key)
+    weather = _load_weather(SHARED_CACHE.get(shared_key))
+    if weather is None:
+        # Waiting for lock, other process may get the same weather
+        with SHARED_CACHE.lock(shared_key):
+            weather = _load_weather(SHARED_CACHE.get(shared_key))
+            if weather is None:
+                coordinates, _ = cache_key
+                weather = _get_weather_with_api_keys(coordinates)
+                SHARED_CACHE.set(
+                    shared_key, _dump_weather(weather), config.weather_cache_ttl
+                )
+    _cache_weather(cache_key, weather)
+    return weather
+
+
+async def _request_weather_async(cache_key: Weather_cache_key) -> Weather:
+    """Request and cache weather without blocking running event loop."""
+    shared_key = _get_shared_cache_key(cache_key)
+    weather = _load_weather(SHARED_CACHE.get(shared_key))
+    if weather is None:
+        async with SHARED_CACHE.lock_async(shared_key):
+            weather = _load_weather(SHARED_CACHE.get(shared_key))
+            if weather is None:
+                coordinates, _ = cache_key
+                weather = await _get_weather_with_api_keys_async(coordinates)
+                SHARED_CACHE.set(
+                    shared_key, _dump_weather(weather), config.weather_cache_ttl
+                )
+    _cache_weather(cache_key, weather)
+    return weather
+
+
+def _get_cached_weather(cache_key: Weather_cache_key) -> Optional[Weather]:
+    """Return fresh cached weather for coordinates or nearby ones, or None."""
+    weather = WEATHER_CACHE.get(cache_key)
+    if weather is None:
+        coordinates, language = cache_key
+        nearest = WEATHER_NEARBY.nearest(coordinates, language)
+        if nearest is not None:
+            _, weather = nearest
+    return weather
+
+
+def _cache_weather(cache_key: Weather_cache_key, weather: Weather) -> None:
+    """Put weather in caches of process."""
+    WEATHER_CACHE.set(cache_key, weather)
+    coordinates, language = cache_key
+    WEATHER_NEARBY.set(coordinates, language, weather)
+
+
+def _get_stale_weather(cache_key: Weather_cache_key, error: Exception) -> Weather:
+    """
+    Return expired cached weather when fresh one can't be got.
+
+    Raises given error if there is no weather in cache.
+    """
+    weather = WEATHER_CACHE.get_stale(cache_key)
+    if weather is None:
+        weather = _load_weather(
+            SHARED_CACHE.get_stale(_get_shared_cache_key(cache_key))
         )
-    except JSONDecodeError:
-        raise CantGetWeather(
-            f"Shell command output:\n'{command_output}'\nhas no dictionary inside"
+    if weather is None:
+        raise error
+    return StaleWeather(*weather)
+
+
+def _get_shared_cache_key(cache_key: Weather_cache_key) -> str:
+    """Return key of weather in cache shared by processes."""
+    coordinates, language = cache_key
+    return f"weather:{coordinates.latitude}:{coordinates.longitude}:{language}"
+
+
+def _dump_weather(weather: Weather) -> bytes:
+    """Return weather serialized for cache shared by processes."""
+    return json.dumps(
+        [
+            weather.temperature,
+            weather.weather_type.name,
+            weather.weather_description,
+            weather.wind_speed,
+            weather.sunrise.timestamp(),
+            weather.sunset.timestamp(),
+            weather.city,
+        ]
+    ).encode()
+
+
+def _load_weather(dumped_weather: Optional[bytes]) -> Optional[Weather]:
+    """Return weather from cache shared by processes or None if it is broken."""
+    if dumped_weather is None:
+        return None
+    try:
+        (
+            temperature,
+            weather_type,
+            weather_description,
+            wind_speed,
+            sunrise,
+            sunset,
+            city,
+        ) = json.loads(dumped_weather)
+        return Weather(
+            temperature=temperature,
+            weather_type=WeatherType[weather_type],
+            weather_description=weather_description,
+            wind_speed=wind_speed,
+            sunrise=datetime.fromtimestamp(sunrise),
+            sunset=datetime.fromtimestamp(sunset),
+            city=city,
         )
-    return Weather(
-        temperature=_parse_temperature(openweather_dict),
-        weather_type=_parse_weather_type(openweather_dict),
-        weather_description=_parse_weather_description(openweather_dict),
-        wind_speed=_parse_wind_speed(openweather_dict),
-        sunrise=_parse_sun_time(openweather_dict, "sunrise"),
-        sunset=_parse_sun_time(openweather_dict, "sunset"),
-        city=_parse_city(openweather_dict),
+    except (ValueError, TypeError, KeyError, OverflowError, OSError):
+        return None
+
+
+def _get_api_keys() -> List[str]:
+    """Return keys of Open Weather API service from environment."""
+    if OPEN_WEATHER_API_KEYS:
+        return OPEN_WEATHER_API_KEYS
+    return [OPEN_WEATHER_API_KEY] if OPEN_WEATHER_API_KEY else []
+
+
+def _get_weather_with_api_keys(coordinates: Coordinates) -> Weather:
+    """
+    Return weather requested with API key having the most of quota left.
+
+    Request rejected because of its key is repeated with another key.
+    """
+    while True:
+        api_key, rate_limiter = WEATHER_API_KEYS.choose(_get_api_keys())
+        try:
+            return _get_weather_by_command(
+                _get_weather_command(_get_weather_url(coordinates, api_key)),
+                rate_limiter,
+            )
+        except (InvalidApiKey, ApiRateLimited) as err:
+            _retire_api_key(api_key, err)
+
+
+async def _get_weather_with_api_keys_async(coordinates: Coordinates) -> Weather:
+    """Return weather requested with API key without blocking event loop."""
+    while True:
+        api_key, rate_limiter = WEATHER_API_KEYS.choose(_get_api_keys())
+        try:
+            return await _get_weather_by_command_async(
+                _get_weather_command(_get_weather_url(coordinates, api_key)),
+                rate_limiter,
+            )
+        except (InvalidApiKey, ApiRateLimited) as err:
+            _retire_api_key(api_key, err)
+
+
+def _retire_api_key(api_key: str, error: ApiServiceError) -> None:
+    """
+    Retire API key for time depending on error.
+
+    Error is raised again if there is no other key to try.
+    """
+    if isinstance(error, InvalidApiKey):
+        WEATHER_API_KEYS.retire(api_key, config.invalid_api_key_retire_time)
+    else:
+        WEATHER_API_KEYS.retire(api_key, config.rate_limited_api_key_retire_time)
+    if all(WEATHER_API_KEYS.is_retired(key) for key in _get_api_keys()):
+        raise error
+
+
+def _get_weather_url(coordinates: Coordinates, api_key: str) -> str:
+    """Return URL of weather for coordinates."""
+    return patterns.open_weather_api_url_pattern.format(
+        api_url=config.OPEN_WEATHER_API_URL,
+        latitude=coordinates.latitude,
+        longitude=coordinates.longitude,
+        api_key=api_key,
+        language=open_weather_api_lang.value,
     )
 
 
-def _parse_temperature(openweather_dict: OpenWeatherDict) -> Celsius:
-    """Return temperature from openweather response."""
-    try:
-        return round(openweather_dict["main"]["temp"])
-    except KeyError:
-        raise ApiServiceError(
-            f"There is no temperature in expected place of "
-            f"openweather response dictionary:\n{openweather_dict}"
+def _get_weather_command(url: str) -> Command:
+    """Return command for requesting url by configured transport."""
+    if config.transport is Transport.CURL:
+        return ShellCommand(
+            executable=CURL,
+            arguments=[url, CURL_SILENT_ARG, *CURL_STATUS_ARGS],
+            no_internet_exit_code=CURL_NO_INTERNET_CONNECTION_EXIT_CODE,
+            raw_output=True,
+            http_status=True,
         )
+    return HttpCommand(url=url, raw_output=True)
 
 
-def _parse_weather_type(openweather_dict: OpenWeatherDict) -> WeatherType:
-    """Return weather type from openweather response."""
+def _get_weather_by_command(
+    command: Command, rate_limiter: Optional[SharedTokenBucket] = None
+) -> Weather:
+    """Return weather by shell command."""
     try:
-        weather_type_id = str(openweather_dict["weather"][0]["id"])
-    except IndexError:
-        raise ApiServiceError(
-            f"There is no weather type identifier in expected place "
-            f"of openweather response dictionary:\n{openweather_dict}"
-        )
-    except KeyError:
-        raise ApiServiceError(
-            f"There is no weather type identifier in expected place "
-            f"of openweather response dictionary:\n{openweather_dict}"
-        )
-    weather_types = {
-        "2": WeatherType.THUNDERSTORM,
-        "3": WeatherType.DRIZZLE,
-        "5": WeatherType.RAIN,
-        "6": WeatherType.SNOW,
-        "701": WeatherType.MIST,
-        "711": WeatherType.SMOKE,
-        "721": WeatherType.HAZE,
-        "731": WeatherType.DUST,
-        "741": WeatherType.FOG,
-        "751": WeatherType.SAND,
-        "761": WeatherType.DUST,
-        "762": WeatherType.ASH,
-        "771": WeatherType.SQUALL,
-        "781": WeatherType.TORNADO,
-        "800": WeatherType.CLEAR,
-        "80": WeatherType.CLOUDS,
-    }
-    for _id, _weather_type in weather_types.items():
-        if weather_type_id.startswith(_id):
-            return _weather_type
-    raise ApiServiceError(
-        f"Unknown weather type identifier {weather_type_id} "
-        f"in openweather response dictionary:\n{openweather_dict}"
-    )
+        with WEATHER_CIRCUIT:
+            command_output, *_ = fetch.execute(command, "weather", rate_limiter)
+    except CommandExecutionFailed as err:
+        raise CantGetWeather(f"Can't get weather using {command} command.\n{err}")
+    except UnicodeDecodeError as err:
+        raise CantGetWeather(f"Can't decode shell command output:\n{err}")
+    weather = _parse_weather(command_output)
+    return weather
 
 
-def _parse_weather_description(openweather_dict: OpenWeatherDict) -> str:
-    """Return weather description from openweather response."""
+async def _get_weather_by_command_async(
+    command: Command, rate_limiter: Optional[SharedTokenBucket] = None
+) -> Weather:
+    """Return weather by command without blocking running event loop."""
     try:
-        return str(openweather_dict["weather"][0]["description"])
-    except (IndexError, KeyError):
-        raise ApiServiceError(
-            f"There is no weather description in expected place of "
-            f"openweather response dictionary:\n{openweather_dict}"
-        )
+        with WEATHER_CIRCUIT:
+            command_output, *_ = await fetch.execute_async(
+                command, "weather", rate_limiter
+            )
+    except CommandExecutionFailed as err:
+        raise CantGetWeather(f"Can't get weather using {command} command.\n{err}")
+    except UnicodeDecodeError as err:
+        raise CantGetWeather(f"Can't decode shell command output:\n{err}")
+    return _parse_weather(command_output)
+
 
+@timed("parse_weather")
+def _parse_weather(command_output: Union[str, bytes]) -> Weather:
+    """
+    Return weather from output of shell command.
 
-def _parse_wind_speed(openweather_dict: OpenWeatherDict) -> Meters_per_second:
-    """Return wind speed from openweather response."""
+    Output is parsed as is, without decoding it in advance.
+    """
+    raw_output = (
+        command_output.encode() if isinstance(command_output, str) else command_output
+    )
+    # Dictionary with weather data may be surrounded by other output
+    start = raw_output.find(b"{")
+    end = raw_output.rfind(b"}") + 1
     try:
-        return openweather_dict["wind"]["speed"]
-    except KeyError:
-        raise ApiServiceError(
-            f"There is no wind speed in expected place of "
-            f"openweather response dictionary:\n{openweather_dict}"
+        if start == -1 or end <= start:
+            raise JSONDecodeError("No dictionary", "", 0)
+        # Decoding by bytes.decode is faster than detecting encoding by json
+        openweather_dict = json.loads(raw_output[start:end].decode())
+    except ValueError:  # JSONDecodeError or UnicodeDecodeError
+        raise CantGetWeather(
+            f"Shell command output:\n'{raw_output.decode(errors='replace')}'\n"
+            f"has no dictionary inside"
+        )
+    return _parse_openweather_dict(openweather_dict)
+
+
+def _parse_openweather_dict(openweather_dict: Any) -> Weather:
+    """
+    Return weather from openweather response dictionary.
+
+    Only fields needed for weather are picked. If some of them
+    are missing, all missing fields are reported together.
+    """
+    # Error responses of service have code of error instead of weather
+    code = str(_get_field(openweather_dict, "cod"))
+    if code == "401":
+        raise InvalidApiKey(f"API key is rejected by openweather:\n{openweather_dict}")
+    if code == "429":
+        raise ApiRateLimited(
+            f"Requests quota of API key is exceeded:\n{openweather_dict}"
         )
-
-
-def _parse_sun_time(
-    openweather_dict: OpenWeatherDict, event: Literal["sunrise", "sunset"]
-) -> datetime:
-    """Return time of sunset or sunrise openweather response."""
     try:
-        return datetime.fromtimestamp(openweather_dict["sys"][event])
-    except KeyError:
+        condition = openweather_dict["weather"][0]
+        sun = openweather_dict["sys"]
+        return Weather(
+            temperature=round(openweather_dict["main"]["temp"]),
+            weather_type=get_weather_type(condition["id"]),
+            weather_description=str(condition["description"]),
+            wind_speed=openweather_dict["wind"]["speed"],
+            sunrise=datetime.fromtimestamp(sun["sunrise"]),
+            sunset=datetime.fromtimestamp(sun["sunset"]),
+            city=str(openweather_dict["name"]),
+        )
+    except (KeyError, IndexError, TypeError, ValueError, OverflowError, OSError):
+        missing_fields = _find_missing_fields(openweather_dict)
+        if missing_fields:
+            raise ApiServiceError(
+                f"There is no {', '.join(missing_fields)} in expected place of "
+                f"openweather response dictionary:\n{openweather_dict}"
+            )
+        raise ApiServiceError(
+            f"Wrong values in openweather response dictionary:\n{openweather_dict}"
+        )
+    except ApiServiceError as err:
         raise ApiServiceError(
-            f"There is no sunrise or sunset time in expected place of "
-            f"openweather response dictionary:\n{openweather_dict}"
+            f"{err} in openweather response dictionary:\n{openweather_dict}"
         )
 
 
-def _parse_city(openweather_dict: OpenWeatherDict) -> str:
-    """Return city name openweather response."""
-    try:
-        return openweather_dict["name"]
-    except KeyError:
-        raise ApiServiceError(
-            f"There is no city name in expected place of "
-            f"openweather response dictionary:\n{openweather_dict}"
+def _find_missing_fields(openweather_dict: Any) -> List[str]:
+    """Return names of weather fields missing in openweather response."""
+    conditions = _get_field(openweather_dict, "weather")
+    condition = conditions[0] if isinstance(conditions, list) and conditions else None
+    sun = _get_field(openweather_dict, "sys")
+    return [
+        name
+        for name, value in (
+            ("temperature", _get_field(_get_field(openweather_dict, "main"), "temp")),
+            ("weather type identifier", _get_field(condition, "id")),
+            ("weather description", _get_field(condition, "description")),
+            ("wind speed", _get_field(_get_field(openweather_dict, "wind"), "speed")),
+            ("sunrise time", _get_field(sun, "sunrise")),
+            ("sunset time", _get_field(sun, "sunset")),
+            ("city name", _get_field(openweather_dict, "name")),
         )
+        if value is None
+    ]
+
+
+def _get_field(dictionary: Any, key: str) -> Any:
+    """Return field of dictionary or None if there is no dictionary."""
+    if isinstance(dictionary, dict):
+        return dictionary.get(key)
+    return None
@@ -0,0 +1,70 @@
+#!/usr/bin/python3.10
+
+"""
+Thin client of weather daemon.
+
+It imports nothing but standard modules needed for talking to daemon
+over Unix domain socket, so it starts in few milliseconds. If daemon
+is not running, weather is got in process by weather.py.
+"""
+
+import os
+import socket
+import stat
+import sys
+from typing import Tuple
+
+DAEMON_SOCKET_PATH = os.getenv(
+    "WEATHER_APP_SOCKET",
+    default=os.path.join(
+        os.getenv("XDG_RUNTIME_DIR", default="/tmp"),
+        f"weather_app-{os.getuid()}.sock",
+    ),
+)
+DAEMON_TIMEOUT = 10  # seconds
+WEATHER_REQUEST = b"weather\n"
+
+Exit_code = int
+
+
+def request_daemon(socket_path: str) -> Tuple[Exit_code, str]:
+    """
+    Return exit code and text of weather daemon answer.
+
+    Raises OSError if daemon is not running or socket is not owned
+    by current user, as other user may put own socket at its path.
+    """
+    socket_stat = os.stat(socket_path)
+    if not stat.S_ISSOCK(socket_stat.st_mode) or socket_stat.st_uid != os.getuid():
+        raise PermissionError(f"{socket_path} is not socket of current user")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(DAEMON_TIMEOUT)
+        sock.connect(socket_path)
+        sock.sendall(WEATHER_REQUEST)
+        chunks = []
+        while True:
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    exit_code, _, text = b"".join(chunks).decode().partition("\n")
+    return int(exit_code), text
+
+
+def main() -> None:
+    """Print weather got from daemon or in process."""
+    if len(sys.argv) == 1:
+        try:
+            exit_code, text = request_daemon(DAEMON_SOCKET_PATH)
+        except (OSError, ValueError):
+            pass
+        else:
+            (sys.stdout if exit_code == 0 else sys.stderr).write(text)
+            sys.exit(exit_code)
+    import weather
+
+    weather.main(sys.argv[1:])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,28 @@
 """Preparing weather for printing in stdout."""
 
 import warnings
+from datetime import datetime
 from enum import Enum
-from typing import Any, Type, Union
+from typing import Any, Dict, List, Optional, Sequence, Type, Union
 
 import config
 from config import SpeedUnit, TemperatureUnit
 from converters import (
     convert_to_fahrenheit,
+    convert_to_fahrenheit_many,
     convert_to_kelvin,
+    convert_to_kelvin_many,
     convert_to_kph,
+    convert_to_kph_many,
     convert_to_mph,
+    convert_to_mph_many,
 )
-from patterns import measurement_unit_warning_pattern, weather_displaying_pattern
+from patterns import (
+    measurement_unit_warning_pattern,
+    stale_weather_note,
+    weather_displaying_pattern,
+)
+from timings import timed
 from weather_api_service import (
     Celsius,
     Fahrenheit,
@@ -20,53 +30,169 @@ from weather_api_service import (
     Kilometers_per_hour,
     Meters_per_second,
     Miles_per_hour,
+    StaleWeather,
     Weather,
 )
+from weather_frame import WEATHER_TYPES, WeatherFrame
+
 
+@timed("format_weather")
+def format_weather(
+    weather: Weather,
+    temperature_unit: Optional[TemperatureUnit] = None,
+    speed_unit: Optional[SpeedUnit] = None,
+) -> str:
+    """
+    Format weather data in string.
 
-def format_weather(weather: Weather) -> str:
-    """Format weather data in string."""
-    return weather_displaying_pattern.format(
-        city=weather.city.capitalize(),
-        temperature=_convert_temperature(weather.temperature),
-        temperature_unit=config.temperature_unit.value,
-        weather_type=weather.weather_type.value,
-        weather_description=weather.weather_description,
-        wind_speed=_convert_speed(weather.wind_speed),
-        speed_unit=config.speed_unit.value,
-        sunrise=weather.sunrise.strftime("%H:%M"),
-        sunset=weather.sunset.strftime("%H:%M"),
+    Measurement units are taken from config if they are not given.
+    Stale weather is followed by note about it.
+    """
+    temperature_unit = temperature_unit or _get_temperature_unit()
+    speed_unit = speed_unit or _get_speed_unit()
+    note = stale_weather_note if isinstance(weather, StaleWeather) else ""
+    return (
+        weather_displaying_pattern.format(
+            city=weather.city.capitalize(),
+            temperature=_convert_temperature(weather.temperature, temperature_unit),
+            temperature_unit=temperature_unit.value,
+            weather_type=weather.weather_type.value,
+            weather_description=weather.weather_description,
+            wind_speed=_convert_speed(weather.wind_speed, speed_unit),
+            speed_unit=speed_unit.value,
+            sunrise=weather.sunrise.strftime("%H:%M"),
+            sunset=weather.sunset.strftime("%H:%M"),
+        )
+        + note
     )
 
 
-def _convert_temperature(temperature: Celsius) -> Union[Kelvin, Fahrenheit, Celsius]:
-    """Convert temperature."""
+def format_weather_frame(
+    frame: WeatherFrame,
+    temperature_unit: Optional[TemperatureUnit] = None,
+    speed_unit: Optional[SpeedUnit] = None,
+) -> List[str]:
+    """
+    Format every weather observation of frame in string.
+
+    Gives the same strings as format_weather does for every observation,
+    but converts measurement units of whole columns at once and formats
+    every city, sunrise and sunset time only once.
+    """
+    temperature_unit = temperature_unit or _get_temperature_unit()
+    speed_unit = speed_unit or _get_speed_unit()
+    temperatures = _convert_temperatures(frame.temperature, temperature_unit)
+    wind_speeds = _convert_speeds(frame, speed_unit)
+    cities = [city.capitalize() for city in frame.cities.strings]
+    descriptions = frame.descriptions.strings
+    times: Dict[int, str] = {}
+    return [
+        weather_displaying_pattern.format(
+            city=cities[city],
+            temperature=temperature,
+            temperature_unit=temperature_unit.value,
+            weather_type=WEATHER_TYPES[weather_type].value,
+            weather_description=descriptions[weather_description],
+            wind_speed=wind_speed,
+            speed_unit=speed_unit.value,
+            sunrise=_format_time(sunrise, times),
+            sunset=_format_time(sunset, times),
+        )
+        for (
+            temperature,
+            weather_type,
+            weather_description,
+            wind_speed,
+            sunrise,
+            sunset,
+            city,
+        ) in zip(
+            temperatures,
+            frame.weather_type,
+            frame.weather_description,
+            wind_speeds,
+            frame.sunrise,
+            frame.sunset,
+            frame.city,
+        )
+    ]
+
+
+def _get_temperature_unit() -> TemperatureUnit:
+    """Return temperature unit from config."""
     default_unit = TemperatureUnit.CELSIUS
     if not _check_temperature_unit_type(config.temperature_unit, default_unit):
         config.temperature_unit = default_unit
-    if config.temperature_unit is TemperatureUnit.KELVIN:
+    return config.temperature_unit
+
+
+def _get_speed_unit() -> SpeedUnit:
+    """Return speed unit from config."""
+    default_unit = SpeedUnit.METERS_PER_SECOND
+    if not _check_speed_unit_type(config.speed_unit, default_unit):
+        config.speed_unit = default_unit
+    return config.speed_unit
+
+
+def _convert_temperature(
+    temperature: Celsius, unit: TemperatureUnit
+) -> Union[Kelvin, Fahrenheit, Celsius]:
+    """Convert temperature."""
+    if unit is TemperatureUnit.KELVIN:
         return convert_to_kelvin(temperature)
-    elif config.temperature_unit is TemperatureUnit.FAHRENHEIT:
+    elif unit is TemperatureUnit.FAHRENHEIT:
         return convert_to_fahrenheit(temperature)
     else:
         return temperature
 
 
 def _convert_speed(
-    speed: Meters_per_second,
+    speed: Meters_per_second, unit: SpeedUnit
 ) -> Union[Miles_per_hour, Kilometers_per_hour, Meters_per_second]:
     """Convert speed."""
-    default_unit = SpeedUnit.METERS_PER_SECOND
-    if not _check_speed_unit_type(config.speed_unit, default_unit):
-        config.speed_unit = default_unit
-    if config.speed_unit is SpeedUnit.KILOMETERS_PER_HOUR:
+    if unit is SpeedUnit.KILOMETERS_PER_HOUR:
         return convert_to_kph(speed)
-    elif config.speed_unit is SpeedUnit.MILES_PER_HOUR:
+    elif unit is SpeedUnit.MILES_PER_HOUR:
         return convert_to_mph(speed)
     else:
         return speed
 
 
+def _convert_temperatures(
+    temperatures: Sequence[Celsius], unit: TemperatureUnit
+) -> List[Union[Kelvin, Fahrenheit, Celsius]]:
+    """Convert temperatures."""
+    if unit is TemperatureUnit.KELVIN:
+        temperatures = convert_to_kelvin_many(temperatures)
+    elif unit is TemperatureUnit.FAHRENHEIT:
+        temperatures = convert_to_fahrenheit_many(temperatures)
+    return _to_list(temperatures)
+
+
+def _convert_speeds(
+    frame: WeatherFrame, unit: SpeedUnit
+) -> List[Union[Miles_per_hour, Kilometers_per_hour, Meters_per_second]]:
+    """Convert wind speeds of frame, unconverted integer speeds stay int."""
+    if unit is SpeedUnit.KILOMETERS_PER_HOUR:
+        return _to_list(convert_to_kph_many(frame.wind_speed))
+    elif unit is SpeedUnit.MILES_PER_HOUR:
+        return _to_list(convert_to_mph_many(frame.wind_speed))
+    return frame.wind_speeds()
+
+
+def _to_list(numbers: Any) -> List[Any]:
+    """Return list of Python numbers from array of numbers."""
+    return list(numbers.tolist())
+
+
+def _format_time(timestamp: int, times: Dict[int, str]) -> str:
+    """Return time of timestamp as HH:MM remembering it in times."""
+    time = times.get(timestamp)
+    if time is None:
+        time = times[timestamp] = datetime.fromtimestamp(timestamp).strftime("%H:%M")
+    return time
+
+
 def _check_temperature_unit_type(unit: Any, default_unit: TemperatureUnit) -> bool:
     """
     Check if config temperature unit has right type.
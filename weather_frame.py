@@ -0,0 +1,190 @@
+"""
+Columnar storage of many weather observations.
+
+Every field of Weather is kept in its own typed array instead of
+a tuple of Python objects per observation: weather types as small
+integer codes, sunrise and sunset as epoch seconds, city names and
+descriptions as codes of interned strings. Wind speeds are kept
+as floats with flags of integer speeds, so they are given back
+with their type.
+"""
+
+from array import array
+from datetime import datetime
+from itertools import compress
+from typing import Dict, Iterable, Iterator, List, Optional, Union, overload
+
+from weather_api_service import Weather, WeatherType
+
+WEATHER_TYPES = tuple(WeatherType)
+WEATHER_TYPE_CODES = {
+    weather_type: code for code, weather_type in enumerate(WEATHER_TYPES)
+}
+COLUMNS = (*Weather._fields, "integer_wind_speed")
+
+
+class StringPool:
+    """Strings stored once and referenced by integer codes."""
+
+    def __init__(self) -> None:
+        """Create empty string pool."""
+        self.strings: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def code(self, string: str) -> int:
+        """Return code of string adding string to pool if needed."""
+        code = self._codes.get(string)
+        if code is None:
+            code = self._codes[string] = len(self.strings)
+            self.strings.append(string)
+        return code
+
+    def find(self, string: str) -> Optional[int]:
+        """Return code of string or None if there is no such string in pool."""
+        return self._codes.get(string)
+
+    def __len__(self) -> int:
+        """Return number of distinct strings."""
+        return len(self.strings)
+
+
+class WeatherFrame:
+    """
+    Many weather observations stored by columns.
+
+    Slices and filtered frames copy only columns, they never create
+    Weather object for each observation. String pools are shared
+    between frame and its slices.
+    """
+
+    def __init__(
+        self,
+        cities: Optional[StringPool] = None,
+        descriptions: Optional[StringPool] = None,
+    ):
+        """Create empty frame."""
+        self.temperature = array("h")
+        self.weather_type = array("B")
+        self.weather_description = array("I")
+        self.wind_speed = array("d")
+        self.integer_wind_speed = array("b")
+        self.sunrise = array("q")
+        self.sunset = array("q")
+        self.city = array("I")
+        self.cities = cities if cities is not None else StringPool()
+        self.descriptions = descriptions if descriptions is not None else StringPool()
+
+    @classmethod
+    def from_weathers(cls, weathers: Iterable[Weather]) -> "WeatherFrame":
+        """Return frame with observations."""
+        frame = cls()
+        frame.extend(weathers)
+        return frame
+
+    def append(self, weather: Weather) -> None:
+        """Add observation to the end of frame."""
+        self.temperature.append(weather.temperature)
+        self.weather_type.append(WEATHER_TYPE_CODES[weather.weather_type])
+        self.weather_description.append(
+            self.descriptions.code(weather.weather_description)
+        )
+        self.wind_speed.append(weather.wind_speed)
+        self.integer_wind_speed.append(isinstance(weather.wind_speed, int))
+        self.sunrise.append(int(weather.sunrise.timestamp()))
+        self.sunset.append(int(weather.sunset.timestamp()))
+        self.city.append(self.cities.code(weather.city))
+
+    def extend(self, weathers: Iterable[Weather]) -> None:
+        """Add observations to the end of frame."""
+        for weather in weathers:
+            self.append(weather)
+
+    def to_weathers(self) -> List[Weather]:
+        """Return observations as list of Weather."""
+        return list(self)
+
+    def filter(self, mask: Iterable[bool]) -> "WeatherFrame":
+        """Return frame with observations for which mask is true."""
+        mask = list(mask)
+        if len(mask) != len(self):
+            raise ValueError(
+                f"Mask has {len(mask)} values, but frame has {len(self)} observations"
+            )
+        frame = WeatherFrame(self.cities, self.descriptions)
+        for name, column in self._columns().items():
+            getattr(frame, name).extend(compress(column, mask))
+        return frame
+
+    def city_mask(self, city: str) -> List[bool]:
+        """Return mask of observations in city."""
+        code = self.cities.find(city)
+        return [city_code == code for city_code in self.city]
+
+    def wind_speeds(self) -> List[Union[int, float]]:
+        """Return wind speeds, integer ones as int."""
+        return [
+            int(speed) if is_integer else speed
+            for speed, is_integer in zip(self.wind_speed, self.integer_wind_speed)
+        ]
+
+    def weather_type_mask(self, weather_type: WeatherType) -> List[bool]:
+        """Return mask of observations with weather type."""
+        code = WEATHER_TYPE_CODES[weather_type]
+        return [weather_type_code == code for weather_type_code in self.weather_type]
+
+    @property
+    def nbytes(self) -> int:
+        """Return size of columns in bytes."""
+        return sum(column.itemsize * len(column) for column in self._columns().values())
+
+    def __len__(self) -> int:
+        """Return number of observations."""
+        return len(self.temperature)
+
+    def __iter__(self) -> Iterator[Weather]:
+        """Iterate over observations as Weather."""
+        for index in range(len(self)):
+            yield self._get_weather(index)
+
+    @overload
+    def __getitem__(self, index: int) -> Weather:
+        """Return observation by index."""
+
+    @overload
+    def __getitem__(self, index: slice) -> "WeatherFrame":
+        """Return frame by slice."""
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Weather, "WeatherFrame"]:
+        """Return observation by index or frame by slice."""
+        if isinstance(index, slice):
+            frame = WeatherFrame(self.cities, self.descriptions)
+            for name, column in self._columns().items():
+                setattr(frame, name, column[index])
+            return frame
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("WeatherFrame index out of range")
+        return self._get_weather(index)
+
+    def _get_weather(self, index: int) -> Weather:
+        """Return observation by non-negative index."""
+        return Weather(
+            temperature=self.temperature[index],
+            weather_type=WEATHER_TYPES[self.weather_type[index]],
+            weather_description=self.descriptions.strings[
+                self.weather_description[index]
+            ],
+            wind_speed=(
+                int(self.wind_speed[index])
+                if self.integer_wind_speed[index]
+                else self.wind_speed[index]
+            ),
+            sunrise=datetime.fromtimestamp(self.sunrise[index]),
+            sunset=datetime.fromtimestamp(self.sunset[index]),
+            city=self.cities.strings[self.city[index]],
+        )
+
+    def _columns(self) -> Dict[str, Union["array[int]", "array[float]"]]:
+        """Return columns by names."""
+        return {name: getattr(self, name) for name in COLUMNS}